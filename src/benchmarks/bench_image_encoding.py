@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark image encoding policies for VLM payloads on guideline pages.
+
+For a sample of pages, every policy is timed (crop + resize + encode) and
+its base64 payload size recorded.  Text fidelity is approximated by OCR
+agreement: the encoded image is OCR'd with PyMuPDF (Tesseract backend)
+and compared to the page's PyMuPDF text layer as a token-multiset F1.
+Without Tesseract the fidelity column reads "n/a".
+
+Example
+-------
+python benchmarks/bench_image_encoding.py --pages 12 --out bench_encoding.json
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import io
+import json
+import random
+import re
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import fitz                    # PyMuPDF
+from PIL import Image
+
+from cpic_vlm_parse.image_encoding import (
+    MODEL_POLICIES,
+    NAMED_POLICIES,
+    EncodingPolicy,
+    encode_image,
+    render_page,
+)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+GRID: Dict[str, EncodingPolicy] = {
+    "jpeg q75 2MP": EncodingPolicy("jpeg", 75, max_pixels=2_000_000, crop_margins=True),
+    "jpeg q90 2MP": EncodingPolicy("jpeg", 90, max_pixels=2_000_000, crop_margins=True),
+    "webp q75 2MP": EncodingPolicy("webp", 75, max_pixels=2_000_000, crop_margins=True),
+    "jpeg q90 1MP": EncodingPolicy("jpeg", 90, max_pixels=1_000_000, crop_margins=True),
+}
+
+
+def sample_pages(cpic_dir: Path, n: int, seed: int) -> List[Tuple[Path, int]]:
+    pages = []
+    for pdf in sorted(cpic_dir.glob("*.pdf")):
+        with fitz.open(pdf) as doc:
+            pages += [(pdf, i) for i in range(doc.page_count)]
+    random.Random(seed).shuffle(pages)
+    return pages[:n]
+
+
+def token_f1(reference: str, candidate: str) -> float:
+    ref = Counter(_WORD_RE.findall(reference.lower()))
+    cand = Counter(_WORD_RE.findall(candidate.lower()))
+    overlap = sum((ref & cand).values())
+    if not overlap:
+        return 0.0
+    p, r = overlap / sum(cand.values()), overlap / sum(ref.values())
+    return 2 * p * r / (p + r)
+
+
+def ocr_text(data: bytes) -> str:
+    """OCR an encoded page image through a one-page PyMuPDF document."""
+    img = Image.open(io.BytesIO(data))
+    doc = fitz.open()
+    page = doc.new_page(width=img.width, height=img.height)
+    page.insert_image(page.rect, stream=data)
+    tp = page.get_textpage_ocr(dpi=72, full=True)   # 1 px per point
+    text = page.get_text(textpage=tp)
+    doc.close()
+    return text
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    policies = {**NAMED_POLICIES,
+                **{f"auto:{m.split('/')[-1]}": p for m, p in MODEL_POLICIES.items()},
+                **GRID}
+    pages = sample_pages(Path(args.cpic_dir), args.pages, args.seed)
+    ocr_ok = not args.no_ocr
+    rows: Dict[str, Dict[str, List[float]]] = {
+        name: {"bytes": [], "encode_ms": [], "pixels": [], "f1": []}
+        for name in policies
+    }
+    for pdf, idx in pages:
+        img = render_page(pdf, idx)
+        with fitz.open(pdf) as doc:
+            reference = doc.load_page(idx).get_text()
+        for name, policy in policies.items():
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                data = encode_image(img, policy)
+                best = min(best, time.perf_counter() - t0)
+            out = Image.open(io.BytesIO(data))
+            rows[name]["bytes"].append(4 * ((len(data) + 2) // 3))   # base64
+            rows[name]["encode_ms"].append(best * 1e3)
+            rows[name]["pixels"].append(out.width * out.height)
+            if ocr_ok and reference.strip():
+                try:
+                    rows[name]["f1"].append(token_f1(reference, ocr_text(data)))
+                except RuntimeError as exc:              # no Tesseract
+                    print(f"[!] OCR unavailable ({exc}); skipping fidelity")
+                    ocr_ok = False
+
+    def mean(xs):
+        return round(statistics.fmean(xs), 3) if xs else None
+
+    return {
+        "pages": len(pages),
+        "policies": {
+            name: {
+                "policy": policies[name].tag(),
+                "b64_kb": mean([b / 1024 for b in r["bytes"]]),
+                "encode_ms": mean(r["encode_ms"]),
+                "megapixels": mean([p / 1e6 for p in r["pixels"]]),
+                "ocr_f1": mean(r["f1"]),
+            }
+            for name, r in rows.items()
+        },
+    }
+
+
+def print_report(res: Dict) -> None:
+    base = res["policies"]["png"]["b64_kb"]
+    print(f"{res['pages']} pages")
+    print(f"{'policy':<28}{'b64 KB':>10}{'× png':>8}{'encode ms':>11}"
+          f"{'MP':>7}{'OCR F1':>8}")
+    for name, r in res["policies"].items():
+        ratio = f"{r['b64_kb'] / base:.2f}" if base else "n/a"
+        f1 = f"{r['ocr_f1']:.3f}" if r["ocr_f1"] is not None else "n/a"
+        print(f"{name:<28}{r['b64_kb']:>10.1f}{ratio:>8}{r['encode_ms']:>11.1f}"
+              f"{r['megapixels']:>7.2f}{f1:>8}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Benchmark VLM image encoding policies")
+    p.add_argument("--cpic-dir", default=str(PROJECT_ROOT / "Guidelines"))
+    p.add_argument("--pages", type=int, default=12)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--no-ocr", action="store_true",
+                   help="skip the OCR fidelity proxy")
+    p.add_argument("--out", default="bench_image_encoding.json")
+    args = p.parse_args()
+
+    res = run_benchmark(args)
+    print_report(res)
+    Path(args.out).write_text(json.dumps(res, indent=2))
+    print(f"[i] Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Embedding-throughput benchmark for the ColQwen ingestion path.
+
+Runs render → embed → binarize on synthetic PDFs with a tiny, randomly
+initialised ColQwen2.5-shaped model on CPU, so the numbers isolate the
+pipeline code rather than the 3B backbone.  Embedding goes through
+``embed_scheduler.embed_pages`` exactly as ingestion does (size-grouped
+batches, ``process_images`` in DataLoader workers, padding rows stripped);
+its loader wait is reported as the "preprocess" stage and the rest as
+"embed".  With ``--workers 0`` "preprocess" is the full
+``process_images`` cost.  Only the processor/tokenizer is loaded from the
+hub (``--processor-name`` also accepts a local directory).
+
+Results (per-stage seconds, pages/s, peak RSS) are written as JSON; pass
+``--compare`` with an earlier result file to print the relative change.
+
+Example
+-------
+python benchmarks/bench_ingest.py --pdfs 4 --pages 6 --out bench_ingest.json
+python benchmarks/bench_ingest.py --out new.json --compare bench_ingest.json
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import fitz                    # PyMuPDF
+import torch
+from transformers import Qwen2_5_VLConfig
+
+from colpali_engine.models import ColQwen2_5, ColQwen2_5_Processor
+import cpic_vlm_vector_store.pdf_helper as pdf_helper
+from cpic_vlm_vector_store.embed_scheduler import embed_pages
+from cpic_vlm_vector_store.vespa_setup_pipeline import binarize_page_embeddings
+
+_PAGE_SIZES = [fitz.paper_size("letter"), fitz.paper_size("a4")]
+
+
+# ------------------------------------------------------------------ #
+# 1. Synthetic inputs                                                #
+# ------------------------------------------------------------------ #
+def make_synthetic_pdfs(out_dir: Path, n_pdfs: int, n_pages: int) -> None:
+    """Write guideline-like PDFs (paragraphs + a ruled table per page)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for d in range(n_pdfs):
+        doc = fitz.open()
+        for p in range(n_pages):
+            w, h = _PAGE_SIZES[(d + p) % len(_PAGE_SIZES)]
+            page = doc.new_page(width=w, height=h)
+            page.insert_textbox(
+                fitz.Rect(50, 50, w - 50, h / 2),
+                (f"Synthetic guideline {d}, page {p}. CYP2C19 poor metabolizer "
+                 "dosing recommendations and strength of evidence. ") * 12,
+                fontsize=9,
+            )
+            top, rows, cols = h / 2 + 20, 8, 4
+            cw, rh = (w - 100) / cols, 18
+            for r in range(rows + 1):
+                page.draw_line((50, top + r * rh), (w - 50, top + r * rh))
+            for c in range(cols + 1):
+                page.draw_line((50 + c * cw, top), (50 + c * cw, top + rows * rh))
+            for r in range(rows):
+                for c in range(cols):
+                    page.insert_text((54 + c * cw, top + r * rh + 13),
+                                     f"*{r + 1}/*{c + 2}", fontsize=8)
+        doc.save(out_dir / f"synthetic_{d:02d}.pdf")
+
+
+def build_tiny_colqwen(processor: ColQwen2_5_Processor) -> ColQwen2_5:
+    """Randomly initialised ColQwen2.5 with the real token/patch geometry."""
+    token_id = processor.tokenizer.convert_tokens_to_ids
+    config = Qwen2_5_VLConfig(
+        vocab_size=len(processor.tokenizer),
+        image_token_id=token_id("<|image_pad|>"),
+        video_token_id=token_id("<|video_pad|>"),
+        vision_start_token_id=token_id("<|vision_start|>"),
+        vision_end_token_id=token_id("<|vision_end|>"),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        rope_scaling={"type": "mrope", "mrope_section": [2, 3, 3]},
+        vision_config={
+            "depth": 2,
+            "hidden_size": 64,
+            "intermediate_size": 128,
+            "num_heads": 4,
+            "out_hidden_size": 64,
+            "fullatt_block_indexes": [1],
+        },
+    )
+    torch.manual_seed(0)
+    return ColQwen2_5(config).to(torch.float32).eval()
+
+
+# ------------------------------------------------------------------ #
+# 2. Benchmark                                                       #
+# ------------------------------------------------------------------ #
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True,
+            cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    processor = ColQwen2_5_Processor.from_pretrained(
+        args.processor_name, cache_dir=args.cache_dir)
+    model = build_tiny_colqwen(processor)
+    torch.set_num_threads(args.threads)
+    stages: Dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_synthetic_pdfs(Path(tmp), args.pdfs, args.pages)
+
+        t0 = time.perf_counter()
+        cpic_pdfs = pdf_helper.get_cpic_pdf_images_texts(tmp)
+        stages["render"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stats = embed_pages(cpic_pdfs, model, processor, args.batch_size,
+                        device="cpu", num_workers=args.workers)
+    embed_total = time.perf_counter() - t0
+    stages["preprocess"] = stats.loader_wait      # not hidden by the workers
+    stages["embed"] = embed_total - stats.loader_wait
+
+    t0 = time.perf_counter()
+    for pdf in cpic_pdfs:
+        for emb in pdf["embeddings"]:
+            binarize_page_embeddings(emb)
+    stages["binarize"] = time.perf_counter() - t0
+
+    n_pages = stats.pages
+    total = sum(stages.values())
+    return {
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "torch": torch.__version__,
+        "config": {
+            "pdfs": args.pdfs, "pages_per_pdf": args.pages,
+            "batch_size": args.batch_size, "threads": args.threads,
+            "workers": args.workers,
+        },
+        "pages": n_pages,
+        "stages_s": {k: round(v, 4) for k, v in stages.items()},
+        "pages_per_s": {k: round(n_pages / v, 2) if v else None
+                        for k, v in {**stages, "total": total}.items()},
+        "padding_ratio": round(stats.padding_ratio, 4),
+        "patches_per_page": round(stats.real_tokens / n_pages, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def print_report(res: Dict, baseline: Dict | None = None) -> None:
+    print(f"{res['pages']} pages | peak RSS {res['peak_rss_mb']} MB | "
+          f"padding {res['padding_ratio']:.1%}")
+    print(f"{'stage':<12}{'seconds':>10}{'pages/s':>10}{'Δ vs base':>12}")
+    for stage, secs in res["stages_s"].items():
+        delta = ""
+        if baseline and baseline["stages_s"].get(stage):
+            delta = f"{secs / baseline['stages_s'][stage] - 1:+.1%}"
+        print(f"{stage:<12}{secs:>10.3f}{str(res['pages_per_s'][stage]):>10}{delta:>12}")
+    print(f"{'total':<12}{sum(res['stages_s'].values()):>10.3f}"
+          f"{res['pages_per_s']['total']:>10}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Benchmark the ColQwen ingestion path on CPU")
+    p.add_argument("--processor-name", default="vidore/colqwen2.5-v0.2")
+    p.add_argument("--cache-dir", default="/tmp/colqwen_cache")
+    p.add_argument("--pdfs", type=int, default=4)
+    p.add_argument("--pages", type=int, default=6, help="pages per PDF")
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--workers", type=int, default=2,
+                   help="DataLoader preprocessing workers (as in ingestion)")
+    p.add_argument("--out", default="bench_ingest.json")
+    p.add_argument("--compare", help="earlier result JSON to diff against")
+    args = p.parse_args()
+
+    res = run_benchmark(args)
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(res, baseline)
+    Path(args.out).write_text(json.dumps(res, indent=2))
+    print(f"[i] Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark request policies against a misbehaving local VLM stand-in.
+
+A ``MockVLMServer`` answers after ``--latency`` seconds, except for a
+``--slow-rate`` share of slow outliers, ``--error-rate`` 429/503 answers
+and ``--drop-rate`` dropped connections.  The same request stream is sent
+through ``AsyncVLMClient`` once per policy:
+
+    none     single attempt, no retries
+    retry    deadline + jittered retries
+    hedge    deadline + retries + duplicate request after the p95 delay
+
+and end-to-end latency percentiles, success rate, hedges and the extra
+server load (requests sent per call) are reported.
+
+Example
+-------
+python benchmarks/bench_request_policy.py --calls 300 --slow-rate 0.05
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from cpic_vlm_parse.mock_vlm_server import MockVLMServer
+from cpic_vlm_parse.request_policy import RequestPolicy
+from cpic_vlm_parse.vlm_client import AsyncVLMClient
+
+
+def policies(args: argparse.Namespace) -> Dict[str, RequestPolicy | None]:
+    retry = RequestPolicy(deadline=args.deadline, max_retries=args.max_retries,
+                          backoff_base=0.05, backoff_max=0.5)
+    return {
+        "none": None,
+        "retry": retry,
+        "hedge": RequestPolicy(deadline=args.deadline,
+                               max_retries=args.max_retries,
+                               backoff_base=0.05, backoff_max=0.5, hedge=True,
+                               hedge_quantile=args.hedge_quantile,
+                               hedge_default_delay=4 * args.latency,
+                               min_samples=20),
+    }
+
+
+def percentile(xs: List[float], q: float) -> float | None:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+async def run_policy(server: MockVLMServer, policy: RequestPolicy | None,
+                     args: argparse.Namespace) -> Dict:
+    sent_before = len(server.requests)
+    latencies: List[float] = []
+    ok = 0
+    async with AsyncVLMClient(server.url, "mock", concurrency=args.concurrency,
+                              max_retries=0, cache=False, policy=policy) as vlm:
+        async def one(i: int) -> None:
+            nonlocal ok
+            messages = [{"role": "user", "content": f"page {i}"}]
+            t0 = time.perf_counter()
+            try:
+                await vlm.complete(messages, max_tokens=16)
+                ok += 1
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - t0)
+
+        # sequential warm-up batch fills the latency window the hedge uses
+        for i in range(args.warmup):
+            await one(-1 - i)
+        latencies.clear()
+        ok = 0
+        sent_before = len(server.requests)
+        await asyncio.gather(*(one(i) for i in range(args.calls)))
+        metrics = vlm.metrics.as_dict() if vlm.metrics else {}
+
+    def ms(q):
+        v = percentile(latencies, q)
+        return round(v * 1e3, 1) if v is not None else None
+
+    return {
+        "success_rate": round(ok / args.calls, 4),
+        "p50_ms": ms(0.50), "p95_ms": ms(0.95), "p99_ms": ms(0.99),
+        "max_ms": round(max(latencies) * 1e3, 1),
+        "requests_per_call": round((len(server.requests) - sent_before) / args.calls, 3),
+        "retries": metrics.get("retries", 0),
+        "hedges": metrics.get("hedges", 0),
+        "hedge_wins": metrics.get("hedge_wins", 0),
+        "deadline_exceeded": metrics.get("deadline_exceeded", 0),
+    }
+
+
+def print_report(res: Dict) -> None:
+    print(f"{'policy':<8}{'ok':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}{'req/call':>10}{'retries':>9}{'hedges':>8}")
+    for name, r in res["policies"].items():
+        print(f"{name:<8}{r['success_rate']:>8.1%}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['max_ms']:>9}{r['requests_per_call']:>10}"
+              f"{r['retries']:>9}{r['hedges']:>8}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Benchmark VLM request policies on a mock server")
+    p.add_argument("--calls", type=int, default=300)
+    p.add_argument("--warmup", type=int, default=30)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--latency", type=float, default=0.1)
+    p.add_argument("--slow-rate", type=float, default=0.05)
+    p.add_argument("--slow-latency", type=float, default=3.0)
+    p.add_argument("--error-rate", type=float, default=0.05)
+    p.add_argument("--drop-rate", type=float, default=0.02)
+    p.add_argument("--deadline", type=float, default=10.0)
+    p.add_argument("--max-retries", type=int, default=3)
+    p.add_argument("--hedge-quantile", type=float, default=0.95)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="bench_request_policy.json")
+    args = p.parse_args()
+
+    res = {"config": vars(args), "policies": {}}
+    for name, policy in policies(args).items():
+        with MockVLMServer(latency=args.latency, slow_rate=args.slow_rate,
+                           slow_latency=args.slow_latency,
+                           error_rate=args.error_rate, drop_rate=args.drop_rate,
+                           seed=args.seed) as server:
+            res["policies"][name] = asyncio.run(run_policy(server, policy, args))
+    print_report(res)
+    Path(args.out).write_text(json.dumps(res, indent=2))
+    print(f"[i] Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Evaluate index-time patch pooling: index size, rerank latency, recall@k.
+
+Embeds the guideline corpus once (optionally cached with --emb-cache),
+then for every pooling factor binarizes the pooled pages exactly like the
+feed builder and scores labelled queries with the schema's ``max_sim``
+(float query · unpack_bits(page)).  A query counts as a hit at k if any of
+the top-k pages belongs to its expected guideline.
+
+Example
+-------
+python benchmarks/eval_pooling.py --cpic-dir Guidelines \
+    --factors 1 2 3 4 --n-queries 300 --emb-cache /tmp/cpic_emb.pt
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+import cpic_vlm_vector_store.pdf_helper as pdf_helper
+from cpic_vlm_vector_store.patch_pooling import pool_patches
+from cpic_vlm_vector_store.retrieve_cpic import encode_queries
+from cpic_vlm_vector_store.rewrite_labels import (
+    load_labelled_queries,
+    normalize_guideline,
+)
+from cpic_vlm_vector_store.vespa_setup_pipeline import (
+    embed_cpic_pdfs,
+    load_model_and_processor,
+)
+
+
+def embed_corpus(args, model, processor, device) -> Dict:
+    if args.emb_cache and Path(args.emb_cache).exists():
+        return torch.load(args.emb_cache)
+    cpic_pdfs = pdf_helper.get_cpic_pdf_images_texts(args.cpic_dir)
+    embed_cpic_pdfs(cpic_pdfs, model, processor, args.batch_size, device)
+    corpus = {
+        "names": [pdf["name"] for pdf in cpic_pdfs for _ in pdf["embeddings"]],
+        "embeddings": [e.float() for pdf in cpic_pdfs for e in pdf["embeddings"]],
+    }
+    if args.emb_cache:
+        torch.save(corpus, args.emb_cache)
+    return corpus
+
+
+def binary_index(pages: List[np.ndarray]):
+    """Unpacked {0,1} matrix of sign bits + page start offsets."""
+    bits = np.concatenate([np.packbits(p > 0, axis=1) for p in pages])
+    bits = np.unpackbits(bits, axis=1).astype(np.float32)
+    offsets = np.cumsum([0] + [len(p) for p in pages])[:-1]
+    return bits, offsets
+
+
+def max_sim(q: np.ndarray, bits: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    sims = q @ bits.T                                   # (tokens, patches)
+    return np.maximum.reduceat(sims, offsets, axis=1).sum(axis=0)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Evaluate patch pooling factors")
+    p.add_argument("--cpic-dir", required=True)
+    p.add_argument("--model-name", default="vidore/colqwen2.5-v0.2")
+    p.add_argument("--cache-dir", default="/tmp/colqwen_cache")
+    p.add_argument("--device", default="cuda:0")
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--emb-cache", help="torch.save cache of page embeddings")
+    p.add_argument("--factors", type=int, nargs="+", default=[1, 2, 3, 4])
+    p.add_argument("--n-queries", type=int, default=300)
+    p.add_argument("--query-field", choices=["search_text", "question"],
+                   default="search_text")
+    p.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    p.add_argument("--rerank-count", type=int, default=100,
+                   help="pages per rerank for the latency figure")
+    p.add_argument("--out", default="eval_pooling.json")
+    args = p.parse_args()
+
+    device = args.device if torch.cuda.is_available() else "cpu"
+    model, processor = load_model_and_processor(
+        args.model_name, args.cache_dir, device)
+    corpus = embed_corpus(args, model, processor, device)
+    page_guideline = np.array([normalize_guideline(n) for n in corpus["names"]])
+
+    known = set(page_guideline)
+    labelled = [q for q in load_labelled_queries()
+                if normalize_guideline(q.guideline) in known]
+    random.Random(0).shuffle(labelled)
+    labelled = labelled[:args.n_queries]
+    queries = [e.numpy() for e in encode_queries(
+        [getattr(q, args.query_field) for q in labelled], model, processor)]
+    expected = [normalize_guideline(q.guideline) for q in labelled]
+
+    results = []
+    for factor in args.factors:
+        t0 = time.perf_counter()
+        pooled = [pool_patches(e, factor) for e in corpus["embeddings"]]
+        pool_s = time.perf_counter() - t0
+        bits, offsets = binary_index(pooled)
+        n_pages = len(pooled)
+        sub = min(args.rerank_count, n_pages)
+        sub_end = offsets[sub] if sub < n_pages else len(bits)
+
+        hits = {k: 0 for k in args.k}
+        lat = []
+        for q, exp in zip(queries, expected):
+            scores = max_sim(q, bits, offsets)
+            t0 = time.perf_counter()
+            max_sim(q, bits[:sub_end], offsets[:sub])   # one rerank's worth
+            lat.append(time.perf_counter() - t0)
+            top = page_guideline[np.argsort(-scores)[:max(args.k)]]
+            for k in args.k:
+                hits[k] += exp in top[:k]
+
+        row = {
+            "factor": factor,
+            "patches": int(len(bits)),
+            "patches_per_page": round(len(bits) / n_pages, 1),
+            "index_mb": round(len(bits) * 16 / 2**20, 2),
+            "pool_s": round(pool_s, 2),
+            "rerank_ms_p50": round(float(np.median(lat)) * 1e3, 3),
+            **{f"recall@{k}": round(hits[k] / len(queries), 4) for k in args.k},
+        }
+        results.append(row)
+
+    base = results[0]
+    print(f"{len(queries)} queries, {len(corpus['names'])} pages")
+    print(f"{'factor':>6}{'patch/pg':>10}{'index MB':>10}{'Δ size':>9}"
+          f"{'rerank ms':>11}" + "".join(f"{'R@' + str(k):>8}" for k in args.k))
+    for r in results:
+        print(f"{r['factor']:>6}{r['patches_per_page']:>10}{r['index_mb']:>10}"
+              f"{r['index_mb'] / base['index_mb'] - 1:>+9.0%}"
+              f"{r['rerank_ms_p50']:>11}"
+              + "".join(f"{r[f'recall@{k}']:>8.3f}" for k in args.k))
+    Path(args.out).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
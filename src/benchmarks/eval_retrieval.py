@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Retrieval quality / latency harness for rank-profile configurations.
+
+Labels are (question → expected guideline) pairs from
+``rewrite_labels.load_labelled_queries`` (dataset.json + SFT splits).  Every
+query is embedded once, then run through the backend under each ranking
+configuration.  A hit is relevant when its page belongs to the expected
+guideline.  One table reports recall@k, MRR and p50/p95 latency.
+
+Backends
+--------
+--local-index DIR          in-process LocalMaxSimEngine
+--endpoint / --endpoint-file   Vespa (real cluster or a stand-in)
+--standin                  spin up VespaStandIn with canned random hits
+                           (exercises the harness plumbing only)
+
+Configurations are body overrides merged into ``build_query_body``, or
+``{"mode": "nn", ...}`` for ``build_nn_query_body`` keyword arguments; pass
+``--configs file.json`` ({"name": {...overrides...}}) to replace the
+defaults below.
+
+Example
+-------
+python benchmarks/eval_retrieval.py --endpoint-file vespa_endpoint.txt \
+    --n-queries 200 --k 1 3 5 10
+python benchmarks/eval_retrieval.py --local-index local_index/
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from cpic_vlm_vector_store.local_engine import LocalMaxSimEngine
+from cpic_vlm_vector_store.retrieve_cpic import (
+    build_nn_query_body,
+    build_query_body,
+    encode_queries,
+    open_backend,
+    tensor_to_body,
+)
+from cpic_vlm_vector_store.rewrite_labels import (
+    load_labelled_queries,
+    normalize_guideline,
+)
+from cpic_vlm_vector_store.vespa_setup_pipeline import load_model_and_processor
+from cpic_vlm_vector_store.vespa_standin import VespaStandIn
+
+VESPA_CONFIGS: Dict[str, Dict] = {
+    "bm25 only": {"ranking": "bm25"},
+    "bm25 → max_sim rc=10": {"ranking": "default", "ranking.rerankCount": 10},
+    "bm25 → max_sim rc=50": {"ranking": "default", "ranking.rerankCount": 50},
+    "bm25 → max_sim rc=100": {"ranking": "default", "ranking.rerankCount": 100},
+    "bm25 → max_sim rc=200": {"ranking": "default", "ranking.rerankCount": 200},
+    # nearestNeighbor candidate generation (build_nn_query_body)
+    "ann tH=20 ∪ text": {"mode": "nn", "target_hits": 20, "with_text": True},
+    "ann tH=20": {"mode": "nn", "target_hits": 20, "with_text": False},
+    "ann tH=100": {"mode": "nn", "target_hits": 100, "with_text": False},
+}
+LOCAL_CONFIGS: Dict[str, Dict] = {
+    "bit max_sim": {"ranking": "default"},
+    "hamming max_sim": {"ranking": "binary"},
+    "binary → float N=50": {"ranking": "rerank_float", "ranking.rerankCount": 50},
+    "float (exhaustive)": {"ranking": "float"},
+    "bm25": {"ranking": "bm25"},
+    "bm25 → max_sim N=100": {"ranking": "bm25_max_sim", "ranking.rerankCount": 100},
+}
+
+
+def _guideline_of(hit: Dict) -> str:
+    f = hit["fields"]
+    return normalize_guideline(f.get("name") or Path(f["path"]).name)
+
+
+def evaluate(app, queries: List[str], tensors: List[dict], expected: List[str],
+             configs: Dict[str, Dict], ks: List[int]) -> List[Dict]:
+    rows = []
+    depth = max(ks)
+    for name, overrides in configs.items():
+        lat, ranks, errors = [], [], 0
+        for text, tensor, exp in zip(queries, tensors, expected):
+            if overrides.get("mode") == "nn":
+                nn = {k: v for k, v in overrides.items() if k != "mode"}
+                body = build_nn_query_body(text, tensor, depth, **nn)
+            else:
+                body = {**build_query_body(text, tensor, depth), **overrides}
+            t0 = time.perf_counter()
+            resp = app.query(body=body)
+            lat.append(time.perf_counter() - t0)
+            if not resp.is_successful():
+                errors += 1
+                ranks.append(None)
+                continue
+            gl = [_guideline_of(h) for h in resp.hits]
+            ranks.append(gl.index(exp) + 1 if exp in gl else None)
+        lat_ms = np.array(lat) * 1e3
+        rows.append({
+            "config": name,
+            **{f"R@{k}": round(sum(r is not None and r <= k for r in ranks)
+                               / len(ranks), 4) for k in ks},
+            "MRR": round(float(np.mean([1 / r if r else 0.0 for r in ranks])), 4),
+            "p50_ms": round(float(np.percentile(lat_ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(lat_ms, 95)), 1),
+            "errors": errors,
+        })
+    return rows
+
+
+def print_table(rows: List[Dict]) -> None:
+    cols = list(rows[0])
+    width = max(len(r["config"]) for r in rows) + 2
+    print(f"{'config':<{width}}" + "".join(f"{c:>9}" for c in cols[1:]))
+    for r in rows:
+        print(f"{r['config']:<{width}}" + "".join(f"{r[c]:>9}" for c in cols[1:]))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Evaluate retrieval rank configurations")
+    grp = p.add_mutually_exclusive_group(required=True)
+    grp.add_argument("--endpoint")
+    grp.add_argument("--endpoint-file")
+    grp.add_argument("--local-index")
+    grp.add_argument("--standin", action="store_true")
+    p.add_argument("--cpic-dir", default=str(PROJECT_ROOT / "Guidelines"),
+                   help="guideline PDFs (defines the label universe)")
+    p.add_argument("--configs", help="JSON file {name: body overrides}")
+    p.add_argument("--model-name", default="vidore/colqwen2.5-v0.2")
+    p.add_argument("--cache-dir", default="/tmp/colqwen_cache")
+    p.add_argument("--device", default="cuda:0")
+    p.add_argument("--n-queries", type=int, default=200)
+    p.add_argument("--split", nargs="*", default=["validation", "test"],
+                   help="label splits to draw from")
+    p.add_argument("--query-field", choices=["search_text", "question"],
+                   default="search_text")
+    p.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    p.add_argument("--out", default="eval_retrieval.json")
+    args = p.parse_args()
+
+    pdf_names = sorted(Path(args.cpic_dir).glob("*.pdf"))
+    known = {normalize_guideline(f.name) for f in pdf_names}
+    labelled = [q for q in load_labelled_queries(only_splits=args.split)
+                if normalize_guideline(q.guideline) in known]
+    random.Random(0).shuffle(labelled)
+    labelled = labelled[:args.n_queries]
+
+    standin = None
+    if args.standin:
+        rng = random.Random(0)
+
+        def canned(body: Dict) -> List[Dict]:
+            picks = rng.sample(pdf_names, min(int(body.get("hits", 10)), len(pdf_names)))
+            return [{"id": f"id:pdf_page:pdf_page::{i}", "relevance": 1.0 / (i + 1),
+                     "fields": {"name": f.name, "path": str(f), "page_number": 0}}
+                    for i, f in enumerate(picks)]
+        standin = VespaStandIn(hits_fn=canned).start()
+        app = open_backend(endpoint=standin.url)
+    else:
+        app = open_backend(args.endpoint, args.endpoint_file, args.local_index)
+
+    if args.configs:
+        configs = json.loads(Path(args.configs).read_text())
+    else:
+        configs = LOCAL_CONFIGS if isinstance(app, LocalMaxSimEngine) else VESPA_CONFIGS
+        if isinstance(app, LocalMaxSimEngine) and app.float_emb is None:
+            configs = {k: v for k, v in configs.items()
+                       if "float" not in v["ranking"]}
+        if isinstance(app, LocalMaxSimEngine) and app.bm25 is None:
+            configs = {k: v for k, v in configs.items()
+                       if "bm25" not in v["ranking"]}
+
+    device = args.device if torch.cuda.is_available() else "cpu"
+    model, proc = load_model_and_processor(args.model_name, args.cache_dir, device)
+    texts = [getattr(q, args.query_field) for q in labelled]
+    tensors = [tensor_to_body(e) for e in encode_queries(texts, model, proc)]
+    expected = [normalize_guideline(q.guideline) for q in labelled]
+
+    try:
+        rows = evaluate(app, texts, tensors, expected, configs, args.k)
+    finally:
+        if standin is not None:
+            standin.stop()
+
+    print(f"{len(texts)} labelled queries ({', '.join(args.split)})")
+    print_table(rows)
+    Path(args.out).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Two-stage (binary → float) local retrieval vs. exhaustive float MaxSim.
+
+For each rerank depth N the binary hamming pass picks N pages and exact
+float MaxSim reorders them.  Reported per N:
+
+* overlap@k  – share of the exhaustive-float top-k that two-stage recovers
+* recall@k   – expected guideline in top-k (labels from rewrite_labels)
+* p50 / p95  – per-query latency in ms
+
+Needs a local index built with ``--local-index-output`` (float16.npy).
+
+Example
+-------
+python benchmarks/eval_two_stage.py --local-index local_index/ \
+    --rerank 10 25 50 100 --n-queries 300
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import torch
+
+from cpic_vlm_vector_store.local_engine import LocalMaxSimEngine
+from cpic_vlm_vector_store.retrieve_cpic import encode_queries
+from cpic_vlm_vector_store.rewrite_labels import (
+    load_labelled_queries,
+    normalize_guideline,
+)
+from cpic_vlm_vector_store.vespa_setup_pipeline import load_model_and_processor
+
+
+def _run(fn: Callable[[np.ndarray], np.ndarray], queries, k: int):
+    tops, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        scores = fn(q)
+        lat.append(time.perf_counter() - t0)
+        tops.append(np.argsort(-scores, kind="stable")[:k])
+    return tops, np.array(lat) * 1e3
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Evaluate two-stage binary→float reranking")
+    p.add_argument("--local-index", required=True)
+    p.add_argument("--model-name", default="vidore/colqwen2.5-v0.2")
+    p.add_argument("--cache-dir", default="/tmp/colqwen_cache")
+    p.add_argument("--device", default="cuda:0")
+    p.add_argument("--rerank", type=int, nargs="+", default=[10, 25, 50, 100])
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--n-queries", type=int, default=300)
+    p.add_argument("--out", default="eval_two_stage.json")
+    args = p.parse_args()
+
+    engine = LocalMaxSimEngine.load(args.local_index)
+    if engine.float_emb is None:
+        sys.exit("❌  index has no float16.npy – rebuild with --local-index-output")
+    page_guideline = np.array([normalize_guideline(m["name"]) for m in engine.meta])
+
+    known = set(page_guideline)
+    labelled = [q for q in load_labelled_queries()
+                if normalize_guideline(q.guideline) in known]
+    random.Random(0).shuffle(labelled)
+    labelled = labelled[:args.n_queries]
+
+    device = args.device if torch.cuda.is_available() else "cpu"
+    model, proc = load_model_and_processor(args.model_name, args.cache_dir, device)
+    queries = [e.numpy() for e in encode_queries(
+        [q.search_text for q in labelled], model, proc)]
+    expected = [normalize_guideline(q.guideline) for q in labelled]
+
+    def summarize(name: str, tops: List[np.ndarray], lat: np.ndarray,
+                  ref: List[np.ndarray]) -> Dict:
+        overlap = np.mean([len(set(t) & set(r)) / len(r) for t, r in zip(tops, ref)])
+        recall = np.mean([e in page_guideline[t] for t, e in zip(tops, expected)])
+        return {"mode": name, f"overlap@{args.k}": round(float(overlap), 4),
+                f"recall@{args.k}": round(float(recall), 4),
+                "p50_ms": round(float(np.percentile(lat, 50)), 2),
+                "p95_ms": round(float(np.percentile(lat, 95)), 2)}
+
+    ref, lat = _run(lambda q: engine.score([q], "float")[0], queries, args.k)
+    rows = [summarize("float (exhaustive)", ref, lat, ref)]
+    tops, lat = _run(lambda q: engine.score([q], "default")[0], queries, args.k)
+    rows.append(summarize("bit max_sim", tops, lat, ref))
+    for n in args.rerank:
+        tops, lat = _run(lambda q: engine.score_two_stage([q], n)[0],
+                         queries, args.k)
+        rows.append(summarize(f"two-stage N={n}", tops, lat, ref))
+
+    print(f"{len(queries)} queries, {engine.n_pages} pages")
+    cols = list(rows[0])
+    print("".join(f"{c:>20}" for c in cols))
+    for r in rows:
+        print("".join(f"{str(r[c]):>20}" for c in cols))
+    Path(args.out).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
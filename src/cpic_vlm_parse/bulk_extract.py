@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Offline pre-extraction of every guideline page through the VLM.
+
+Walks every page of every PDF in ``--cpic-dir`` and sends it to the model
+over one pooled ``AsyncVLMClient`` with ``concurrency`` requests in flight,
+throttled by a token bucket (``--rps`` / ``--burst``).  Answers go to the
+extraction cache (see ``extraction_cache.py``), so ``send_pdf_page``
+serves them at query time without rendering or network calls.  Pages already in the cache are
+skipped, and every finished page is appended to a JSONL checkpoint so an
+interrupted run resumes where it stopped.  429/5xx answers and transport
+errors are retried by the client's ``RequestPolicy`` (full-jitter
+exponential backoff, see ``request_policy``).
+
+Example
+-------
+python mock_vlm_server.py --port 8000 --latency 0.2 &
+python bulk_extract.py --cpic-dir ../Guidelines \
+    --base-url http://127.0.0.1:8000/v1 --api-key mock --concurrency 16
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, Tuple
+
+import fitz                    # PyMuPDF
+from tqdm import tqdm
+
+from cpic_vlm_parse.extract_api_call import make_mm_message, page_key_params
+from cpic_vlm_parse.extraction_cache import (
+    ExtractionCache,
+    default_extraction_cache,
+    page_cache_id,
+)
+from cpic_vlm_parse.image_encoding import NAMED_POLICIES, EncodingPolicy, resolve_policy
+from cpic_vlm_parse.request_policy import RequestPolicy
+from cpic_vlm_parse.vlm_client import DEFAULT_BASE_URL, DEFAULT_MODEL, AsyncVLMClient
+from cpic_vlm_vector_store.page_store import STORE_HELP
+
+DEFAULT_PROMPT = "Extract table from this page (markdown)."
+
+
+@dataclass
+class BulkReport:
+    """Outcome of one bulk extraction run."""
+    pages_total: int = 0
+    cached: int = 0
+    extracted: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    failures: List[Tuple[str, int, str]] = field(default_factory=list)
+
+    @property
+    def pages_per_s(self) -> float:
+        return self.extracted / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.pages_total} pages: {self.extracted} extracted "
+            f"in {self.elapsed:.1f}s ({self.pages_per_s:.2f} pages/s), "
+            f"{self.cached} already cached, {self.retries} retries, "
+            f"{len(self.failures)} failures"
+        )
+
+
+def iter_guideline_pages(cpic_dir: str | os.PathLike) -> Iterator[Tuple[Path, int]]:
+    """(pdf path, 0-based page index) for every page of every PDF."""
+    for pdf in sorted(Path(cpic_dir).glob("*.pdf")):
+        with fitz.open(pdf) as doc:
+            n = doc.page_count
+        for page in range(n):
+            yield pdf, page
+
+
+def load_checkpoint(path: str | os.PathLike) -> Set[str]:
+    """Cache keys recorded as done in a checkpoint file."""
+    done: Set[str] = set()
+    if not Path(path).exists():
+        return done
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:            # torn last line
+                continue
+            if rec.get("status") == "ok":
+                done.add(rec["key"])
+    return done
+
+
+async def bulk_extract(
+    pages: List[Tuple[Path, int]],
+    cache: ExtractionCache,
+    *,
+    prompt: str = DEFAULT_PROMPT,
+    model: str = DEFAULT_MODEL,
+    api_key: str | None = None,
+    base_url: str = DEFAULT_BASE_URL,
+    temperature: float = 0.7,
+    top_p: float = 0.95,
+    max_tokens: int = 1024,
+    encoding: EncodingPolicy | str | None = None,
+    crop_tables: bool = False,
+    concurrency: int = 8,
+    rps: float = 0.0,
+    burst: int = 1,
+    max_retries: int = 5,
+    backoff_base: float = 1.0,
+    backoff_max: float = 60.0,
+    timeout: float = 300.0,
+    deadline: float | None = None,
+    checkpoint: str | os.PathLike | None = None,
+    progress: bool = True,
+) -> BulkReport:
+    """
+    Extract ``pages`` into ``cache`` and return a report.
+
+    Pages whose answer is cached, or recorded in ``checkpoint``, are not
+    sent again.  ``rps`` <= 0 disables rate limiting.  ``encoding`` is the
+    image payload policy (see ``image_encoding``); with ``crop_tables``
+    only table regions are sent and table-less pages are stored as "".
+    ``timeout`` caps each attempt and ``deadline`` each page, retries
+    included (None: unbounded).
+    """
+    params = {"temperature": temperature, "top_p": top_p,
+              "max_tokens": max_tokens}
+    enc_policy = resolve_policy(encoding, model)
+    key_params = page_key_params(params, enc_policy, crop_tables)
+    report = BulkReport(pages_total=len(pages))
+    done = load_checkpoint(checkpoint) if checkpoint else set()
+
+    todo = []
+    for pdf, page in pages:
+        page_id = page_cache_id(pdf, page)
+        key = cache.key(page_id, prompt, model, key_params)
+        if key in done or cache.contains(page_id, prompt, model, key_params):
+            report.cached += 1
+        else:
+            todo.append((pdf, page, page_id, key))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in todo:
+        queue.put_nowait(item)
+    bar = tqdm(total=len(todo), desc="Extracting pages", unit="page",
+               disable=not progress)
+    ckpt = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+
+    def record(rec: Dict) -> None:
+        if ckpt is not None:
+            ckpt.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            ckpt.flush()
+
+    async def extract_one(client: AsyncVLMClient, pdf: Path, page: int) -> str:
+        encoded = await client.encode(pdf, page, model)
+        if encoded is None:                         # no tables on the page
+            return ""
+        return await client.complete(make_mm_message(prompt, *encoded),
+                                     model, **params)
+
+    async def worker(client: AsyncVLMClient) -> None:
+        while True:
+            try:
+                pdf, page, page_id, key = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            rec = {"key": key, "page_id": page_id, "pdf": pdf.name, "page": page}
+            try:
+                text = await extract_one(client, pdf, page)
+            except Exception as exc:
+                status = getattr(exc, "status_code", -1)
+                report.failures.append((f"{pdf.name}#{page}", status, str(exc)))
+                record({**rec, "status": "failed", "error": str(exc)[:500]})
+            else:
+                cache.put(page_id, prompt, model, key_params, text)
+                report.extracted += 1
+                record({**rec, "status": "ok", "chars": len(text)})
+            bar.update(1)
+
+    t0 = time.perf_counter()
+    request_policy = RequestPolicy(deadline=deadline, attempt_timeout=timeout,
+                                   max_retries=max_retries,
+                                   backoff_base=backoff_base,
+                                   backoff_max=backoff_max)
+    client = AsyncVLMClient(base_url, api_key, concurrency=concurrency,
+                            timeout=timeout, cache=cache, encoding=enc_policy,
+                            crop_tables=crop_tables, rps=rps, burst=burst,
+                            policy=request_policy)
+    try:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    finally:
+        report.retries = client.metrics.retries
+        await client.aclose()
+        bar.close()
+        if ckpt is not None:
+            ckpt.close()
+    report.elapsed = time.perf_counter() - t0
+    return report
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    p = argparse.ArgumentParser("Pre-extract every guideline page with the VLM",
+                                epilog=STORE_HELP)
+    p.add_argument("--cpic-dir", default=str(PROJECT_ROOT / "Guidelines"))
+    p.add_argument("--prompt", default=DEFAULT_PROMPT)
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    p.add_argument("--api-key", default=None,
+                   help="If omitted, reads NVIDIA_API_TOKEN env-var")
+    p.add_argument("--temp", type=float, default=0.7)
+    p.add_argument("--top-p", type=float, default=0.95)
+    p.add_argument("--max-tokens", type=int, default=1024)
+    p.add_argument("--encoding", default=None,
+                   choices=["auto", *NAMED_POLICIES],
+                   help="Image payload preset (default: lossless PNG)")
+    p.add_argument("--crop-tables", action="store_true",
+                   help="Send only table regions; skip pages without tables")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--rps", type=float, default=2.0,
+                   help="Max requests per second (<=0: unlimited)")
+    p.add_argument("--burst", type=int, default=4)
+    p.add_argument("--max-retries", type=int, default=5)
+    p.add_argument("--deadline", type=float, default=None,
+                   help="Seconds per page, retries included (default: none)")
+    p.add_argument("--cache-db", default=None,
+                   help="Extraction cache file (default: $CPIC_EXTRACTION_CACHE)")
+    p.add_argument("--checkpoint", default="bulk_extract_checkpoint.jsonl")
+    p.add_argument("--limit", type=int, default=None,
+                   help="Only the first N pages (smoke runs)")
+    args = p.parse_args()
+
+    api_key = args.api_key or os.getenv("NVIDIA_API_TOKEN")
+    if not api_key:
+        sys.exit("❌  Provide --api-key or set NVIDIA_API_TOKEN environment var.")
+    cache = ExtractionCache(args.cache_db) if args.cache_db else default_extraction_cache()
+    if cache is None:
+        sys.exit("❌  The extraction cache is disabled; pass --cache-db.")
+
+    pages = list(iter_guideline_pages(args.cpic_dir))[:args.limit]
+    report = asyncio.run(bulk_extract(
+        pages, cache, prompt=args.prompt, model=args.model, api_key=api_key,
+        base_url=args.base_url, temperature=args.temp, top_p=args.top_p,
+        max_tokens=args.max_tokens, encoding=args.encoding,
+        crop_tables=args.crop_tables,
+        concurrency=args.concurrency,
+        rps=args.rps, burst=args.burst, max_retries=args.max_retries,
+        deadline=args.deadline,
+        checkpoint=args.checkpoint,
+    ))
+    print(f"[i] {report.summary()}")
+    for page, status, error in report.failures[:20]:
+        print(f"    ✗ {page} [{status}] {error[:200]}")
+    if report.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
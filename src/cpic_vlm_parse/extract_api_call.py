@@ -3,15 +3,30 @@
 """
 Send one page of a PDF to an NVIDIA/OpenAI multimodal model
 using pdf2image + PyMuPDF backend (no poppler needed).
+``send_pdf_pages`` packs several pages into one request.
 """
 
 import fitz  # pip install pymupdf
 from pathlib import Path
-import base64, os, io
+import base64, functools, os, io, re, time
+import httpx
 from openai import OpenAI
 from PIL import Image
 from pdf2image import convert_from_path     # uses PyMuPDF when use_fitz=True
 
+from cpic_vlm_parse.extraction_cache import (
+    ExtractionCache,
+    default_extraction_cache,
+    page_cache_id,
+)
+from cpic_vlm_parse.image_encoding import (
+    LOSSLESS, EncodingPolicy, encode_image, encode_pdf_page, resolve_policy,
+)
+from cpic_vlm_parse.request_policy import DEFAULT_POLICY, RequestPolicy, RequestRunner, runner_for
+from cpic_vlm_parse.table_regions import table_page_image
+from cpic_vlm_parse.vlm_stream import VLMStream
+from cpic_vlm_vector_store.page_store import default_store
+
 # ------------------------------------------------------------------ #
 # 1. Extract *one page* with PyMuPDF backend
 # ------------------------------------------------------------------ #
@@ -21,8 +36,17 @@ from pdf2image import convert_from_path     # uses PyMuPDF when use_fitz=True
 def pdf_page_to_base64(pdf_path: str | Path, page_index: int = 0) -> str:
     """
     Render a single PDF page with PyMuPDF and return base-64 PNG bytes.
+    Served from the page asset store when it is enabled.
     """
     pdf_path = Path(pdf_path)
+    store = default_store()
+    if store is not None:
+        try:
+            return store.get_base64(pdf_path, page_index, "full")
+        except IndexError:
+            raise ValueError(
+                f"Invalid page index {page_index} for {pdf_path}") from None
+
     doc = fitz.open(pdf_path)
     if page_index < 0 or page_index >= doc.page_count:
         raise ValueError(f"Invalid page index {page_index} for {pdf_path}")
@@ -35,12 +59,37 @@ def pdf_page_to_base64(pdf_path: str | Path, page_index: int = 0) -> str:
     img.save(buf, format="PNG")
     return base64.b64encode(buf.getvalue()).decode("utf-8")
 
+def encode_page(
+    pdf_path    : str | Path,
+    page_index  : int,
+    policy      : EncodingPolicy | None = None,
+    crop_tables : bool = False,
+) -> tuple[str, str] | None:
+    """
+    (base64 payload, mime type) of one page; ``policy=None`` keeps the
+    lossless 200 dpi PNG of ``pdf_page_to_base64``.
+
+    With ``crop_tables`` only the page's table regions are sent (see
+    ``table_regions``), and None is returned for pages without tables.
+    """
+    if crop_tables:
+        img = table_page_image(pdf_path, page_index)
+        if img is None:
+            return None
+        policy = policy or LOSSLESS
+        data = encode_image(img, policy)
+        return base64.b64encode(data).decode("utf-8"), policy.mime
+    if policy is None:
+        return pdf_page_to_base64(pdf_path, page_index), "image/png"
+    return encode_pdf_page(pdf_path, page_index, policy)
+
 # ------------------------------------------------------------------ #
 # 2. Build the correct multimodal message
 # ------------------------------------------------------------------ #
-def make_mm_message(text: str, b64_png: str) -> list[dict]:
+def make_mm_message(text: str, b64_png: str, mime: str = "image/png") -> list[dict]:
     """
     Returns the message array expected by OpenAI/NVIDIA multimodal chat.
+    ``mime`` must match the encoding of the base64 image.
     """
     return [
         {
@@ -50,7 +99,7 @@ def make_mm_message(text: str, b64_png: str) -> list[dict]:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{b64_png}",
+                        "url": f"data:{mime};base64,{b64_png}",
                         "detail": "auto",
                     },
                 },
@@ -61,7 +110,63 @@ def make_mm_message(text: str, b64_png: str) -> list[dict]:
 # ------------------------------------------------------------------ #
 # 3. Send to NVIDIA / OpenAI multimodal endpoint
 # ------------------------------------------------------------------ #
-def send_pdf_page(
+HTTP_LIMITS  = httpx.Limits(max_connections=16, max_keepalive_connections=16,
+                            keepalive_expiry=120)
+HTTP_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+
+
+@functools.lru_cache(maxsize=8)
+def get_client(base_url: str, api_key: str) -> OpenAI:
+    """
+    Long-lived client per (endpoint, key), so repeated calls reuse pooled
+    keep-alive connections instead of a fresh TCP/TLS handshake each time.
+    """
+    http = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return OpenAI(base_url=base_url, api_key=api_key, http_client=http)
+
+
+def policy_runner(policy: RequestPolicy | bool | None) -> RequestRunner | None:
+    """None/True → ``DEFAULT_POLICY``, False → no policy (single attempt)."""
+    if policy is False:
+        return None
+    return runner_for(DEFAULT_POLICY if policy in (None, True) else policy)
+
+
+def create_completion(client: OpenAI, policy: RequestPolicy | bool | None = None,
+                      discard=None, **kwargs):
+    """
+    ``chat.completions.create`` under a request policy: deadline, jittered
+    retries and optional hedging (see ``request_policy``).  ``discard``
+    receives hedged results that lost, e.g. ``lambda s: s.close()``.
+    """
+    runner = policy_runner(policy)
+    if runner is None:
+        return client.chat.completions.create(**kwargs)
+    client = client.with_options(max_retries=0)    # the policy retries
+
+    def attempt(timeout: float | None):
+        if timeout is not None:
+            return client.chat.completions.create(timeout=timeout, **kwargs)
+        return client.chat.completions.create(**kwargs)
+
+    return runner.run_sync(attempt, discard=discard)
+
+
+def page_key_params(
+    params      : dict,
+    policy      : EncodingPolicy | None,
+    crop_tables : bool = False,
+) -> dict:
+    """Sampling params plus whatever changes the image, for cache keys."""
+    key = dict(params)
+    if policy is not None:
+        key["encoding"] = policy.tag()
+    if crop_tables:
+        key["crop"] = "tables"
+    return key
+
+
+def stream_pdf_page(
     pdf_file    : str | Path,
     page_idx    : int,
     user_prompt : str,
@@ -71,29 +176,271 @@ def send_pdf_page(
     temperature : float = 0.7,
     top_p       : float = 0.95,
     max_tokens  : int = 1024,
-):
+    cache       : ExtractionCache | bool | None = None,
+    encoding    : EncodingPolicy | str | None = None,
+    crop_tables : bool = False,
+    policy      : RequestPolicy | bool | None = None,
+) -> VLMStream:
+    """
+    Start extracting one page and return a ``VLMStream`` of text pieces;
+    ``.text`` / ``.ttft`` / ``.total`` / ``.tokens`` are set once drained.
+
+    Results are cached per (page, prompt, model, sampling params) and the
+    cache is consulted before rendering or calling the API; ``cache=None``
+    uses ``default_extraction_cache()``, ``cache=False`` disables it.
+    A complete answer is written back to the cache when the stream ends.
+
+    ``encoding`` selects the image payload (see ``image_encoding``): an
+    ``EncodingPolicy``, a preset name, or "auto" for the model's preset;
+    None sends the lossless PNG.  ``crop_tables`` sends only the table
+    regions and answers "" without a request for pages that have none.
+
+    Opening the stream runs under ``policy`` (default ``DEFAULT_POLICY``:
+    deadline plus jittered retries; ``False`` for a single attempt).  With
+    hedging, the first stream to start wins and the other is closed.
+    """
+    if cache is None:
+        cache = default_extraction_cache()
+    enc_policy = resolve_policy(encoding, model)
+    page_id = page_cache_id(pdf_file, page_idx)
+    params  = {"temperature": temperature, "top_p": top_p,
+               "max_tokens": max_tokens}
+    key_params = page_key_params(params, enc_policy, crop_tables)
+    if cache:
+        text = cache.get(page_id, user_prompt, model, key_params)
+        if text is not None:
+            return VLMStream.from_text(text)
+
     if not api_key:
         raise RuntimeError("Set NVIDIA_API_TOKEN (or pass api_key=…)")
 
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    client = get_client(base_url, api_key)
 
-    img_b64   = pdf_page_to_base64(pdf_file, page_idx)
-    messages  = make_mm_message(user_prompt, img_b64)
+    encoded = encode_page(pdf_file, page_idx, enc_policy, crop_tables)
+    if encoded is None:                            # no tables on the page
+        return VLMStream(iter(()))
+    img_b64, mime = encoded
+    messages  = make_mm_message(user_prompt, img_b64, mime)
 
-    completion = client.chat.completions.create(
+    def remember(stream: VLMStream) -> None:
+        if cache and stream.text:
+            cache.put(page_id, user_prompt, model, key_params, stream.text)
+
+    started = time.perf_counter()
+    completion = create_completion(
+        client, policy, discard=lambda s: s.close(),
         model=model,
         messages=messages,
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=max_tokens,
         stream=True,
+        **params,
     )
+    return VLMStream(completion, started=started, on_done=remember)
+
 
-    print("---- Response ----")
-    for chunk in completion:
-        if chunk.choices[0].delta.content:
-            print(chunk.choices[0].delta.content, end="", flush=True)
+def send_pdf_page(
+    pdf_file    : str | Path,
+    page_idx    : int,
+    user_prompt : str,
+    model       : str = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1",
+    api_key     : str | None = os.getenv("NVIDIA_API_TOKEN"),
+    base_url    : str = "https://integrate.api.nvidia.com/v1",
+    temperature : float = 0.7,
+    top_p       : float = 0.95,
+    max_tokens  : int = 1024,
+    cache       : ExtractionCache | bool | None = None,
+    encoding    : EncodingPolicy | str | None = None,
+    crop_tables : bool = False,
+    policy      : RequestPolicy | bool | None = None,
+) -> str:
+    """
+    Print the model's answer for one page as it streams and return it.
+    See ``stream_pdf_page`` for caching, ``encoding``, ``crop_tables``
+    and ``policy``.
+    """
+    stream = stream_pdf_page(
+        pdf_file, page_idx, user_prompt, model=model, api_key=api_key,
+        base_url=base_url, temperature=temperature, top_p=top_p,
+        max_tokens=max_tokens, cache=cache, encoding=encoding,
+        crop_tables=crop_tables, policy=policy,
+    )
+    print("---- Response (cached) ----" if stream.cached else "---- Response ----")
+    for piece in stream:
+        print(piece, end="", flush=True)
     print()
+    return stream.text
+
+# ------------------------------------------------------------------ #
+# 4. Several pages in one request
+# ------------------------------------------------------------------ #
+PAGE_MARKER = "### PAGE {k}"
+# Models echo the marker as asked, as bold text or as a bare line.  A bare
+# or bold marker must fill its line (an optional ":" or "(label)" aside) so
+# prose such as "Page 3 lists the alleles" is not taken for one.
+_PAGE_MARKER_RE = re.compile(r"""
+    ^[ \t]*(?:
+        \#{1,6}[ \t]*(?:\*\*|__)?PAGE[ \t]+(\d+)\b[^\n]*
+      | (?:\*\*|__)?PAGE[ \t]+(\d+)(?:\*\*|__)?[ \t]*:?[ \t]*
+        (?:\([^\n]*\))?[ \t]*(?:\*\*|__)?[ \t]*
+    )$""", re.IGNORECASE | re.MULTILINE | re.VERBOSE)
+
+# Tiling used to estimate image tokens: (tile side px, tokens per tile, max tiles)
+IMAGE_TILING = {
+    "nvidia/llama-3.1-nemotron-nano-vl-8b-v1": (512, 256, 12),
+}
+DEFAULT_TILING = (512, 256, 12)
+
+
+def estimate_image_tokens(width: int, height: int, model: str = "") -> int:
+    """Vision tokens for one image: tiles (+1 thumbnail tile when split)."""
+    tile, per_tile, max_tiles = IMAGE_TILING.get(model, DEFAULT_TILING)
+    tiles = min(max_tiles, -(-width // tile) * -(-height // tile))
+    return per_tile * (tiles + (1 if tiles > 1 else 0))
+
+
+def make_multi_page_message(
+    text   : str,
+    images : list[tuple[str, str, str]],
+) -> list[dict]:
+    """
+    One user message carrying several pages.  ``images`` holds
+    (label, base64, mime); each image is preceded by its ``PAGE_MARKER``
+    and the model is asked to answer per page under the same markers.
+    """
+    header = (
+        f"You are given {len(images)} document pages, each preceded by a "
+        f"line '{PAGE_MARKER.format(k='<k>')}'. Do the task below separately "
+        f"for every page. Start the answer for page k with the line "
+        f"'{PAGE_MARKER.format(k='<k>')}' and answer every page, even if "
+        f"the answer is empty.\n\nTask: {text}"
+    )
+    content: list[dict] = [{"type": "text", "text": header}]
+    for k, (label, b64, mime) in enumerate(images, 1):
+        content.append({"type": "text",
+                        "text": f"{PAGE_MARKER.format(k=k)} ({label})"})
+        content.append({"type": "image_url",
+                        "image_url": {"url": f"data:{mime};base64,{b64}",
+                                      "detail": "auto"}})
+    return [{"role": "user", "content": content}]
+
+
+def split_multi_page_response(text: str, n: int) -> list[str | None]:
+    """Per-page answers by ``PAGE_MARKER``; None where a page is missing."""
+    out: list[str | None] = [None] * n
+    marks = list(_PAGE_MARKER_RE.finditer(text))
+    for i, m in enumerate(marks):
+        k = int(m.group(1) or m.group(2))
+        end = marks[i + 1].start() if i + 1 < len(marks) else len(text)
+        if 1 <= k <= n and out[k - 1] is None:
+            out[k - 1] = text[m.end():end].strip()
+    return out
+
+
+def pack_pages(
+    image_tokens : list[int],
+    token_budget : int,
+    max_pages    : int,
+) -> list[list[int]]:
+    """Greedy, order-preserving groups of page indices within the budget."""
+    groups: list[list[int]] = []
+    used = 0
+    for i, tokens in enumerate(image_tokens):
+        if groups and len(groups[-1]) < max_pages and used + tokens <= token_budget:
+            groups[-1].append(i)
+            used += tokens
+        else:
+            groups.append([i])
+            used = tokens
+    return groups
+
+
+def send_pdf_pages(
+    pages        : list[tuple[str | Path, int]],
+    user_prompt  : str,
+    model        : str = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1",
+    api_key      : str | None = os.getenv("NVIDIA_API_TOKEN"),
+    base_url     : str = "https://integrate.api.nvidia.com/v1",
+    temperature  : float = 0.7,
+    top_p        : float = 0.95,
+    max_tokens   : int = 1024,
+    cache        : ExtractionCache | bool | None = None,
+    encoding     : EncodingPolicy | str | None = None,
+    crop_tables  : bool = False,
+    token_budget : int = 8192,
+    max_pages    : int = 4,
+    policy       : RequestPolicy | bool | None = None,
+) -> list[str]:
+    """
+    Extract several (pdf, page index) pairs with as few requests as
+    possible and return one answer per page, in order.
+
+    Pages are packed into one message while their estimated image tokens
+    fit ``token_budget`` (at most ``max_pages`` per request); the answer is
+    split back on ``PAGE_MARKER`` lines and ``max_tokens`` applies per page.
+    Pages the model skipped are re-sent on their own.  Single-page cache
+    entries are served first; packed answers are cached under their own
+    key, since they come from a different prompt.
+    """
+    if cache is None:
+        cache = default_extraction_cache()
+    enc_policy = resolve_policy(encoding, model)
+    params = {"temperature": temperature, "top_p": top_p,
+              "max_tokens": max_tokens}
+    single_key = page_key_params(params, enc_policy, crop_tables)
+    packed_key = {**single_key, "packed": True}
+    ids = [page_cache_id(pdf, idx) for pdf, idx in pages]
+
+    results: list[str | None] = [None] * len(pages)
+    if cache:
+        for i, page_id in enumerate(ids):
+            results[i] = cache.get(page_id, user_prompt, model, single_key)
+            if results[i] is None:
+                results[i] = cache.get(page_id, user_prompt, model, packed_key)
+
+    todo, images, tokens = [], [], []
+    for i, (pdf, idx) in enumerate(pages):
+        if results[i] is not None:
+            continue
+        encoded = encode_page(pdf, idx, enc_policy, crop_tables)
+        if encoded is None:                        # no tables on the page
+            results[i] = ""
+            continue
+        b64, mime = encoded
+        with Image.open(io.BytesIO(base64.b64decode(b64))) as img:
+            size = img.size
+        todo.append(i)
+        images.append((f"{Path(pdf).name}, page {idx + 1}", b64, mime))
+        tokens.append(estimate_image_tokens(*size, model=model))
 
+    if todo:
+        if not api_key:
+            raise RuntimeError("Set NVIDIA_API_TOKEN (or pass api_key=…)")
+        client = get_client(base_url, api_key)
 
-    
+    for group in pack_pages(tokens, token_budget, max_pages):
+        if len(group) == 1:
+            messages = make_mm_message(user_prompt, *images[group[0]][1:])
+        else:
+            messages = make_multi_page_message(
+                user_prompt, [images[g] for g in group])
+        completion = create_completion(
+            client, policy, model=model, messages=messages, stream=False,
+            temperature=temperature, top_p=top_p,
+            max_tokens=max_tokens * len(group),
+        )
+        text = completion.choices[0].message.content or ""
+        answers = [text] if len(group) == 1 else split_multi_page_response(text, len(group))
+        for g, answer in zip(group, answers):
+            i = todo[g]
+            if answer is None:                     # model skipped this page
+                pdf, idx = pages[i]
+                answer = stream_pdf_page(
+                    pdf, idx, user_prompt, model=model, api_key=api_key,
+                    base_url=base_url, temperature=temperature, top_p=top_p,
+                    max_tokens=max_tokens, cache=cache, encoding=enc_policy,
+                    crop_tables=crop_tables, policy=policy,
+                ).read()
+            elif cache and answer:
+                cache.put(ids[i], user_prompt, model,
+                          single_key if len(group) == 1 else packed_key, answer)
+            results[i] = answer
+    return [r or "" for r in results]
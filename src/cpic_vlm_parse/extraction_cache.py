@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# extraction_cache.py
+# ---------------------------------------------------------------------
+# Persistent cache of VLM page extractions
+#
+# Key   : sha256(page id, sha256(prompt), model id, sampling params)
+#         page id = sha_id(file name, page) + the PDF's sha256, so a
+#         revised PDF saved under the same name never hits stale text
+# Value : full extracted text
+#
+# Stored in one SQLite file so every process (CLI, bulk runs, notebooks)
+# shares it.  Entries are evicted least-recently-used once the stored
+# text exceeds ``max_bytes``; hit/miss counters persist for --report.
+#
+# Location: $CPIC_EXTRACTION_CACHE (default ~/.cache/cpic_extractions.db,
+# "off" disables); size limit: $CPIC_EXTRACTION_CACHE_MB (default 512).
+#
+# Example
+# -------
+# python extraction_cache.py --report
+# python extraction_cache.py --clear
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from cpic_vlm_vector_store.page_store import pdf_sha256
+from cpic_vlm_vector_store.pdf_helper import sha_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key         TEXT PRIMARY KEY,
+    page_id     TEXT NOT NULL,
+    model       TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    text        TEXT NOT NULL,
+    bytes       INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def page_cache_id(pdf_path: str | os.PathLike, page_idx: int) -> str:
+    """Cache page id: ``sha_id(name, page)`` tied to the PDF's content."""
+    return f"{sha_id(Path(pdf_path).name, page_idx)}-{pdf_sha256(pdf_path)[:16]}"
+
+
+class ExtractionCache:
+    """Thread-safe SQLite cache of (page, prompt, model, params) → text."""
+
+    def __init__(self, path: str | os.PathLike, max_bytes: int = 512 << 20) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.hits = self.misses = 0            # this process only
+
+    # -------------------------------------------------------------- #
+    @staticmethod
+    def key(page_id: str, prompt: str, model: str, params: Dict) -> str:
+        raw = json.dumps([page_id, prompt_hash(prompt), model, params],
+                         sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _bump(self, name: str) -> None:
+        self._db.execute(
+            "INSERT INTO counters VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def contains(self, page_id: str, prompt: str, model: str, params: Dict) -> bool:
+        """Membership test that does not count as a lookup."""
+        key = self.key(page_id, prompt, model, params)
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM extractions WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, page_id: str, prompt: str, model: str, params: Dict) -> str | None:
+        key = self.key(page_id, prompt, model, params)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._bump("misses")
+                return None
+            self._db.execute(
+                "UPDATE extractions SET last_access = ? WHERE key = ?",
+                (time.time(), key))
+            self.hits += 1
+            self._bump("hits")
+            return row[0]
+
+    def put(self, page_id: str, prompt: str, model: str, params: Dict,
+            text: str) -> None:
+        key = self.key(page_id, prompt, model, params)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?,?,?,?,?,?,?,?,?)",
+                (key, page_id, model, prompt_hash(prompt),
+                 json.dumps(params, sort_keys=True), text,
+                 len(text.encode("utf-8")), now, now))
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute(
+                "SELECT key, bytes FROM extractions ORDER BY last_access"):
+            if total - freed <= self.max_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM extractions WHERE key = ?", doomed)
+        self._db.execute(
+            "INSERT INTO counters VALUES ('evictions', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (len(doomed),))
+
+    # -------------------------------------------------------------- #
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM extractions"
+            ).fetchone()
+            counters = dict(self._db.execute("SELECT name, value FROM counters"))
+            models = dict(self._db.execute(
+                "SELECT model, COUNT(*) FROM extractions GROUP BY model"))
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "models": models,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM extractions")
+            self._db.execute("DELETE FROM counters")
+            self.hits = self.misses = 0
+
+    def close(self) -> None:
+        self._db.close()
+
+
+_DEFAULT: ExtractionCache | None = None
+
+
+def default_extraction_cache() -> ExtractionCache | None:
+    """Process-wide cache from $CPIC_EXTRACTION_CACHE, or None when disabled."""
+    global _DEFAULT
+    path = os.getenv("CPIC_EXTRACTION_CACHE", "~/.cache/cpic_extractions.db")
+    if path.lower() in ("", "off", "0", "none"):
+        return None
+    max_bytes = int(float(os.getenv("CPIC_EXTRACTION_CACHE_MB", "512")) * (1 << 20))
+    if _DEFAULT is None or _DEFAULT.path != Path(path).expanduser():
+        _DEFAULT = ExtractionCache(path, max_bytes)
+    return _DEFAULT
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Inspect the VLM extraction cache")
+    p.add_argument("--db", default=None,
+                   help="cache file (default: $CPIC_EXTRACTION_CACHE)")
+    p.add_argument("--report", action="store_true", help="print usage stats")
+    p.add_argument("--clear", action="store_true", help="drop all entries")
+    args = p.parse_args()
+
+    if args.db:
+        cache = ExtractionCache(args.db)
+    else:
+        cache = default_extraction_cache()
+        if cache is None:
+            sys.exit("Extraction cache is disabled (CPIC_EXTRACTION_CACHE=off)")
+
+    if args.clear:
+        cache.clear()
+        print(f"[i] Cleared {cache.path}")
+    if args.report or not args.clear:
+        s = cache.stats()
+        print(f"cache      : {cache.path}")
+        print(f"entries    : {s['entries']}")
+        print(f"size       : {s['bytes'] / 1e6:.2f} / {s['max_bytes'] / 1e6:.0f} MB")
+        print(f"hits/misses: {s['hits']} / {s['misses']} "
+              f"(hit rate {s['hit_rate']:.1%})")
+        print(f"evictions  : {s['evictions']}")
+        for model, n in sorted(s["models"].items()):
+            print(f"  {n:6d}  {model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# image_encoding.py
+# ---------------------------------------------------------------------
+# Encoding policies for page images sent to the VLM
+#
+# A policy picks the container (PNG / JPEG / WebP), lossy quality, a
+# max-pixel budget matched to what the target model actually sees, and
+# optional whitespace-margin cropping.  Guideline pages are mostly white
+# paper and black text, so cropping margins and downscaling to the model's
+# input budget shrink the base64 payload far more than PNG can.
+#
+#   policy = policy_for("nvidia/llama-3.1-nemotron-nano-vl-8b-v1")
+#   b64, mime = encode_pdf_page(pdf, 3, policy)
+#
+# benchmarks/bench_image_encoding.py measures bytes / encode time against
+# a text-fidelity proxy for each policy.
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import base64
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+
+import fitz                    # PyMuPDF
+from PIL import Image
+
+from cpic_vlm_vector_store.page_store import RENDER_DPI, default_store
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+@dataclass(frozen=True)
+class EncodingPolicy:
+    """
+    format       : "png", "jpeg" or "webp".
+    quality      : 1-100 for JPEG/WebP (ignored for PNG).
+    max_pixels   : downscale so width × height fits; None keeps the render.
+    crop_margins : trim near-white page margins before scaling.
+    margin_pad   : pixels of white kept around the cropped content.
+    """
+    format: str = "png"
+    quality: int = 90
+    max_pixels: int | None = None
+    crop_margins: bool = False
+    margin_pad: int = 16
+
+    def __post_init__(self) -> None:
+        if self.format not in MIME_TYPES:
+            raise ValueError(f"format must be one of {list(MIME_TYPES)}")
+
+    @property
+    def mime(self) -> str:
+        return MIME_TYPES[self.format]
+
+    def tag(self) -> str:
+        """Short stable id, part of the extraction cache key."""
+        parts = [self.format]
+        if self.format != "png":
+            parts.append(f"q{self.quality}")
+        if self.max_pixels:
+            parts.append(f"{self.max_pixels}px")
+        if self.crop_margins:
+            parts.append(f"crop{self.margin_pad}")
+        return "-".join(parts)
+
+
+LOSSLESS = EncodingPolicy()
+
+# Pixel budgets follow each model's tiling: anything above it is resized
+# away server-side, so sending it only costs upload time.
+MODEL_POLICIES: Dict[str, EncodingPolicy] = {
+    # up to 12 tiles of 512×512
+    "nvidia/llama-3.1-nemotron-nano-vl-8b-v1": EncodingPolicy(
+        "jpeg", quality=90, max_pixels=12 * 512 * 512, crop_margins=True),
+}
+
+NAMED_POLICIES: Dict[str, EncodingPolicy] = {
+    "png": LOSSLESS,
+    "png-crop": EncodingPolicy("png", crop_margins=True),
+    "jpeg": EncodingPolicy("jpeg", quality=90, crop_margins=True),
+    "webp": EncodingPolicy("webp", quality=85, crop_margins=True),
+}
+
+
+def policy_for(model: str) -> EncodingPolicy:
+    """Preset for ``model``; lossless PNG when the model is unknown."""
+    return MODEL_POLICIES.get(model, LOSSLESS)
+
+
+def resolve_policy(spec: EncodingPolicy | str | None, model: str = "") -> EncodingPolicy | None:
+    """None → None (legacy PNG path), "auto" → ``policy_for(model)``, name → preset."""
+    if spec is None or isinstance(spec, EncodingPolicy):
+        return spec
+    if spec == "auto":
+        return policy_for(model)
+    try:
+        return NAMED_POLICIES[spec]
+    except KeyError:
+        raise ValueError(
+            f"unknown encoding {spec!r}; use 'auto' or one of {list(NAMED_POLICIES)}"
+        ) from None
+
+
+# ------------------------------------------------------------------ #
+# image operations                                                   #
+# ------------------------------------------------------------------ #
+def crop_whitespace(img: Image.Image, pad: int = 16, threshold: int = 245) -> Image.Image:
+    """Crop to the bounding box of pixels darker than ``threshold``."""
+    gray = img.convert("L")
+    mask = gray.point(lambda v: 255 if v < threshold else 0)
+    bbox = mask.getbbox()
+    if bbox is None:                               # blank page
+        return img
+    l, t, r, b = bbox
+    return img.crop((max(0, l - pad), max(0, t - pad),
+                     min(img.width, r + pad), min(img.height, b + pad)))
+
+
+def fit_pixels(img: Image.Image, max_pixels: int | None) -> Image.Image:
+    """Downscale (never upscale) so width × height ≤ ``max_pixels``."""
+    if not max_pixels or img.width * img.height <= max_pixels:
+        return img
+    scale = (max_pixels / (img.width * img.height)) ** 0.5
+    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def encode_image(img: Image.Image, policy: EncodingPolicy) -> bytes:
+    """Apply ``policy`` to a page image and return the encoded bytes."""
+    if policy.crop_margins:
+        img = crop_whitespace(img, policy.margin_pad)
+    img = fit_pixels(img, policy.max_pixels)
+    buf = io.BytesIO()
+    if policy.format == "png":
+        img.save(buf, format="PNG", optimize=False)
+    elif policy.format == "jpeg":
+        img.convert("RGB").save(buf, format="JPEG", quality=policy.quality,
+                                optimize=True, subsampling=0)
+    else:
+        img.save(buf, format="WEBP", quality=policy.quality, method=4)
+    return buf.getvalue()
+
+
+def render_page(pdf_path: str | Path, page_index: int) -> Image.Image:
+    """Full-size page image, from the page asset store when enabled."""
+    store = default_store()
+    if store is not None:
+        try:
+            return store.get_image(pdf_path, page_index, "full")
+        except IndexError:
+            raise ValueError(
+                f"Invalid page index {page_index} for {pdf_path}") from None
+    with fitz.open(pdf_path) as doc:
+        if page_index < 0 or page_index >= doc.page_count:
+            raise ValueError(f"Invalid page index {page_index} for {pdf_path}")
+        pix = doc.load_page(page_index).get_pixmap(dpi=RENDER_DPI)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+
+def encode_pdf_page(
+    pdf_path: str | Path,
+    page_index: int,
+    policy: EncodingPolicy,
+) -> Tuple[str, str]:
+    """(base64 payload, mime type) of one page under ``policy``."""
+    data = encode_image(render_page(pdf_path, page_index), policy)
+    return base64.b64encode(data).decode("utf-8"), policy.mime
+
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local OpenAI-compatible stand-in for the NVIDIA multimodal endpoint.
+
+Endpoints
+---------
+POST /v1/chat/completions   canned markdown answer, JSON or SSE stream
+GET  /v1/models             the served model id
+
+The answer is derived from the request (prompt and image digest), so the
+same page always gets the same text.  Delay, slow outliers, error codes
+and dropped connections can be injected to exercise bulk extraction,
+rate limiting, retries, deadlines and hedging.
+
+Example
+-------
+python mock_vlm_server.py --port 8000 --latency 0.5 --error-rate 0.1
+python mock_vlm_server.py --latency 0.2 --slow-rate 0.05 --slow-latency 5
+python bulk_extract.py --base-url http://127.0.0.1:8000/v1 --api-key x
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+def _default_answer(body: Dict) -> str:
+    digest = hashlib.sha256(
+        json.dumps(body.get("messages", []), sort_keys=True).encode()
+    ).hexdigest()[:12]
+    return (
+        "| Phenotype | Recommendation |\n"
+        "|---|---|\n"
+        f"| mock-{digest} | see page |\n"
+    )
+
+
+class MockVLMServer:
+    """
+    Threaded in-process OpenAI chat-completions stand-in.
+
+    Parameters
+    ----------
+    latency     : seconds before the first byte of every response.
+    token_delay : seconds between streamed chunks.
+    error_rate  : probability that a completion answers with one of
+                  ``error_codes`` instead of 200.
+    slow_rate   : probability that a completion waits ``slow_latency``
+                  instead of ``latency`` (tail-latency outliers).
+    drop_rate   : probability that the connection is closed without a
+                  response (transport error on the client).
+    answer_fn   : callable(body: dict) -> answer text.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        model: str = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1",
+        latency: float = 0.0,
+        token_delay: float = 0.0,
+        error_rate: float = 0.0,
+        error_codes: tuple = (429, 503),
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        drop_rate: float = 0.0,
+        answer_fn: Optional[Callable[[Dict], str]] = None,
+        seed: int = 0,
+    ) -> None:
+        self.model = model
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.drop_rate = drop_rate
+        self.answer_fn = answer_fn or _default_answer
+        self.requests: List[Dict] = []           # request bodies, no images
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------------------------------------------- #
+    @property
+    def url(self) -> str:
+        """Base URL to pass as ``base_url`` to an OpenAI client."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockVLMServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockVLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # -------------------------------------------------------------- #
+    def _inject_error(self) -> Optional[int]:
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return self._rng.choice(self.error_codes)
+        return None
+
+    def _delay(self) -> float:
+        with self._lock:
+            if self.slow_rate and self._rng.random() < self.slow_rate:
+                return self.slow_latency
+        return self.latency
+
+    def _inject_drop(self) -> bool:
+        with self._lock:
+            return bool(self.drop_rate) and self._rng.random() < self.drop_rate
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"           # keep-alive
+
+            def log_message(self, *args):           # silence stderr
+                pass
+
+            def _body(self) -> Dict:
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n) if n else b""
+                return json.loads(raw) if raw else {}
+
+            def _send(self, status: int, payload: Dict) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/v1/models":
+                    return self._send(200, {
+                        "object": "list",
+                        "data": [{"id": mock.model, "object": "model"}],
+                    })
+                self._send(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    return self._send(404, {"error": {"message": "not found"}})
+                body = self._body()
+                with mock._lock:
+                    mock.requests.append(
+                        {k: v for k, v in body.items() if k != "messages"})
+                delay = mock._delay()
+                if delay:
+                    time.sleep(delay)
+                if mock._inject_drop():
+                    self.close_connection = True
+                    return
+                code = mock._inject_error()
+                if code is not None:
+                    return self._send(code, {"error": {
+                        "message": "injected failure", "code": code}})
+
+                text = mock.answer_fn(body)
+                cid = f"chatcmpl-{hashlib.sha1(text.encode()).hexdigest()[:16]}"
+                model = body.get("model", mock.model)
+                if body.get("stream"):
+                    return self._stream(cid, model, text)
+                self._send(200, {
+                    "id": cid,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0,
+                              "completion_tokens": len(text.split()),
+                              "total_tokens": len(text.split())},
+                })
+
+            def _stream(self, cid: str, model: str, text: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def event(delta: Dict, finish: Optional[str] = None) -> None:
+                    chunk = {
+                        "id": cid,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta,
+                                     "finish_reason": finish}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+
+                event({"role": "assistant", "content": ""})
+                for piece in text.splitlines(keepends=True):
+                    if mock.token_delay:
+                        time.sleep(mock.token_delay)
+                    event({"content": piece})
+                event({}, finish="stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Run a local OpenAI-compatible mock VLM")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--latency", type=float, default=0.0)
+    p.add_argument("--token-delay", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--slow-rate", type=float, default=0.0)
+    p.add_argument("--slow-latency", type=float, default=5.0)
+    p.add_argument("--drop-rate", type=float, default=0.0)
+    args = p.parse_args()
+
+    srv = MockVLMServer(args.host, args.port, latency=args.latency,
+                        token_delay=args.token_delay,
+                        error_rate=args.error_rate,
+                        slow_rate=args.slow_rate,
+                        slow_latency=args.slow_latency,
+                        drop_rate=args.drop_rate)
+    print(f"[i] Mock VLM listening on {srv.url}")
+    try:
+        srv._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+# request_policy.py
+# ---------------------------------------------------------------------
+# Deadlines, retries and hedging for VLM calls
+#
+# A RequestRunner executes one logical call under a RequestPolicy:
+#   deadline     hard cap on the whole call, retries included
+#   retries      transient failures (429/5xx, transport, attempt timeout)
+#                are retried with full-jitter exponential backoff, never
+#                sleeping past the deadline
+#   hedging      if an attempt has not answered after the p95 of recent
+#                successful latencies, a duplicate is sent and whichever
+#                answers first wins; the loser is cancelled / discarded
+# and records RequestMetrics (latency percentiles of the winning attempts,
+# retries, hedges, wins).
+#
+# The wrapped function receives the seconds left for that attempt, to
+# pass on as the HTTP timeout.  Async callers use ``run``, optionally with
+# a slot to acquire per attempt (a client's concurrency limit): timers
+# start once the slot is held.  Sync callers use ``run_sync`` (one thread
+# per attempt).
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures as cf
+import functools
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, TypeVar
+
+import httpx
+import openai
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call did not succeed before its deadline."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError,
+                            httpx.TransportError, TimeoutError))
+
+
+@dataclass(frozen=True)
+class RequestPolicy:
+    """
+    deadline            : seconds for the whole call (None: unbounded).
+    attempt_timeout     : seconds per attempt (None: what is left).
+    max_retries         : retries after the first attempt.
+    hedge               : send a duplicate after ``hedge_delay()``.
+    hedge_quantile      : latency quantile used as the hedge delay.
+    hedge_default_delay : delay until ``min_samples`` latencies are known.
+    """
+    deadline: float | None = 120.0
+    attempt_timeout: float | None = None
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_delay: float = 0.25
+    hedge_default_delay: float = 10.0
+    min_samples: int = 20
+    window: int = 512
+
+
+DEFAULT_POLICY = RequestPolicy()
+
+
+@dataclass
+class RequestMetrics:
+    """Counters and a sliding window of successful call latencies."""
+    window: int = 512
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    attempts: int = 0
+    retries: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    deadline_exceeded: int = 0
+    latencies: deque = field(default_factory=deque)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self) -> None:
+        self.latencies = deque(self.latencies, maxlen=self.window)
+
+    def bump(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            data = sorted(self.latencies)
+        if not data:
+            return None
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def as_dict(self) -> Dict[str, float | int | None]:
+        return {
+            "calls": self.calls, "successes": self.successes,
+            "failures": self.failures, "attempts": self.attempts,
+            "retries": self.retries, "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "p50": self.quantile(0.50), "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def summary(self) -> str:
+        def ms(v):
+            return f"{v * 1e3:.0f} ms" if v is not None else "n/a"
+        return (
+            f"{self.successes}/{self.calls} ok, p50 {ms(self.quantile(0.5))}, "
+            f"p95 {ms(self.quantile(0.95))}, p99 {ms(self.quantile(0.99))}, "
+            f"{self.retries} retries, {self.hedges} hedges "
+            f"({self.hedge_wins} won), {self.deadline_exceeded} deadlines"
+        )
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` acquisitions per second, ``burst`` deep."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:                          # unlimited
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RequestRunner:
+    """Runs calls under one policy; latency history drives the hedge delay."""
+
+    def __init__(self, policy: RequestPolicy = DEFAULT_POLICY,
+                 metrics: RequestMetrics | None = None,
+                 retryable: Callable[[BaseException], bool] = is_retryable) -> None:
+        self.policy = policy
+        self.metrics = metrics or RequestMetrics(window=policy.window)
+        self.retryable = retryable
+
+    def hedge_delay(self) -> float:
+        p = self.policy
+        if len(self.metrics.latencies) < p.min_samples:
+            return p.hedge_default_delay
+        return max(p.hedge_min_delay, self.metrics.quantile(p.hedge_quantile))
+
+    def _budget(self, deadline_at: float | None) -> float | None:
+        """Seconds for the next attempt, or raise if the deadline passed."""
+        left = None if deadline_at is None else deadline_at - time.monotonic()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"deadline of {self.policy.deadline}s exceeded")
+        limits = [x for x in (left, self.policy.attempt_timeout) if x is not None]
+        return min(limits) if limits else None
+
+    # -------------------------------------------------------------- #
+    # async                                                          #
+    # -------------------------------------------------------------- #
+    async def run(
+        self,
+        fn: Callable[[float | None], Awaitable[T]],
+        discard: Callable[[T], Awaitable[None] | None] | None = None,
+        acquire: Callable[[], Awaitable[None]] | None = None,
+        release: Callable[[], None] | None = None,
+    ) -> T:
+        """
+        Await ``fn(timeout)`` under the policy.  ``discard`` receives
+        results of hedged attempts that lost the race (e.g. to close a
+        stream).
+
+        ``acquire`` is awaited before every attempt, hedges included, to
+        take a client-side slot; the attempt timeout, the hedge timer and
+        the latency sample start only once it returns, so queueing for a
+        slot is not mistaken for a slow server.  A failed or abandoned
+        attempt gives its slot back through ``release``; a successful one
+        keeps it, and the caller (or ``discard``, for a loser) releases it.
+        """
+        p, m = self.policy, self.metrics
+        m.bump("calls")
+        deadline_at = None if p.deadline is None else time.monotonic() + p.deadline
+        for attempt in range(p.max_retries + 1):
+            try:
+                left = self._left(deadline_at)
+                result, took = await asyncio.wait_for(
+                    self._hedged(fn, deadline_at, discard, acquire, release),
+                    timeout=left)
+            except DeadlineExceeded:
+                break
+            except Exception as exc:
+                if isinstance(exc, asyncio.TimeoutError):
+                    exc = TimeoutError("attempt timed out")
+                if not self.retryable(exc) or attempt == p.max_retries:
+                    m.bump("failures")
+                    raise exc
+                m.bump("retries")
+                left = None if deadline_at is None else deadline_at - time.monotonic()
+                pause = _backoff(attempt, p.backoff_base, p.backoff_max)
+                await asyncio.sleep(pause if left is None else max(0.0, min(pause, left)))
+                continue
+            m.bump("successes")
+            m.observe(took)
+            return result
+        m.bump("failures")
+        m.bump("deadline_exceeded")
+        raise DeadlineExceeded(f"deadline of {p.deadline}s exceeded")
+
+    def _left(self, deadline_at: float | None) -> float | None:
+        """Seconds to the deadline, or raise if it passed."""
+        if deadline_at is None:
+            return None
+        left = deadline_at - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded(f"deadline of {self.policy.deadline}s exceeded")
+        return left
+
+    async def _attempt(self, fn, deadline_at, acquire, release, held) -> T:
+        """One attempt: wait for a slot, then ``fn`` under its own timeout."""
+        self.metrics.bump("attempts")
+        if acquire is not None:
+            await acquire()
+        try:
+            held.set()
+            budget = self._budget(deadline_at)
+            started = time.monotonic()
+            result = await asyncio.wait_for(fn(budget), timeout=budget)
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+        return result, time.monotonic() - started
+
+    async def _hedged(self, fn, deadline_at, discard, acquire, release):
+        """(result, seconds the winning attempt held its slot)."""
+        held = asyncio.Event()
+        if not self.policy.hedge:
+            return await self._attempt(fn, deadline_at, acquire, release, held)
+        tasks = [asyncio.ensure_future(
+            self._attempt(fn, deadline_at, acquire, release, held))]
+        winner = None
+        try:
+            # the hedge timer starts once the primary holds its slot
+            ready = asyncio.ensure_future(held.wait())
+            await asyncio.wait([tasks[0], ready],
+                               return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if not done:
+                self.metrics.bump("hedges")
+                tasks.append(asyncio.ensure_future(self._attempt(
+                    fn, deadline_at, acquire, release, asyncio.Event())))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if task is not tasks[0]:
+                            self.metrics.bump("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                task.cancel()
+                if discard is not None:
+                    if task.done():
+                        _discard_async(discard, task)
+                    else:
+                        task.add_done_callback(
+                            functools.partial(_discard_async, discard))
+
+    # -------------------------------------------------------------- #
+    # sync                                                           #
+    # -------------------------------------------------------------- #
+    def run_sync(
+        self,
+        fn: Callable[[float | None], T],
+        discard: Callable[[T], None] | None = None,
+    ) -> T:
+        """
+        Blocking ``run``.  Attempts run on threads of their own, so the
+        deadline holds even if ``fn`` overruns its timeout and any number
+        of callers can wait at once; a late result is passed to ``discard``.
+        """
+        p, m = self.policy, self.metrics
+        m.bump("calls")
+        deadline_at = None if p.deadline is None else time.monotonic() + p.deadline
+        for attempt in range(p.max_retries + 1):
+            try:
+                budget = self._budget(deadline_at)
+                result, took = self._hedged_sync(fn, budget, discard)
+            except DeadlineExceeded:
+                break
+            except Exception as exc:
+                if not self.retryable(exc) or attempt == p.max_retries:
+                    m.bump("failures")
+                    raise
+                m.bump("retries")
+                left = None if deadline_at is None else deadline_at - time.monotonic()
+                pause = _backoff(attempt, p.backoff_base, p.backoff_max)
+                time.sleep(pause if left is None else max(0.0, min(pause, left)))
+                continue
+            m.bump("successes")
+            m.observe(took)
+            return result
+        m.bump("failures")
+        m.bump("deadline_exceeded")
+        raise DeadlineExceeded(f"deadline of {p.deadline}s exceeded")
+
+    def _hedged_sync(self, fn, budget, discard):
+        """(result, seconds the winning attempt took)."""
+        self.metrics.bump("attempts")
+        started = time.monotonic()
+        if not self.policy.hedge and budget is None:
+            return fn(budget), time.monotonic() - started
+        deadline_at = None if budget is None else started + budget
+        futures = [_spawn(fn, budget)]
+        submitted = [started]
+        winner = None
+        try:
+            first_wait = self.hedge_delay() if self.policy.hedge else budget
+            if budget is not None:
+                first_wait = min(first_wait, budget)
+            done, _ = cf.wait(futures, timeout=first_wait)
+            if (not done and self.policy.hedge
+                    and (deadline_at is None or time.monotonic() < deadline_at)):
+                self.metrics.bump("attempts")
+                self.metrics.bump("hedges")
+                left = None if deadline_at is None else deadline_at - time.monotonic()
+                submitted.append(time.monotonic())
+                futures.append(_spawn(fn, left))
+            pending, error = set(futures), None
+            while pending:
+                wait = None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+                done, pending = cf.wait(pending, timeout=wait,
+                                        return_when=cf.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError("attempt timed out")
+                for fut in done:
+                    if fut.exception() is None:
+                        winner = fut
+                        if fut is not futures[0]:
+                            self.metrics.bump("hedge_wins")
+                        took = time.monotonic() - submitted[futures.index(fut)]
+                        return fut.result(), took
+                    error = fut.exception()
+            raise error
+        finally:
+            for fut in futures:
+                if fut is winner:
+                    continue
+                fut.cancel()
+                if discard is not None:
+                    fut.add_done_callback(functools.partial(_discard_sync, discard))
+
+
+def _spawn(fn, *args) -> cf.Future:
+    """Run ``fn(*args)`` on a fresh daemon thread.
+
+    A shared fixed-size pool would make callers beyond its size burn their
+    deadline queueing for a worker; a thread per attempt costs well under
+    a millisecond next to a VLM call.
+    """
+    fut: cf.Future = cf.Future()
+
+    def target() -> None:
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as exc:
+            fut.set_exception(exc)
+
+    threading.Thread(target=target, name="vlm-attempt", daemon=True).start()
+    return fut
+
+
+def _discard_async(discard, task: asyncio.Future) -> None:
+    if task.cancelled() or task.exception() is not None:
+        return
+    out = discard(task.result()[0])                  # (result, seconds)
+    if asyncio.iscoroutine(out):
+        asyncio.ensure_future(out)
+
+
+def _discard_sync(discard, fut: cf.Future) -> None:
+    if fut.cancelled() or fut.exception() is not None:
+        return
+    discard(fut.result())
+
+
+@functools.lru_cache(maxsize=None)
+def runner_for(policy: RequestPolicy) -> RequestRunner:
+    """Process-wide runner per policy, so latency history accumulates."""
+    return RequestRunner(policy)
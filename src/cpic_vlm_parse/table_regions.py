@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Locate table regions on guideline pages and render only those.
+
+Extraction prompts only ask for tables, yet whole pages are sent.  This
+stage finds table areas from the PyMuPDF page structure and renders just
+those rectangles, stacked into one image, so the VLM spends vision tokens
+on tables only; pages without tables can be skipped outright.
+
+Signals, unioned and merged:
+1. ``page.find_tables()``                  ruled / aligned tables
+2. horizontal rules and filled bands from  booktabs-style journal tables
+   ``page.get_drawings()``, grouped        (top rule, header rule, bottom
+   vertically and required to enclose     rule, shaded rows); vertical
+   whole text blocks                      rules for tables printed sideways
+3. "Table N" caption text blocks           attached to the region below
+                                           (right of it for a sideways table)
+Regions with a "Figure N" caption inside or just below are dropped.
+
+Example
+-------
+python table_regions.py --cpic-dir ../Guidelines --out table_crops/
+python table_regions.py --pdf guideline.pdf --page 4 --out table_crops/
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import re
+from pathlib import Path
+from typing import List
+
+import fitz                    # PyMuPDF
+from PIL import Image
+
+from cpic_vlm_vector_store.page_store import RENDER_DPI
+
+_CAPTION_RE = re.compile(r"^\s*(supplement(al|ary)\s+)?table\s+s?\d+", re.IGNORECASE)
+_FIGURE_RE = re.compile(r"^\s*fig(ure|\.)?\s+s?\d+", re.IGNORECASE)
+
+MIN_RULE_WIDTH = 0.25        # of page width
+MAX_RULE_GAP = 0.65          # of page height, between consecutive rules
+MAX_UNCAPTIONED = 0.3        # of page area, for drawing-only regions
+CAPTION_GAP = 40.0           # points between caption and table top
+
+
+def _merge(rects: List[fitz.Rect], pad: float = 0.0) -> List[fitz.Rect]:
+    """Union rectangles that overlap (after growing them by ``pad``)."""
+    rects = [fitz.Rect(r) for r in rects if not fitz.Rect(r).is_empty]
+    merged = True
+    while merged:
+        merged = False
+        out: List[fitz.Rect] = []
+        for r in rects:
+            grown = r + (-pad, -pad, pad, pad)
+            for i, o in enumerate(out):
+                if grown.intersects(o):
+                    out[i] = o | r
+                    merged = True
+                    break
+            else:
+                out.append(r)
+        rects = out
+    return sorted(rects, key=lambda r: (r.y0, r.x0))
+
+
+def _x_overlap(a: fitz.Rect, b: fitz.Rect) -> float:
+    return max(0.0, min(a.x1, b.x1) - max(a.x0, b.x0))
+
+
+def _join_rules(rules: List[fitz.Rect]) -> List[fitz.Rect]:
+    """Join collinear segments (one per table column) into single rules."""
+    out: List[fitz.Rect] = []
+    for r in sorted(rules, key=lambda r: (round(r.y0), r.x0)):
+        last = out[-1] if out else None
+        if (last and abs(r.y0 - last.y0) <= 1.5 and abs(r.y1 - last.y1) <= 1.5
+                and r.x0 - last.x1 <= 2.0):
+            out[-1] = last | r
+        else:
+            out.append(fitz.Rect(r))
+    return out
+
+
+def _flip(r: fitz.Rect) -> fitz.Rect:
+    """Mirror across the diagonal (x <-> y)."""
+    return fitz.Rect(r.y0, r.x0, r.y1, r.x1)
+
+
+def _group_rules(
+    drawings: List[fitz.Rect],
+    page_rect: fitz.Rect,
+    blocks: List[fitz.Rect],
+    captions: List[fitz.Rect],
+) -> List[fitz.Rect]:
+    """Groups of wide horizontal rules that enclose whole text blocks."""
+    W, H = page_rect.width, page_rect.height
+    # stroked lines have zero height, and an empty Rect drops out of unions
+    rules = _join_rules([r + (0, -0.5, 0, 0.5) for r in drawings
+                         if r.height < 0.5 * H])
+    rules = sorted((r for r in rules if r.width >= MIN_RULE_WIDTH * W),
+                   key=lambda r: r.y0)
+
+    groups: List[List[fitz.Rect]] = []
+    for r in rules:
+        g = groups[-1] if groups else None
+        # a caption between two rules starts a table: the rule above it
+        # (running head, previous table) is not part of this one
+        if (g and r.y0 - g[-1].y1 <= MAX_RULE_GAP * H
+                and _x_overlap(r, g[-1]) >= 0.5 * min(r.width, g[-1].width)
+                and not any(g[-1].y0 <= c.y0 and c.y1 <= r.y1
+                            and _x_overlap(c, r) > 0 for c in captions)):
+            g.append(r)
+        else:
+            groups.append([r])
+
+    regions = []
+    for g in groups:
+        if len(g) < 2:
+            continue
+        region = fitz.Rect(g[0])
+        for r in g[1:]:
+            region |= r
+        if region.height < 20:
+            continue
+        # two rules alone frame anything (running head over a footnote
+        # rule); without a caption a table also needs its header rule
+        if len(g) == 2 and not any(
+                0 <= region.y0 - c.y1 <= CAPTION_GAP and _x_overlap(c, region) > 0
+                for c in captions):
+            continue
+        # prose between a page rule and a footnote rule straddles them;
+        # table cells and notes touching the outer rules do not
+        core = region + (2, 2, -2, -2)
+        hit = [b for b in blocks if (b & core).get_area() > 0]
+        if not hit or any(b.y0 < region.y0 - 2 or b.y1 > region.y1 + 2
+                          for b in hit):
+            continue
+        regions.append(region)
+    return regions
+
+
+def _rule_regions(
+    page: fitz.Page,
+    blocks: List[fitz.Rect],
+    captions: List[fitz.Rect],
+) -> List[fitz.Rect]:
+    """Rule-delimited table areas, upright and printed sideways.
+
+    Landscape tables rotated onto a portrait page have vertical rules;
+    those are grouped on the transposed page and mapped back.
+    """
+    drawings = [fitz.Rect(d["rect"]) for d in page.get_drawings()]
+    regions = _group_rules(drawings, page.rect, blocks, captions)
+    sideways = _group_rules([_flip(r) for r in drawings], _flip(page.rect),
+                            [_flip(b) for b in blocks],
+                            [_flip(c) for c in captions])
+    return regions + [_flip(r) for r in sideways]
+
+
+def _captions(c: fitz.Rect, region: fitz.Rect) -> bool:
+    """``c`` sits just above ``region``, or left of it for a sideways table."""
+    above = 0 <= region.y0 - c.y1 <= CAPTION_GAP and _x_overlap(c, region) > 0
+    left = (0 <= region.x0 - c.x1 <= CAPTION_GAP
+            and _x_overlap(_flip(c), _flip(region)) > 0)
+    return above or left
+
+
+def find_table_regions(page: fitz.Page, pad: float = 6.0) -> List[fitz.Rect]:
+    """Table rectangles on ``page`` in points, merged, top to bottom."""
+    page_rect = page.rect
+    blocks = []
+    captions = []
+    figures = []
+    for x0, y0, x1, y1, text, *_ in page.get_text("blocks"):
+        r = fitz.Rect(x0, y0, x1, y1)
+        blocks.append(r)
+        if _CAPTION_RE.match(text):
+            captions.append(r)
+        elif _FIGURE_RE.match(text):
+            figures.append(r)
+
+    found: List[fitz.Rect] = []
+    finder = getattr(page, "find_tables", None)       # PyMuPDF ≥ 1.23
+    if finder is not None:
+        try:
+            found += [fitz.Rect(t.bbox) for t in finder().tables]
+        except Exception:                              # malformed drawings
+            pass
+
+    for region in _rule_regions(page, blocks, captions):
+        captioned = any(_captions(c, region) for c in captions)
+        if captioned or region.get_area() <= MAX_UNCAPTIONED * page_rect.get_area():
+            found.append(region)
+
+    # pathway diagrams and flowcharts are drawn with the same rules and
+    # boxes; their "Figure N" caption sits inside or just below
+    regions = [r for r in _merge(found)
+               if not any((c & r).get_area() > 0 or 0 <= c.y0 - r.y1 <= CAPTION_GAP
+                          for c in figures)]
+    out = []
+    for region in regions:
+        for c in captions:                             # pull in the caption
+            if _captions(c, region):
+                region |= c
+        out.append((region + (-pad, -pad, pad, pad)) & page_rect)
+    return _merge(out)
+
+
+def render_regions(
+    page: fitz.Page,
+    regions: List[fitz.Rect],
+    dpi: int = RENDER_DPI,
+) -> List[Image.Image]:
+    """Render each region at ``dpi`` (same scale as full-page renders)."""
+    images = []
+    for r in regions:
+        pix = page.get_pixmap(dpi=dpi, clip=r)
+        images.append(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
+    return images
+
+
+def stitch(images: List[Image.Image], gap: int = 16) -> Image.Image:
+    """Stack crops vertically on white, left-aligned."""
+    width = max(im.width for im in images)
+    height = sum(im.height for im in images) + gap * (len(images) - 1)
+    canvas = Image.new("RGB", (width, height), "white")
+    y = 0
+    for im in images:
+        canvas.paste(im, (0, y))
+        y += im.height + gap
+    return canvas
+
+
+def table_page_image(
+    pdf_path: str | Path,
+    page_index: int,
+    dpi: int = RENDER_DPI,
+) -> Image.Image | None:
+    """Stitched image of the page's table regions, or None if it has none."""
+    with fitz.open(pdf_path) as doc:
+        if page_index < 0 or page_index >= doc.page_count:
+            raise ValueError(f"Invalid page index {page_index} for {pdf_path}")
+        page = doc.load_page(page_index)
+        regions = find_table_regions(page)
+        if not regions:
+            return None
+        return stitch(render_regions(page, regions, dpi))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Detect and crop table regions in PDFs")
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--pdf", help="single PDF")
+    src.add_argument("--cpic-dir", default=str(PROJECT_ROOT / "Guidelines"))
+    p.add_argument("--page", type=int, default=None, help="0-based page (with --pdf)")
+    p.add_argument("--out", default=None, help="write stitched crops here")
+    p.add_argument("--dpi", type=int, default=RENDER_DPI)
+    args = p.parse_args()
+
+    pdfs = [Path(args.pdf)] if args.pdf else sorted(Path(args.cpic_dir).glob("*.pdf"))
+    out = Path(args.out) if args.out else None
+    if out:
+        out.mkdir(parents=True, exist_ok=True)
+
+    n_pages = n_table_pages = 0
+    area_sent = 0.0
+    for pdf in pdfs:
+        with fitz.open(pdf) as doc:
+            pages = [args.page] if args.page is not None else range(doc.page_count)
+            for idx in pages:
+                page = doc.load_page(idx)
+                regions = find_table_regions(page)
+                n_pages += 1
+                if not regions:
+                    continue
+                n_table_pages += 1
+                frac = sum(r.get_area() for r in regions) / page.rect.get_area()
+                area_sent += frac
+                print(f"{pdf.name[:70]:<70} p{idx:<3} {len(regions)} region(s) "
+                      f"{frac:6.1%} of page")
+                if out:
+                    img = stitch(render_regions(page, regions, args.dpi))
+                    img.save(out / f"{pdf.stem[:80]}_p{idx}.png")
+
+    if n_pages:
+        print(f"\n[i] {n_table_pages}/{n_pages} pages have tables; "
+              f"pixels sent vs. full pages: {area_sent / n_pages:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Long-lived async client for the NVIDIA/OpenAI multimodal endpoint.
+
+One ``AsyncOpenAI`` over one shared ``httpx.AsyncClient`` connection pool,
+with at most ``concurrency`` requests in flight and at most ``rps`` sent
+per second.  Keep-alive connections (and their TLS sessions) are reused
+across pages, so extracting many pages pays the handshake once per
+connection rather than once per call.
+With ``policy=RequestPolicy(...)`` every call gets a deadline, jittered
+retries and optional hedging (see ``request_policy``); ``.metrics``
+reports latency percentiles, retries and hedges.
+
+Example
+-------
+async with AsyncVLMClient(api_key=key, concurrency=8) as vlm:
+    texts = await vlm.send_pages_async(
+        [(pdf, 0), (pdf, 1)], "Extract table from this page (markdown).")
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from cpic_vlm_parse.extract_api_call import (
+    HTTP_TIMEOUT,
+    encode_page,
+    make_mm_message,
+    page_key_params,
+)
+from cpic_vlm_parse.extraction_cache import (
+    ExtractionCache,
+    default_extraction_cache,
+    page_cache_id,
+)
+from cpic_vlm_parse.image_encoding import EncodingPolicy, resolve_policy
+from cpic_vlm_parse.request_policy import (
+    RequestMetrics,
+    RequestPolicy,
+    RequestRunner,
+    TokenBucket,
+)
+from cpic_vlm_parse.vlm_stream import AsyncVLMStream
+
+DEFAULT_MODEL = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1"
+DEFAULT_BASE_URL = "https://integrate.api.nvidia.com/v1"
+
+
+class AsyncVLMClient:
+    """
+    Parameters
+    ----------
+    concurrency : max requests in flight (also the connection pool size).
+    max_retries : retries done by the OpenAI SDK itself (unused with a
+                  ``policy``).
+    rps, burst  : token-bucket rate limit on requests sent, retries and
+                  hedges included; rps <= 0 disables it.
+    cache       : extraction cache for ``send_page``; None → default,
+                  False → disabled.
+    encoding    : image payload policy for every page (see
+                  ``image_encoding``); "auto" picks the model's preset per
+                  call, None sends lossless PNG.
+    crop_tables : send only table regions; table-less pages answer "".
+    policy      : deadline / retry / hedging policy for every request; when
+                  set, SDK retries are disabled in its favour.  Attempt
+                  timeouts, hedge delays and latencies count from when the
+                  attempt gets its concurrency slot.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        api_key: str | None = None,
+        *,
+        concurrency: int = 8,
+        timeout: httpx.Timeout | float = HTTP_TIMEOUT,
+        max_retries: int = 2,
+        cache: ExtractionCache | bool | None = None,
+        encoding: EncodingPolicy | str | None = None,
+        crop_tables: bool = False,
+        rps: float = 0.0,
+        burst: int = 1,
+        policy: RequestPolicy | None = None,
+    ) -> None:
+        api_key = api_key or os.getenv("NVIDIA_API_TOKEN")
+        if not api_key:
+            raise RuntimeError("Set NVIDIA_API_TOKEN (or pass api_key=…)")
+        self.concurrency = concurrency
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency,
+                                max_keepalive_connections=concurrency,
+                                keepalive_expiry=120),
+            timeout=timeout,
+        )
+        self.openai = AsyncOpenAI(base_url=base_url, api_key=api_key,
+                                  http_client=self._http,
+                                  max_retries=0 if policy else max_retries)
+        self.cache = default_extraction_cache() if cache is None else cache
+        self.encoding = encoding
+        self.crop_tables = crop_tables
+        self._sem = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rps, burst)
+        self.runner = RequestRunner(policy) if policy else None
+
+    @property
+    def metrics(self) -> RequestMetrics | None:
+        return self.runner.metrics if self.runner else None
+
+    async def _acquire(self) -> None:
+        await self._bucket.acquire()
+        await self._sem.acquire()
+
+    async def _call(self, fn, discard=None):
+        """
+        Run ``fn(timeout)`` under the policy, or once without one, each
+        attempt holding a concurrency slot.  A successful call returns
+        still holding its slot; the caller releases it.
+        """
+        if self.runner is None:
+            await self._acquire()
+            try:
+                return await fn(None)
+            except BaseException:
+                self._sem.release()
+                raise
+        return await self.runner.run(fn, discard, self._acquire, self._sem.release)
+
+    @staticmethod
+    def _timeout(timeout: float | None) -> Dict:
+        return {} if timeout is None else {"timeout": timeout}
+
+    async def aclose(self) -> None:
+        await self.openai.close()
+        await self._http.aclose()
+
+    async def __aenter__(self) -> "AsyncVLMClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    # -------------------------------------------------------------- #
+    async def complete(
+        self,
+        messages: List[Dict],
+        model: str = DEFAULT_MODEL,
+        **params,
+    ) -> str:
+        """One non-streamed chat completion → answer text."""
+        async def attempt(timeout: float | None):
+            return await self.openai.chat.completions.create(
+                model=model, messages=messages, stream=False,
+                **self._timeout(timeout), **params)
+
+        completion = await self._call(attempt, lambda _: self._sem.release())
+        self._sem.release()
+        return completion.choices[0].message.content or ""
+
+    async def encode(self, pdf_file: str | Path, page_idx: int,
+                     model: str = DEFAULT_MODEL) -> Tuple[str, str] | None:
+        """(base64, mime) of one page, off the event loop; None = no tables."""
+        policy = resolve_policy(self.encoding, model)
+        return await asyncio.to_thread(
+            encode_page, pdf_file, page_idx, policy, self.crop_tables)
+
+    def _key_params(self, model: str, params: Dict) -> Dict:
+        return page_key_params(
+            params, resolve_policy(self.encoding, model), self.crop_tables)
+
+    async def send_page(
+        self,
+        pdf_file: str | Path,
+        page_idx: int,
+        user_prompt: str,
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        top_p: float = 0.95,
+        max_tokens: int = 1024,
+    ) -> str:
+        """Async ``send_pdf_page`` without printing; cached like it."""
+        page_id = page_cache_id(pdf_file, page_idx)
+        params = {"temperature": temperature, "top_p": top_p,
+                  "max_tokens": max_tokens}
+        key_params = self._key_params(model, params)
+        if self.cache:
+            text = self.cache.get(page_id, user_prompt, model, key_params)
+            if text is not None:
+                return text
+        encoded = await self.encode(pdf_file, page_idx, model)
+        if encoded is None:
+            return ""
+        img_b64, mime = encoded
+        text = await self.complete(
+            make_mm_message(user_prompt, img_b64, mime), model, **params)
+        if self.cache and text:
+            self.cache.put(page_id, user_prompt, model, key_params, text)
+        return text
+
+    async def stream_page(
+        self,
+        pdf_file: str | Path,
+        page_idx: int,
+        user_prompt: str,
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        top_p: float = 0.95,
+        max_tokens: int = 1024,
+    ) -> AsyncVLMStream:
+        """
+        Streaming ``send_page``: ``async for`` the pieces, then read
+        ``.text`` / ``.ttft`` / ``.total``.  The concurrency slot is held
+        until the stream is drained or ``aclose()``d.  The policy covers
+        opening the stream (time to first byte); a losing hedge is closed.
+        """
+        page_id = page_cache_id(pdf_file, page_idx)
+        params = {"temperature": temperature, "top_p": top_p,
+                  "max_tokens": max_tokens}
+        key_params = self._key_params(model, params)
+        if self.cache:
+            text = self.cache.get(page_id, user_prompt, model, key_params)
+            if text is not None:
+                return AsyncVLMStream.from_text(text)
+        encoded = await self.encode(pdf_file, page_idx, model)
+        if encoded is None:
+            return AsyncVLMStream.from_text("")
+        img_b64, mime = encoded
+
+        def remember(stream: AsyncVLMStream) -> None:
+            if self.cache and stream.text:
+                self.cache.put(page_id, user_prompt, model, key_params, stream.text)
+
+        messages = make_mm_message(user_prompt, img_b64, mime)
+
+        async def attempt(timeout: float | None):
+            return await self.openai.chat.completions.create(
+                model=model, messages=messages, stream=True,
+                **self._timeout(timeout), **params)
+
+        async def drop(stream) -> None:
+            try:
+                await stream.close()
+            finally:
+                self._sem.release()
+
+        started = time.perf_counter()
+        completion = await self._call(attempt, drop)
+        return AsyncVLMStream(completion, started=started, on_done=remember,
+                              on_close=self._sem.release)
+
+    async def send_pages_async(
+        self,
+        pages: Sequence[Tuple[str | Path, int]],
+        user_prompt: str,
+        model: str = DEFAULT_MODEL,
+        return_exceptions: bool = True,
+        **params,
+    ) -> List[str | BaseException]:
+        """
+        Extract (pdf, page index) pairs concurrently, results in input order.
+        Failed pages yield their exception unless ``return_exceptions=False``.
+        """
+        return await asyncio.gather(
+            *(self.send_page(pdf, idx, user_prompt, model, **params)
+              for pdf, idx in pages),
+            return_exceptions=return_exceptions,
+        )
+
+
+async def send_pages_async(
+    pages: Sequence[Tuple[str | Path, int]],
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    api_key: str | None = None,
+    base_url: str = DEFAULT_BASE_URL,
+    concurrency: int = 8,
+    **params,
+) -> List[str | BaseException]:
+    """One-shot helper: pooled client for the duration of one batch."""
+    async with AsyncVLMClient(base_url, api_key,
+                              concurrency=concurrency) as vlm:
+        return await vlm.send_pages_async(pages, user_prompt, model, **params)
@@ -0,0 +1,176 @@
+# vlm_stream.py
+# ---------------------------------------------------------------------
+# Token streams over streamed chat completions
+#
+# VLMStream / AsyncVLMStream wrap an OpenAI (Async)Stream and yield text
+# pieces as they arrive.  Once the stream is exhausted they carry
+#   .text     assembled answer
+#   .ttft     seconds from request to first content piece
+#   .total    seconds from request to last piece
+#   .tokens   completion tokens (server usage if sent, else chunk count)
+# so callers can pipe output onward and measure latency at the same time.
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import time
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, List
+
+
+def _piece(chunk) -> str:
+    """Text carried by one stream chunk (str chunks pass through)."""
+    if isinstance(chunk, str):
+        return chunk
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    return choices[0].delta.content or ""
+
+
+class _StreamBase:
+    def __init__(
+        self,
+        started: float | None,
+        on_done: Callable[["_StreamBase"], None] | None,
+        on_close: Callable[[], None] | None,
+        cached: bool,
+    ) -> None:
+        self.started = time.perf_counter() if started is None else started
+        self.cached = cached
+        self.ttft: float | None = None
+        self.total: float | None = None
+        self.tokens = 0
+        self.done = False
+        self._parts: List[str] = []
+        self._usage: int | None = None
+        self._on_done = on_done
+        self._on_close = on_close
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def tokens_per_s(self) -> float:
+        if (self.cached or not self.total or self.ttft is None
+                or self.total <= self.ttft):
+            return 0.0
+        return self.tokens / (self.total - self.ttft)
+
+    def _take(self, chunk) -> str:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None and getattr(usage, "completion_tokens", None):
+            self._usage = usage.completion_tokens
+        piece = _piece(chunk)
+        if piece:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            self.tokens += 1
+            self._parts.append(piece)
+        return piece
+
+    def _finish(self) -> None:
+        self.total = time.perf_counter() - self.started
+        if self._usage is not None:
+            self.tokens = self._usage
+        self.done = True
+        if self._on_done is not None:
+            self._on_done(self)
+
+    def _closed(self) -> None:
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+    def summary(self) -> str:
+        ttft = f"{self.ttft * 1e3:.0f} ms" if self.ttft is not None else "n/a"
+        total = f"{self.total:.2f}s" if self.total is not None else "n/a"
+        return (f"ttft {ttft}, total {total}, {self.tokens} tokens "
+                f"({self.tokens_per_s:.1f} tok/s){' [cached]' if self.cached else ''}")
+
+
+class VLMStream(_StreamBase):
+    """
+    Iterate to receive text pieces; ``read()`` drains the rest and returns
+    the full text.  ``on_done(stream)`` runs only after a complete stream.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable,
+        started: float | None = None,
+        on_done: Callable[["VLMStream"], None] | None = None,
+        on_close: Callable[[], None] | None = None,
+        cached: bool = False,
+    ) -> None:
+        super().__init__(started, on_done, on_close, cached)
+        self._chunks = chunks
+
+    @classmethod
+    def from_text(cls, text: str) -> "VLMStream":
+        """Stream of an already known answer (e.g. a cache hit)."""
+        return cls([text], cached=True)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                piece = self._take(chunk)
+                if piece:
+                    yield piece
+            self._finish()
+        finally:
+            self.close()
+
+    def read(self) -> str:
+        if not self.done:
+            for _ in self:
+                pass
+        return self.text
+
+    def close(self) -> None:
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        self._closed()
+
+
+class AsyncVLMStream(_StreamBase):
+    """Async twin of ``VLMStream``: ``async for`` pieces, ``await aread()``."""
+
+    def __init__(
+        self,
+        chunks: AsyncIterable,
+        started: float | None = None,
+        on_done: Callable[["AsyncVLMStream"], None] | None = None,
+        on_close: Callable[[], None] | None = None,
+        cached: bool = False,
+    ) -> None:
+        super().__init__(started, on_done, on_close, cached)
+        self._chunks = chunks
+
+    @classmethod
+    def from_text(cls, text: str) -> "AsyncVLMStream":
+        async def once():
+            yield text
+        return cls(once(), cached=True)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        try:
+            async for chunk in self._chunks:
+                piece = self._take(chunk)
+                if piece:
+                    yield piece
+            self._finish()
+        finally:
+            await self.aclose()
+
+    async def aread(self) -> str:
+        if not self.done:
+            async for _ in self:
+                pass
+        return self.text
+
+    async def aclose(self) -> None:
+        close = getattr(self._chunks, "close", None) or getattr(self._chunks, "aclose", None)
+        if close is not None:
+            await close()
+        self._closed()
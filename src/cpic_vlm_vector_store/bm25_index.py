@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+In-process BM25 over page texts – the local counterpart of Vespa's
+``bm25(name) + bm25(text)`` first phase.
+
+The index is a SciPy CSR *term-document* matrix whose cells already hold
+the BM25 contribution of a term to a page (IDF × saturated, length-
+normalised tf, summed over the ``name`` and ``text`` fields).  Scoring a
+batch of queries is then a single sparse product
+
+    scores (queries × pages) = Q (queries × terms) @ W (terms × pages)
+
+Arrays are saved as .npy and memory-mapped on load.
+
+IDF and saturation follow Vespa's bm25 feature:
+    idf(t)  = log(1 + (N - n_t + 0.5) / (n_t + 0.5))
+    w(t, d) = idf(t) · tf · (k1 + 1) / (tf + k1 · (1 - b + b · |d| / avgdl))
+
+Example
+-------
+python bm25_index.py --feed vespa_feed.jsonl --out local_index/bm25
+python bm25_index.py --load local_index/bm25 --query "CYP2C19 clopidogrel"
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from cpic_vlm_vector_store.feed_io import iter_feed
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+FIELDS = ("name", "text")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens (close to Vespa's default linguistics)."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Parameters
+    ----------
+    vocab   : term → row of ``weights``.
+    weights : (terms, pages) CSR matrix of precomputed BM25 weights.
+    ids     : page id per column.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        weights: sparse.csr_matrix,
+        ids: List[str],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.vocab = vocab
+        self.weights = weights
+        self.ids = ids
+        self.k1, self.b = k1, b
+
+    @property
+    def n_docs(self) -> int:
+        return self.weights.shape[1]
+
+    # -------------------------------------------------------------- #
+    # building                                                       #
+    # -------------------------------------------------------------- #
+    @classmethod
+    def build(
+        cls,
+        docs: Iterable[Tuple[str, Dict[str, str]]],
+        fields: Sequence[str] = FIELDS,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        """``docs`` yields (page_id, {field: text}); fields are summed."""
+        ids: List[str] = []
+        vocab: Dict[str, int] = {}
+        per_field = {f: ([], [], [0]) for f in fields}     # indices, data, indptr
+        for doc_id, values in docs:
+            ids.append(doc_id)
+            for f in fields:
+                counts: Dict[int, int] = {}
+                for tok in tokenize(values.get(f) or ""):
+                    t = vocab.setdefault(tok, len(vocab))
+                    counts[t] = counts.get(t, 0) + 1
+                indices, data, indptr = per_field[f]
+                indices.extend(counts)
+                data.extend(counts.values())
+                indptr.append(len(indices))
+
+        n_docs, n_terms = len(ids), len(vocab)
+        total = sparse.csr_matrix((n_docs, n_terms), dtype=np.float32)
+        for f, (indices, data, indptr) in per_field.items():
+            tf = sparse.csr_matrix(
+                (np.asarray(data, np.float32), np.asarray(indices, np.int32),
+                 np.asarray(indptr, np.int64)), shape=(n_docs, n_terms))
+            total = total + cls._field_weights(tf, k1, b)
+        weights = total.T.tocsr()                           # terms × pages
+        weights.sort_indices()
+        return cls(vocab, weights, ids, k1, b)
+
+    @staticmethod
+    def _field_weights(tf: sparse.csr_matrix, k1: float, b: float) -> sparse.csr_matrix:
+        n_docs = tf.shape[0]
+        dl = np.asarray(tf.sum(axis=1)).ravel()
+        avgdl = dl.mean() if n_docs and dl.mean() > 0 else 1.0
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        rows = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        norm = k1 * (1.0 - b + b * dl[rows] / avgdl)
+        w = tf.copy()
+        w.data = (idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + norm)).astype(np.float32)
+        return w
+
+    @classmethod
+    def from_feed(cls, feed_path: str | os.PathLike, **kw) -> "BM25Index":
+        return cls.build(
+            ((doc["id"], {f: doc.get(f, "") for f in FIELDS})
+             for doc in iter_feed(feed_path)), **kw)
+
+    # -------------------------------------------------------------- #
+    # persistence                                                    #
+    # -------------------------------------------------------------- #
+    def save(self, out_dir: str | os.PathLike) -> None:
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        np.save(out / "data.npy", self.weights.data)
+        np.save(out / "indices.npy", self.weights.indices)
+        np.save(out / "indptr.npy", self.weights.indptr)
+        (out / "meta.json").write_text(json.dumps({
+            "shape": list(self.weights.shape), "k1": self.k1, "b": self.b,
+            "ids": self.ids,
+        }))
+        (out / "vocab.json").write_text(json.dumps(self.vocab, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, index_dir: str | os.PathLike, mmap: bool = True) -> "BM25Index":
+        d = Path(index_dir)
+        mode = "r" if mmap else None
+        meta = json.loads((d / "meta.json").read_text())
+        weights = sparse.csr_matrix(
+            (np.load(d / "data.npy", mmap_mode=mode),
+             np.load(d / "indices.npy", mmap_mode=mode),
+             np.load(d / "indptr.npy", mmap_mode=mode)),
+            shape=tuple(meta["shape"]), copy=False)
+        vocab = json.loads((d / "vocab.json").read_text(encoding="utf-8"))
+        return cls(vocab, weights, meta["ids"], meta["k1"], meta["b"])
+
+    # -------------------------------------------------------------- #
+    # querying                                                       #
+    # -------------------------------------------------------------- #
+    def query_matrix(self, queries: Sequence[str]) -> sparse.csr_matrix:
+        """(queries, terms) term-count matrix; unknown terms are dropped."""
+        rows, cols = [], []
+        for qi, q in enumerate(queries):
+            for tok in tokenize(q):
+                t = self.vocab.get(tok)
+                if t is not None:
+                    rows.append(qi)
+                    cols.append(t)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)),
+                                 shape=(len(queries), len(self.vocab)))
+
+    def score(self, queries: Sequence[str]) -> np.ndarray:
+        """Dense (queries, pages) BM25 scores; 0 means no term matched."""
+        return (self.query_matrix(queries) @ self.weights).toarray()
+
+    def search(self, queries: Sequence[str], k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Top-k (page_id, score) per query, matching pages only."""
+        scores = self.score(queries)
+        out = []
+        for row in scores:
+            hit = np.flatnonzero(row > 0)
+            top = hit[np.argsort(-row[hit], kind="stable")[:k]]
+            out.append([(self.ids[i], float(row[i])) for i in top])
+        return out
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Build or query a local BM25 page index")
+    grp = p.add_mutually_exclusive_group(required=True)
+    grp.add_argument("--feed", help="build from vespa_feed.jsonl[.zst]")
+    grp.add_argument("--load", help="existing index directory")
+    p.add_argument("--out", help="output directory (with --feed)")
+    p.add_argument("--query", nargs="*", default=[])
+    p.add_argument("--top-k", type=int, default=5)
+    args = p.parse_args()
+
+    if args.feed:
+        t0 = time.perf_counter()
+        index = BM25Index.from_feed(args.feed)
+        print(f"[i] {index.n_docs} pages, {len(index.vocab)} terms, "
+              f"{index.weights.nnz} postings in {time.perf_counter() - t0:.2f}s")
+        if args.out:
+            index.save(args.out)
+    else:
+        index = BM25Index.load(args.load)
+
+    if args.query:
+        t0 = time.perf_counter()
+        results = index.search(args.query, args.top_k)
+        dt = (time.perf_counter() - t0) / len(args.query)
+        for q, hits in zip(args.query, results):
+            print(f"\n{q}")
+            for doc_id, score in hits:
+                print(f"  {score:8.3f}  {doc_id}")
+        print(f"\n[i] {dt * 1e3:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
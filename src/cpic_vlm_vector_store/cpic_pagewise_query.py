@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Warm, reusable CPIC page retriever.
+
+``CpicRetriever`` loads ColQwen once and keeps one pooled keep-alive HTTP
+session to Vespa (or a ``LocalMaxSimEngine``), so repeated queries in one
+process pay only query embedding plus search.  ``cpic_query`` is the
+function-style entry used by ``run_script/vespa_query.py``; it reuses one
+retriever per backend configuration.  ``cpic_query_many`` runs all of a
+rewrite's entities (each optionally scoped to its guideline) in one go.
+
+Example
+-------
+>>> with CpicRetriever(endpoint_file="vespa_endpoint.txt") as r:
+...     res = r.query("dose adjustment for CYP2C19 poor metabolizer", top_k=3)
+...     many = r.query_many(["...", "..."], top_k=3)   # concurrent searches
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+
+from cpic_vlm_vector_store.local_engine import LocalMaxSimEngine
+from cpic_vlm_vector_store.query_cache import (
+    QueryEmbeddingCache,
+    default_query_cache,
+)
+from cpic_vlm_vector_store.retrieve_cpic import (
+    encode_queries,
+    fetch_page_image,
+    open_backend,
+    query_vespa,
+    query_vespa_many,
+    save_hits,
+    tensor_to_body,
+)
+from cpic_vlm_vector_store.vespa_setup_pipeline import load_model_and_processor
+
+
+@dataclass
+class RetrievalResult:
+    """Hits of one query plus where the time went."""
+    query: str
+    hits: List[Dict]
+    files: List[str] = field(default_factory=list)
+    embed_s: float = 0.0
+    search_s: float = 0.0
+
+
+class CpicRetriever:
+    """
+    Parameters
+    ----------
+    endpoint / endpoint_file / local_index : backend, as in retrieve_cpic.
+    connections : size of the keep-alive HTTP connection pool.
+    ann_target_hits : >0 switches ``query()`` to nearestNeighbor candidates.
+    model, processor : pass pre-loaded ColQwen objects to share them.
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        endpoint_file: str | None = None,
+        local_index: str | None = None,
+        *,
+        model_name: str = "vidore/colqwen2.5-v0.2",
+        cache_dir: str = "/tmp/colqwen_cache",
+        device: str = "cuda:0",
+        connections: int = 4,
+        ann_target_hits: int = 0,
+        query_cache: QueryEmbeddingCache | None = None,
+        model=None,
+        processor=None,
+    ) -> None:
+        if model is None or processor is None:
+            device = device if torch.cuda.is_available() else "cpu"
+            model, processor = load_model_and_processor(
+                model_name, cache_dir, device)
+        self.model, self.processor = model, processor
+        self.query_cache = query_cache or default_query_cache()
+        self.connections = connections
+        self.ann_target_hits = ann_target_hits
+
+        self.app = open_backend(endpoint, endpoint_file, local_index)
+        self._session_cm = None
+        if isinstance(self.app, LocalMaxSimEngine):
+            self.client = self.app
+        else:
+            # requests.Session with a pooled, keep-alive HTTPAdapter
+            self._session_cm = self.app.syncio(connections=connections)
+            self.client = self._session_cm.__enter__()
+
+    # -------------------------------------------------------------- #
+    def close(self) -> None:
+        if self._session_cm is not None:
+            self._session_cm.__exit__(None, None, None)
+            self._session_cm = None
+
+    def __enter__(self) -> "CpicRetriever":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -------------------------------------------------------------- #
+    def page_image(self, hit: Dict, resize: int | None = None):
+        """Materialise one hit's page image on demand."""
+        return fetch_page_image(hit, self.client, resize)
+
+    def _search(self, text: str, emb: torch.Tensor, top_k: int,
+                guideline: str | None = None) -> List[Dict]:
+        resp = query_vespa(self.client, text, tensor_to_body(emb), top_k,
+                           self.ann_target_hits, guideline=guideline)
+        if not resp.is_successful():
+            raise RuntimeError(resp.get_error_message())
+        return resp.hits
+
+    async def aquery_many(
+        self,
+        texts: List[str],
+        top_k: int = 3,
+        save_dir: str | Path | None = None,
+        resize: int | None = 640,
+        guidelines: List[str | None] | None = None,
+    ) -> List[RetrievalResult]:
+        """
+        Embed all queries in one batched pass, then send the searches
+        concurrently (``connections`` in flight); results keep input order.
+        ``guidelines[i]`` optionally scopes query i to one PDF.
+        """
+        t0 = time.perf_counter()
+        embs = encode_queries(texts, self.model, self.processor,
+                              cache=self.query_cache)
+        embed_s = (time.perf_counter() - t0) / max(len(texts), 1)
+
+        responses = await query_vespa_many(
+            self.app, texts, [tensor_to_body(e) for e in embs], top_k,
+            self.connections, guidelines)
+
+        results: List[RetrievalResult] = []
+        for i, (text, (resp, latency)) in enumerate(zip(texts, responses)):
+            if not resp.is_successful():
+                raise RuntimeError(f"{text!r}: {resp.get_error_message()}")
+            res = RetrievalResult(text, resp.hits, embed_s=embed_s,
+                                  search_s=latency)
+            if save_dir is not None:
+                out = Path(save_dir) if len(texts) == 1 else Path(save_dir) / f"q{i:02d}"
+                res.files = save_hits(resp.hits, out, resize, self.client)
+            results.append(res)
+        return results
+
+    def query_many(
+        self,
+        texts: List[str],
+        top_k: int = 3,
+        save_dir: str | Path | None = None,
+        resize: int | None = 640,
+        guidelines: List[str | None] | None = None,
+    ) -> List[RetrievalResult]:
+        """Sync wrapper around ``aquery_many`` (not for use inside a loop)."""
+        return asyncio.run(
+            self.aquery_many(texts, top_k, save_dir, resize, guidelines))
+
+    def query(
+        self,
+        text: str,
+        top_k: int = 3,
+        save_dir: str | Path | None = None,
+        resize: int | None = 640,
+        guideline: str | None = None,
+    ) -> RetrievalResult:
+        """
+        Single query over the warm keep-alive sync session, optionally
+        scoped to one guideline PDF.
+        """
+        t0 = time.perf_counter()
+        (emb,) = encode_queries([text], self.model, self.processor,
+                                cache=self.query_cache)
+        embed_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        hits = self._search(text, emb, top_k, guideline)
+        res = RetrievalResult(text, hits, embed_s=embed_s,
+                              search_s=time.perf_counter() - t0)
+        if save_dir is not None:
+            res.files = save_hits(hits, Path(save_dir), resize, self.client)
+        return res
+
+
+# ---------------------------------------------------------------------------
+# Function-style API (run_script/vespa_query.py)
+# ---------------------------------------------------------------------------
+_RETRIEVERS: Dict[tuple, CpicRetriever] = {}
+
+
+def get_retriever(
+    endpoint: str | None = None,
+    endpoint_file: str | None = None,
+    local_index: str | None = None,
+    **kwargs,
+) -> CpicRetriever:
+    """One warm retriever per backend configuration, per process."""
+    key = (endpoint, endpoint_file, local_index, tuple(sorted(kwargs.items())))
+    if key not in _RETRIEVERS:
+        _RETRIEVERS[key] = CpicRetriever(
+            endpoint, endpoint_file, local_index, **kwargs)
+    return _RETRIEVERS[key]
+
+
+def cpic_query(
+    query: str,
+    endpoint_file: str | None = None,
+    endpoint: str | None = None,
+    top_k: int = 3,
+    save_dir: str | Path = "retrieved_pages",
+    resize: int | None = 640,
+    local_index: str | None = None,
+    guideline: str | None = None,
+) -> List[str]:
+    """Retrieve ``top_k`` pages for ``query``, save them, return the paths."""
+    retriever = get_retriever(endpoint, endpoint_file, local_index)
+    return retriever.query(query, top_k, Path(save_dir), resize, guideline).files
+
+
+def cpic_query_many(
+    queries: List[str],
+    guidelines: List[str | None] | None = None,
+    endpoint_file: str | None = None,
+    endpoint: str | None = None,
+    top_k: int = 3,
+    save_dir: str | Path = "retrieved_pages",
+    resize: int | None = 640,
+    local_index: str | None = None,
+) -> List[List[str]]:
+    """
+    ``cpic_query`` for several queries with one model load and one
+    batched embedding pass; returns the saved paths per query.
+    """
+    retriever = get_retriever(endpoint, endpoint_file, local_index)
+    results = retriever.query_many(queries, top_k, Path(save_dir), resize,
+                                   guidelines)
+    return [r.files for r in results]
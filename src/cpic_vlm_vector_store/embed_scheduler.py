@@ -0,0 +1,136 @@
+# embed_scheduler.py
+# ---------------------------------------------------------------------
+# Corpus-wide ColQwen page-embedding scheduler
+#
+# * flattens pages of every PDF into one work list,
+# * groups pages of similar rendered size so batches pad less,
+# * runs `processor.process_images` in DataLoader worker processes,
+# * scatters the embeddings back to pdf["embeddings"][page].
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from tqdm import tqdm
+
+
+@dataclass
+class EmbedStats:
+    """
+    Throughput and padding figures for one scheduling run.
+
+    ``loader_wait`` is the part of ``elapsed`` spent waiting for the
+    DataLoader, i.e. ``process_images`` time the workers did not hide
+    (all of it with ``num_workers=0``).
+    """
+    pages: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    loader_wait: float = 0.0
+    real_tokens: int = 0
+    padded_tokens: int = 0
+
+    @property
+    def pages_per_s(self) -> float:
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def padding_ratio(self) -> float:
+        """Fraction of sequence positions in all batches that are padding."""
+        total = self.real_tokens + self.padded_tokens
+        return self.padded_tokens / total if total else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"embedded {self.pages} pages in {self.batches} batches, "
+            f"{self.elapsed:.1f}s ({self.pages_per_s:.2f} pages/s, "
+            f"{self.loader_wait:.1f}s waiting on preprocessing), "
+            f"padding {self.padding_ratio:.1%}"
+        )
+
+
+class _PageDataset(Dataset):
+    def __init__(self, images: Sequence[Image.Image]) -> None:
+        self.images = images
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, idx: int) -> Image.Image:
+        return self.images[idx]
+
+
+def plan_batches(
+    sizes: Sequence[Tuple[int, int]],
+    batch_size: int,
+) -> List[List[int]]:
+    """
+    Group page indices into batches of pages with similar (w, h).
+
+    Pages are sorted by pixel area (then height, width), so every batch
+    mixes at most two neighbouring size classes; the corpus is one list,
+    so only the very last batch can be underfilled.
+    """
+    order = sorted(
+        range(len(sizes)),
+        key=lambda i: (sizes[i][0] * sizes[i][1], sizes[i][1], sizes[i][0]),
+    )
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def embed_pages(
+    cpic_pdfs: List[Dict],
+    model,
+    processor,
+    batch_size: int,
+    device: str,
+    num_workers: int = 2,
+) -> EmbedStats:
+    """
+    Embed every page of every PDF and set pdf["embeddings"] in place.
+
+    Each page keeps only its non-padding rows (per the attention mask),
+    so the result does not depend on which pages shared its batch.
+    """
+    refs: List[Tuple[int, int]] = [
+        (p, i) for p, pdf in enumerate(cpic_pdfs) for i in range(len(pdf["images"]))
+    ]
+    images = [cpic_pdfs[p]["images"][i] for p, i in refs]
+    batches = plan_batches([img.size for img in images], batch_size)
+
+    loader = DataLoader(
+        _PageDataset(images),
+        batch_sampler=batches,
+        collate_fn=processor.process_images,
+        num_workers=num_workers,
+        pin_memory=str(device).startswith("cuda"),
+    )
+    for pdf in cpic_pdfs:
+        pdf["embeddings"] = [None] * len(pdf["images"])
+
+    stats = EmbedStats(batches=len(batches))
+    t0 = time.perf_counter()
+    batch_iter = iter(loader)
+    for idx_batch in tqdm(batches, desc="Embedding corpus"):
+        t_wait = time.perf_counter()
+        batch = next(batch_iter)
+        stats.loader_wait += time.perf_counter() - t_wait
+        mask = batch["attention_mask"]
+        n_real = int(mask.sum())
+        stats.real_tokens += n_real
+        stats.padded_tokens += mask.numel() - n_real
+
+        with torch.no_grad():
+            batch = {k: v.to(device, non_blocking=True) for k, v in batch.items()}
+            emb = model(**batch).cpu()
+        for row, flat_idx in enumerate(idx_batch):
+            p, i = refs[flat_idx]
+            cpic_pdfs[p]["embeddings"][i] = emb[row][mask[row].bool()]
+        stats.pages += len(idx_batch)
+    stats.elapsed = time.perf_counter() - t0
+    return stats
@@ -0,0 +1,124 @@
+# feed_io.py
+# ---------------------------------------------------------------------
+# Streaming JSONL reader / writer for Vespa feed documents
+#
+# One document per line, written as soon as it is produced.  A path
+# ending in ``.zst`` is transparently zstd-compressed (pip install zstandard).
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import io
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+
+try:
+    import zstandard as zstd
+except ImportError:            # optional – only needed for *.zst feeds
+    zstd = None
+
+
+def _is_zstd(path: str | os.PathLike) -> bool:
+    return str(path).endswith(".zst")
+
+
+def _require_zstd() -> None:
+    if zstd is None:
+        raise RuntimeError(
+            "Reading/writing *.zst feeds needs `pip install zstandard`"
+        )
+
+
+# ------------------------------------------------------------------ #
+# 1. Writer                                                          #
+# ------------------------------------------------------------------ #
+class FeedWriter:
+    """
+    Append Vespa documents to a JSONL (or JSONL.zst) file one at a time.
+
+    Usage
+    -----
+    with FeedWriter("vespa_feed.jsonl.zst") as w:
+        for doc in docs:
+            w.write(doc)
+    """
+
+    def __init__(self, path: str | os.PathLike, level: int = 3) -> None:
+        self.path = Path(path)
+        self.level = level
+        self.count = 0
+        self.bytes_written = 0
+        self._raw = None
+        self._fp = None
+
+    def __enter__(self) -> "FeedWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if _is_zstd(self.path):
+            _require_zstd()
+            self._raw = open(self.path, "wb")
+            stream = zstd.ZstdCompressor(level=self.level).stream_writer(self._raw)
+            self._fp = io.TextIOWrapper(stream, encoding="utf-8")
+        else:
+            self._fp = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def write(self, doc: Dict) -> None:
+        line = json.dumps(doc, ensure_ascii=False, separators=(",", ":")) + "\n"
+        self._fp.write(line)
+        self.count += 1
+        self.bytes_written += len(line.encode("utf-8"))   # uncompressed bytes
+
+    def write_all(self, docs: Iterable[Dict]) -> int:
+        for doc in docs:
+            self.write(doc)
+        return self.count
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()               # flushes the zstd frame too
+            self._fp = None
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+        self._raw = None
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ------------------------------------------------------------------ #
+# 2. Reader                                                          #
+# ------------------------------------------------------------------ #
+def iter_feed(path: str | os.PathLike) -> Iterator[Dict]:
+    """
+    Lazily yield documents from a JSONL / JSONL.zst feed.
+
+    Legacy single-document feeds (a JSON array written with ``json.dump``)
+    are still accepted, but are loaded in one go.
+    """
+    path = Path(path)
+    if _is_zstd(path):
+        _require_zstd()
+        with open(path, "rb") as raw:
+            reader = zstd.ZstdDecompressor().stream_reader(raw)
+            with io.TextIOWrapper(reader, encoding="utf-8") as fp:
+                yield from _iter_lines(fp)
+        return
+
+    with open(path, "r", encoding="utf-8") as fp:
+        first = fp.read(1)
+        while first and first.isspace():
+            first = fp.read(1)
+        if first == "[":
+            fp.seek(0)
+            yield from json.load(fp)
+            return
+        fp.seek(0)
+        yield from _iter_lines(fp)
+
+
+def _iter_lines(fp: Iterable[str]) -> Iterator[Dict]:
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Embedded MaxSim retrieval engine – an in-process stand-in for Vespa.
+
+Loads the binarized patch embeddings of the feed and scores queries in
+NumPy, mirroring the ``max_sim`` rank function of ``create_schema``:
+
+    sum_querytoken  max_patch  query(qt) · unpack_bits(embedding)
+
+Scoring is blockwise over pages, so memory stays bounded by
+``block_patches`` regardless of corpus size, and many queries are scored
+together in one matrix product per block.  ``query(body=...)`` accepts the
+same JSON body as ``retrieve_cpic.query_vespa`` so callers can swap it in
+for a ``Vespa`` app.
+
+Ranking profiles
+----------------
+default       float query · unpacked bits (exactly the Vespa ``max_sim``)
+binary        hamming MaxSim on binarized query tokens: Σ_t 1 / (1 + min_p ham)
+float         exact float MaxSim against the full-precision embeddings
+rerank_float  two-stage: ``binary`` over all pages picks the top
+              ``ranking.rerankCount`` (default 100), then exact float MaxSim
+              is computed only for those pages
+bm25          text-only BM25 over name + text (needs ``userQuery``)
+bm25_max_sim  Vespa's ``default`` profile: BM25 picks the top
+              ``ranking.rerankCount`` matching pages, which are then
+              ranked by ``max_sim``
+
+A ``guideline`` key in the body (see ``retrieve_cpic.build_query_body``)
+restricts scoring to that PDF's pages, skipping every other block.
+
+The float profiles need ``float16.npy`` next to the index (written by the
+pipeline with ``--local-index-output``); it is memory-mapped, so only the
+rows of reranked pages are read.  The BM25 profiles need the ``bm25/``
+sub-directory (see ``bm25_index.py``), also written by the pipeline.
+
+Example
+-------
+python local_engine.py --feed vespa_feed.jsonl --out local_index/
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from cpic_vlm_vector_store.bm25_index import BM25Index
+from cpic_vlm_vector_store.feed_io import iter_feed
+from cpic_vlm_vector_store.rewrite_labels import normalize_guideline
+
+META_FIELDS = ("id", "name", "path", "page_number")
+DIM = 128
+FLOAT_FILE = "float16.npy"
+FLOAT_IDS_FILE = "float_ids.json"
+BM25_DIR = "bm25"
+PROFILES = ("default", "binary", "float", "rerank_float", "bm25", "bm25_max_sim")
+
+
+# ------------------------------------------------------------------ #
+# 1. Response object (VespaQueryResponse look-alike)                 #
+# ------------------------------------------------------------------ #
+class LocalQueryResponse:
+    """Minimal subset of ``vespa.io.VespaQueryResponse`` used in this repo."""
+
+    def __init__(self, hits: List[Dict], total: int, elapsed: float,
+                 error: str | None = None) -> None:
+        self.hits = hits
+        self.number_documents_retrieved = total
+        self.elapsed = elapsed
+        self._error = error
+
+    @property
+    def json(self) -> Dict:
+        root = {"id": "toplevel", "relevance": 1.0,
+                "fields": {"totalCount": self.number_documents_retrieved},
+                "children": self.hits}
+        if self._error:
+            root["errors"] = [{"code": 400, "message": self._error}]
+        return {"root": root, "timing": {"searchtime": self.elapsed}}
+
+    def is_successful(self) -> bool:
+        return self._error is None
+
+    def get_error_message(self) -> str | None:
+        return self._error
+
+
+def query_tensor_to_array(tensor: Dict | Sequence) -> np.ndarray:
+    """{token_idx: [128 floats]} (or a list of rows) → (tokens, 128) float32."""
+    if isinstance(tensor, dict):
+        rows = [tensor[k] for k in sorted(tensor, key=int)]
+    else:
+        rows = list(tensor)
+    return np.asarray(rows, dtype=np.float32).reshape(-1, DIM)
+
+
+# ------------------------------------------------------------------ #
+# 2. Engine                                                          #
+# ------------------------------------------------------------------ #
+class LocalMaxSimEngine:
+    """
+    Parameters
+    ----------
+    packed        : (total_patches, 16) uint8 – packed sign bits, all pages.
+    offsets       : (pages + 1,) int64 – patch range of page i is
+                    offsets[i]:offsets[i+1].
+    meta          : per-page dicts with META_FIELDS.
+    block_patches : max patches unpacked at once while scoring.
+    float_emb     : optional (total_patches, 128) full-precision rows,
+                    aligned with ``packed`` (usually a float16 memmap).
+    bm25          : optional ``BM25Index`` whose columns follow ``meta``.
+    """
+
+    def __init__(
+        self,
+        packed: np.ndarray,
+        offsets: np.ndarray,
+        meta: List[Dict],
+        block_patches: int = 16384,
+        float_emb: np.ndarray | None = None,
+        bm25: BM25Index | None = None,
+    ) -> None:
+        self.packed = packed
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.meta = meta
+        self.block_patches = block_patches
+        if float_emb is not None and len(float_emb) != len(packed):
+            raise ValueError("float embeddings are not aligned with the index")
+        self.float_emb = float_emb
+        if bm25 is not None and bm25.ids != [m["id"] for m in meta]:
+            raise ValueError("BM25 index is not aligned with the page index")
+        self.bm25 = bm25
+        self._blocks = self._plan_blocks()
+        self._by_guideline: Dict[str, np.ndarray] | None = None
+
+    @property
+    def n_pages(self) -> int:
+        return len(self.meta)
+
+    def guideline_pages(self, guideline: str) -> np.ndarray:
+        """Sorted page indices of one guideline PDF (possibly empty)."""
+        if self._by_guideline is None:
+            groups: Dict[str, List[int]] = {}
+            for i, m in enumerate(self.meta):
+                groups.setdefault(normalize_guideline(m["name"]), []).append(i)
+            self._by_guideline = {
+                g: np.asarray(idx, dtype=np.int64) for g, idx in groups.items()}
+        return self._by_guideline.get(
+            normalize_guideline(guideline), np.zeros(0, dtype=np.int64))
+
+    def _plan_blocks(self) -> List[tuple]:
+        """Page ranges [p0, p1) whose patch count fits block_patches."""
+        blocks, p0 = [], 0
+        while p0 < self.n_pages:
+            limit = self.offsets[p0] + self.block_patches
+            p1 = max(p0 + 1, int(np.searchsorted(self.offsets, limit, "right")) - 1)
+            p1 = min(p1, self.n_pages)
+            blocks.append((p0, p1))
+            p0 = p1
+        return blocks
+
+    # -------------------------------------------------------------- #
+    # construction / persistence                                     #
+    # -------------------------------------------------------------- #
+    @classmethod
+    def from_feed(cls, feed_path: str | os.PathLike, **kw) -> "LocalMaxSimEngine":
+        """Build from a JSONL feed written by vespa_setup_pipeline."""
+        chunks, lengths, meta = [], [], []
+        for doc in iter_feed(feed_path):
+            emb = doc["embedding"]
+            hex_all = "".join(emb[k] for k in sorted(emb, key=int))
+            page = np.frombuffer(bytes.fromhex(hex_all), dtype=np.uint8)
+            chunks.append(page.reshape(-1, DIM // 8))
+            lengths.append(len(emb))
+            meta.append({k: doc[k] for k in META_FIELDS})
+        packed = (np.concatenate(chunks) if chunks
+                  else np.zeros((0, DIM // 8), np.uint8))
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        return cls(packed, offsets, meta, **kw)
+
+    def save(self, out_dir: str | os.PathLike) -> None:
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        np.save(out / "packed.npy", np.ascontiguousarray(self.packed))
+        np.save(out / "offsets.npy", self.offsets)
+        with open(out / "meta.jsonl", "w", encoding="utf-8") as fp:
+            for m in self.meta:
+                fp.write(json.dumps(m, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, index_dir: str | os.PathLike, mmap: bool = True,
+             **kw) -> "LocalMaxSimEngine":
+        d = Path(index_dir)
+        mode = "r" if mmap else None
+        packed = np.load(d / "packed.npy", mmap_mode=mode)
+        offsets = np.load(d / "offsets.npy")
+        with open(d / "meta.jsonl", encoding="utf-8") as fp:
+            meta = [json.loads(line) for line in fp if line.strip()]
+        float_emb = None
+        if (d / FLOAT_FILE).exists():
+            ids = json.loads((d / FLOAT_IDS_FILE).read_text())
+            if ids != [m["id"] for m in meta]:
+                raise ValueError(f"{d / FLOAT_FILE} was written for other pages")
+            float_emb = np.load(d / FLOAT_FILE, mmap_mode=mode)
+        bm25 = None
+        if (d / BM25_DIR).is_dir():
+            bm25 = BM25Index.load(d / BM25_DIR, mmap=mmap)
+        return cls(packed, offsets, meta, float_emb=float_emb, bm25=bm25, **kw)
+
+    @classmethod
+    def open(cls, path: str | os.PathLike, **kw) -> "LocalMaxSimEngine":
+        """Index directory → load(); feed file → from_feed()."""
+        return cls.load(path, **kw) if Path(path).is_dir() else cls.from_feed(path, **kw)
+
+    # -------------------------------------------------------------- #
+    # scoring                                                        #
+    # -------------------------------------------------------------- #
+    def score(
+        self,
+        queries: Sequence[np.ndarray],
+        ranking: str = "default",
+        pages: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        MaxSim scores of every query against every page → (queries, pages).
+
+        ``pages`` optionally restricts scoring to a sorted array of page
+        indices (others get -inf).
+        """
+        if ranking not in ("default", "binary", "float"):
+            raise ValueError(f"unknown ranking profile {ranking!r}")
+        if ranking == "float" and self.float_emb is None:
+            raise ValueError("profile 'float' needs float16.npy in the index")
+        q_all = np.concatenate([np.asarray(q, np.float32) for q in queries])
+        q_starts = np.cumsum([0] + [len(q) for q in queries])[:-1]
+        if ranking == "binary":
+            q_all = np.where(q_all > 0, 1.0, -1.0).astype(np.float32)
+
+        out = np.full((len(queries), self.n_pages), -np.inf, dtype=np.float32)
+        for p0, p1 in self._blocks:
+            if pages is not None:
+                sel = pages[(pages >= p0) & (pages < p1)]
+                if not len(sel):
+                    continue
+            s, e = self.offsets[p0], self.offsets[p1]
+            if ranking == "float":
+                bits = np.asarray(self.float_emb[s:e], dtype=np.float32)
+            else:
+                bits = np.unpackbits(self.packed[s:e], axis=1).astype(np.float32)
+            if ranking == "binary":
+                bits = bits * 2.0 - 1.0          # ±1: dot = 128 - 2·hamming
+            sims = q_all @ bits.T                 # (all tokens, block patches)
+            page_max = np.maximum.reduceat(
+                sims, self.offsets[p0:p1] - self.offsets[p0], axis=1)
+            if ranking == "binary":
+                page_max = 1.0 / (1.0 + (DIM - page_max) / 2.0)
+            block = np.add.reduceat(page_max, q_starts, axis=0)
+            if pages is None:
+                out[:, p0:p1] = block
+            else:
+                out[:, sel] = block[:, sel - p0]
+        return out
+
+    def rerank_float(self, query: np.ndarray, pages: np.ndarray) -> np.ndarray:
+        """Exact float MaxSim of one query against ``pages`` only."""
+        if self.float_emb is None:
+            raise ValueError("float reranking needs float16.npy in the index")
+        lengths = self.offsets[pages + 1] - self.offsets[pages]
+        rows = np.concatenate([
+            np.arange(self.offsets[p], self.offsets[p + 1]) for p in pages])
+        emb = np.asarray(self.float_emb[rows], dtype=np.float32)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        sims = np.asarray(query, np.float32) @ emb.T
+        return np.maximum.reduceat(sims, starts, axis=1).sum(axis=0)
+
+    def score_two_stage(
+        self,
+        queries: Sequence[np.ndarray],
+        rerank_count: int = 100,
+        pages: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        Binary MaxSim over all pages (or ``pages``), then float MaxSim for
+        each query's top ``rerank_count`` pages; other pages keep -inf.
+        """
+        first = self.score(queries, "binary", pages)
+        n = min(rerank_count, self.n_pages if pages is None else len(pages))
+        out = np.full_like(first, -np.inf)
+        if n == 0:
+            return out
+        for row, q in enumerate(queries):
+            cand = np.sort(np.argpartition(-first[row], n - 1)[:n])
+            out[row, cand] = self.rerank_float(q, cand)
+        return out
+
+    def score_bm25(
+        self,
+        texts: Sequence[str],
+        pages: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """BM25 scores; pages without a matching term (or outside ``pages``) get -inf."""
+        if self.bm25 is None:
+            raise ValueError("BM25 ranking needs bm25/ in the index")
+        scores = self.bm25.score(texts)
+        scores[scores <= 0] = -np.inf
+        if pages is not None:
+            keep = np.full(self.n_pages, -np.inf)
+            keep[pages] = 0.0
+            scores += keep
+        return scores
+
+    def score_bm25_max_sim(
+        self,
+        texts: Sequence[str],
+        queries: Sequence[np.ndarray],
+        rerank_count: int = 100,
+        pages: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        BM25 first phase, ``max_sim`` on each query's top ``rerank_count``
+        matching pages – the local twin of the Vespa ``default`` profile.
+        """
+        first = self.score_bm25(texts, pages)
+        out = np.full_like(first, -np.inf)
+        for row, q in enumerate(queries):
+            matched = np.flatnonzero(np.isfinite(first[row]))
+            n = min(rerank_count, len(matched))
+            if n == 0:
+                continue
+            cand = matched[np.argpartition(-first[row, matched], n - 1)[:n]]
+            cand = np.sort(cand)
+            out[row, cand] = self.score([q], "default", cand)[0, cand]
+        return out
+
+    def _hits(self, scores: np.ndarray, k: int) -> List[Dict]:
+        valid = np.flatnonzero(np.isfinite(scores))
+        k = min(k, len(valid))
+        if k == 0:
+            return []
+        top = valid[np.argpartition(-scores[valid], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            {
+                "id": f"id:pdf_page:pdf_page::{self.meta[i]['id']}",
+                "relevance": float(scores[i]),
+                "fields": dict(self.meta[i]),
+            }
+            for i in top
+        ]
+
+    # -------------------------------------------------------------- #
+    # Vespa-style API                                                #
+    # -------------------------------------------------------------- #
+    def query_many(self, bodies: Sequence[Dict]) -> List[LocalQueryResponse]:
+        """Score several query bodies in one blockwise pass per profile."""
+        out: List[LocalQueryResponse | None] = [None] * len(bodies)
+        by_profile: Dict[tuple, List[int]] = {}
+        for i, body in enumerate(bodies):
+            key = (body.get("ranking", "default"),
+                   int(body.get("ranking.rerankCount", 100)),
+                   body.get("guideline") or None)
+            by_profile.setdefault(key, []).append(i)
+        for (profile, rerank_count, guideline), idxs in by_profile.items():
+            t0 = time.perf_counter()
+            pages = self.guideline_pages(guideline) if guideline else None
+            if pages is not None and not len(pages):
+                for i in idxs:
+                    out[i] = LocalQueryResponse([], 0, 0.0)
+                continue
+            try:
+                texts = [bodies[i].get("userQuery", "") for i in idxs]
+                qs = ([] if profile == "bm25" else
+                      [query_tensor_to_array(bodies[i]["input.query(qt)"])
+                       for i in idxs])
+                if profile == "bm25":
+                    scores = self.score_bm25(texts, pages)
+                elif profile == "bm25_max_sim":
+                    scores = self.score_bm25_max_sim(
+                        texts, qs, rerank_count, pages)
+                elif profile == "rerank_float":
+                    scores = self.score_two_stage(qs, rerank_count, pages)
+                else:
+                    scores = self.score(qs, profile, pages)
+            except (KeyError, ValueError) as exc:
+                for i in idxs:
+                    out[i] = LocalQueryResponse([], 0, 0.0, error=repr(exc))
+                continue
+            elapsed = (time.perf_counter() - t0) / len(idxs)
+            for row, i in enumerate(idxs):
+                k = int(bodies[i].get("hits", 10))
+                out[i] = LocalQueryResponse(
+                    self._hits(scores[row], k),
+                    self.n_pages if pages is None else len(pages), elapsed)
+        return out
+
+    def query(self, body: Dict | None = None, **kwargs) -> LocalQueryResponse:
+        """Drop-in for ``Vespa.query(body=...)``."""
+        return self.query_many([{**(body or {}), **kwargs}])[0]
+
+
+def write_float_embeddings(
+    out_dir: str | os.PathLike,
+    pages: Sequence[tuple],
+) -> None:
+    """
+    Write full-precision page embeddings next to a local index.
+
+    ``pages`` is a sequence of (page_id, (patches, 128) tensor/array) in
+    feed order, i.e. the order ``iter_vespa_feed`` produced.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    total = sum(len(emb) for _, emb in pages)
+    mm = np.lib.format.open_memmap(
+        out / FLOAT_FILE, mode="w+", dtype=np.float16, shape=(total, DIM))
+    pos = 0
+    for _, emb in pages:
+        if hasattr(emb, "detach"):                      # torch.Tensor
+            emb = emb.detach().float().cpu().numpy()
+        mm[pos:pos + len(emb)] = np.asarray(emb, dtype=np.float16)
+        pos += len(emb)
+    mm.flush()
+    del mm
+    (out / FLOAT_IDS_FILE).write_text(json.dumps([pid for pid, _ in pages]))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Build a local MaxSim index from a feed")
+    p.add_argument("--feed", required=True, help="vespa_feed.jsonl[.zst]")
+    p.add_argument("--out", required=True, help="output index directory")
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    engine = LocalMaxSimEngine.from_feed(args.feed)
+    engine.save(args.out)
+    BM25Index.from_feed(args.feed).save(Path(args.out) / BM25_DIR)
+    print(f"[i] Indexed {engine.n_pages} pages / {len(engine.packed)} patches "
+          f"in {time.perf_counter() - t0:.1f}s → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# page_store.py
+# ---------------------------------------------------------------------
+# Page asset store shared by ingestion, retrieval and VLM extraction
+#
+# Every page is rendered once (200 dpi) per corpus version and kept as
+#   <root>/<sha_id[:2]>/<sha_id>/full.png     200 dpi render
+#                               h1024.png    max height 1024
+#                               h640.png     max height 640 (Vespa feed)
+#                               text.txt     PyMuPDF text layer
+#                               meta.json    name, page, source PDF sha256
+# A page is re-rendered only when the source PDF's sha256 changes.
+#
+# The store is ON by default and writes under ~/.cache/cpic_page_store
+# (several PNGs per page, so budget disk space for large corpora).
+# Point $CPIC_PAGE_STORE elsewhere to move it, or set CPIC_PAGE_STORE=off
+# to bypass the store entirely.
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import fitz                    # PyMuPDF
+from PIL import Image
+
+import cpic_vlm_vector_store.pdf_helper as pdf_helper
+
+RENDER_DPI = 200
+STANDARD_SIZES: Dict[str, int | None] = {"full": None, "h1024": 1024, "h640": 640}
+DEFAULT_ROOT = "~/.cache/cpic_page_store"
+STORE_HELP = (
+    f"Rendered pages are cached in $CPIC_PAGE_STORE (default {DEFAULT_ROOT}, "
+    "on unless CPIC_PAGE_STORE=off)."
+)
+
+
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+
+
+def pdf_sha256(pdf_path: str | Path) -> str:
+    """sha256 of the PDF bytes, memoised per process on (path, mtime, size)."""
+    st = os.stat(pdf_path)
+    key = (str(Path(pdf_path).resolve()), st.st_mtime_ns, st.st_size)
+    if key not in _DIGESTS:
+        h = hashlib.sha256()
+        with open(pdf_path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                h.update(chunk)
+        _DIGESTS[key] = h.hexdigest()
+    return _DIGESTS[key]
+
+
+class PageAssetStore:
+    """
+    Content-addressed store of rendered pages keyed by ``pdf_helper.sha_id``.
+    """
+
+    def __init__(self, root: str | os.PathLike) -> None:
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    # -------------------------------------------------------------- #
+    # keys / versions                                                #
+    # -------------------------------------------------------------- #
+    def page_dir(self, page_id: str) -> Path:
+        return self.root / page_id[:2] / page_id
+
+    def pdf_digest(self, pdf_path: str | Path) -> str:
+        return pdf_sha256(pdf_path)
+
+    def _is_current(self, page_id: str, digest: str) -> bool:
+        meta = self.page_dir(page_id) / "meta.json"
+        try:
+            return json.loads(meta.read_text())["pdf_sha256"] == digest
+        except (OSError, ValueError, KeyError):
+            return False
+
+    # -------------------------------------------------------------- #
+    # ingestion                                                      #
+    # -------------------------------------------------------------- #
+    def ensure_pdf(
+        self,
+        pdf_path: str | Path,
+        pages: List[int] | None = None,
+    ) -> List[str]:
+        """
+        Render and persist any missing/stale pages of ``pdf_path``.
+        Returns the page ids (all pages, or ``pages`` if given).
+        """
+        pdf_path = Path(pdf_path)
+        digest = self.pdf_digest(pdf_path)
+        doc = None
+        ids: List[str] = []
+        try:
+            if pages is None:
+                doc = fitz.open(str(pdf_path))
+                pages = list(range(doc.page_count))
+            for page_no in pages:
+                page_id = pdf_helper.sha_id(pdf_path.name, page_no)
+                ids.append(page_id)
+                if self._is_current(page_id, digest):
+                    continue
+                if doc is None:
+                    doc = fitz.open(str(pdf_path))
+                if page_no < 0 or page_no >= doc.page_count:
+                    raise IndexError(f"{pdf_path} has no page {page_no}")
+                self._write_page(page_id, doc.load_page(page_no),
+                                 pdf_path.name, page_no, digest)
+        finally:
+            if doc is not None:
+                doc.close()
+        return ids
+
+    def _write_page(
+        self,
+        page_id: str,
+        page: fitz.Page,
+        name: str,
+        page_no: int,
+        digest: str,
+    ) -> None:
+        out = self.page_dir(page_id)
+        out.mkdir(parents=True, exist_ok=True)
+        pix = page.get_pixmap(dpi=RENDER_DPI)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        for label, max_h in STANDARD_SIZES.items():
+            variant = img if max_h is None else pdf_helper.resize_image(img, max_h)
+            buf = io.BytesIO()
+            variant.save(buf, format="PNG")
+            _atomic_write(out / f"{label}.png", buf.getvalue())
+        _atomic_write(out / "text.txt", page.get_text("text").encode("utf-8"))
+        # meta last: its presence marks the page as complete
+        _atomic_write(out / "meta.json", json.dumps({
+            "name": name, "page_number": page_no, "pdf_sha256": digest,
+            "dpi": RENDER_DPI, "sizes": list(STANDARD_SIZES),
+        }).encode())
+
+    # -------------------------------------------------------------- #
+    # readers                                                        #
+    # -------------------------------------------------------------- #
+    def get_png(self, pdf_path: str | Path, page: int, size: str = "full") -> bytes:
+        """Stored PNG bytes of one page at a standard size."""
+        if size not in STANDARD_SIZES:
+            raise ValueError(f"size must be one of {list(STANDARD_SIZES)}")
+        (page_id,) = self.ensure_pdf(pdf_path, [page])
+        return (self.page_dir(page_id) / f"{size}.png").read_bytes()
+
+    def get_base64(self, pdf_path: str | Path, page: int, size: str = "full") -> str:
+        return base64.b64encode(self.get_png(pdf_path, page, size)).decode("utf-8")
+
+    def get_image(self, pdf_path: str | Path, page: int, size: str = "full") -> Image.Image:
+        img = Image.open(io.BytesIO(self.get_png(pdf_path, page, size)))
+        return img.convert("RGB")
+
+    def get_text(self, pdf_path: str | Path, page: int) -> str:
+        (page_id,) = self.ensure_pdf(pdf_path, [page])
+        return (self.page_dir(page_id) / "text.txt").read_text(encoding="utf-8")
+
+    # -------------------------------------------------------------- #
+    # raw assets (e.g. images fetched from Vespa when no PDF is local) #
+    # -------------------------------------------------------------- #
+    def read_asset(self, page_id: str, name: str) -> bytes | None:
+        path = self.page_dir(page_id) / name
+        return path.read_bytes() if path.exists() else None
+
+    def write_asset(self, page_id: str, name: str, data: bytes) -> None:
+        out = self.page_dir(page_id)
+        out.mkdir(parents=True, exist_ok=True)
+        _atomic_write(out / name, data)
+
+    def load_pdf(
+        self,
+        pdf_path: str | Path,
+    ) -> Tuple[List[Image.Image], List[str]]:
+        """All full-size page images and texts of one PDF."""
+        ids = self.ensure_pdf(pdf_path)
+        images, texts = [], []
+        for page_id in ids:
+            d = self.page_dir(page_id)
+            images.append(Image.open(d / "full.png").convert("RGB"))
+            texts.append((d / "text.txt").read_text(encoding="utf-8"))
+        return images, texts
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    # unique temp name: threads of one process may write the same page
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.",
+                               suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+_DEFAULT: PageAssetStore | None = None
+
+
+def default_store() -> PageAssetStore | None:
+    """Process-wide store from $CPIC_PAGE_STORE, or None when disabled."""
+    global _DEFAULT
+    root = os.getenv("CPIC_PAGE_STORE", DEFAULT_ROOT)
+    if root.lower() in ("", "off", "0", "none"):
+        return None
+    if _DEFAULT is None or _DEFAULT.root != Path(root).expanduser():
+        _DEFAULT = PageAssetStore(root)
+    return _DEFAULT
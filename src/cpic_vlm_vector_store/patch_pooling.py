@@ -0,0 +1,59 @@
+# patch_pooling.py
+# ---------------------------------------------------------------------
+# Index-time pooling of ColQwen patch embeddings
+#
+# Similar patches (mostly white margins and repeated background) are
+# merged with Ward hierarchical clustering and mean-pooled, cutting the
+# number of multi-vectors per page – and with it index size and the
+# cost of the `max_sim` rerank – by roughly `factor`.
+#
+# pip install scipy
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import math
+from typing import Dict, List
+
+import numpy as np
+import torch
+from scipy.cluster.hierarchy import fcluster, linkage
+
+
+def _as_float_array(emb: torch.Tensor | np.ndarray) -> np.ndarray:
+    if isinstance(emb, torch.Tensor):
+        emb = emb.detach().to(torch.float32).cpu().numpy()
+    return np.asarray(emb, dtype=np.float32)
+
+
+def pool_patches(emb: torch.Tensor | np.ndarray, factor: int) -> np.ndarray:
+    """
+    Reduce a (patches, dim) page embedding to ~patches / factor vectors.
+
+    Rows are clustered on cosine geometry (Ward linkage on L2-normalised
+    vectors); each cluster is replaced by its re-normalised mean.
+    ``factor <= 1`` returns the embedding unchanged.
+    """
+    x = _as_float_array(emb)
+    n = x.shape[0]
+    if factor <= 1 or n <= 1:
+        return x
+    n_clusters = max(1, math.ceil(n / factor))
+
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    unit = x / np.maximum(norms, 1e-12)
+    labels = fcluster(linkage(unit, method="ward"), t=n_clusters,
+                      criterion="maxclust") - 1
+
+    k = int(labels.max()) + 1
+    pooled = np.zeros((k, x.shape[1]), dtype=np.float32)
+    np.add.at(pooled, labels, unit)
+    pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled
+
+
+def pool_cpic_embeddings(cpic_pdfs: List[Dict], factor: int) -> None:
+    """In-place: replace every pdf["embeddings"][i] by its pooled version."""
+    if factor <= 1:
+        return
+    for pdf in cpic_pdfs:
+        pdf["embeddings"] = [pool_patches(e, factor) for e in pdf["embeddings"]]
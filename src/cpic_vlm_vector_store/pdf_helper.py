@@ -38,17 +38,33 @@ def _open_doc(pdf_source: io.BytesIO | str | Path) -> fitz.Document:
     else:
         return fitz.open(str(pdf_source))   # pathlib.Path or str
 
+def _store(store):
+    """Resolve the page asset store (None → process default)."""
+    if store is None:
+        from cpic_vlm_vector_store.page_store import default_store
+        store = default_store()
+    return store
+
 def get_pdf_images(
     pdf_buf: io.BytesIO | str | Path,
+    store=None,
 ) -> Tuple[List[Image.Image], List[str]]:
     """
     Render every page to a Pillow image *and* extract its text.
 
+    PDFs given by path go through the page asset store, so each page is
+    rendered only once per corpus version; in-memory PDFs are rendered.
+
     Returns
     -------
     images : list[PIL.Image.Image]
     texts  : list[str]
     """
+    if not isinstance(pdf_buf, io.BytesIO):
+        store = _store(store)
+        if store is not None:
+            return store.load_pdf(pdf_buf)
+
     doc = _open_doc(pdf_buf)
     images, texts = [], []
 
@@ -62,14 +78,14 @@ def get_pdf_images(
 # ------------------------------------------------------------------ #
 # 3. Directory-level loader                                          #
 # ------------------------------------------------------------------ #
-def get_cpic_pdf_images_texts(path: str | os.PathLike) -> List[dict]:
+def get_cpic_pdf_images_texts(path: str | os.PathLike, store=None) -> List[dict]:
     """
     Walk `path` for *.pdf files and return
     [{'path','name','images','texts'}, …]
     """
     out = []
     for pdf_file in sorted(Path(path).glob("*.pdf")):
-        imgs, txts = get_pdf_images(pdf_file)
+        imgs, txts = get_pdf_images(pdf_file, store)
         out.append(
             dict(
                 path=str(pdf_file),
@@ -108,11 +124,18 @@ def sha_id(name: str, page: int) -> str:
     """Deterministic SHA-256 page id."""
     return hashlib.sha256(f"{name}_{page}".encode()).hexdigest()
 
-def open_pdf_page(pdf_path: str | Path, page_number: int) -> Image.Image:
+def open_pdf_page(
+    pdf_path: str | Path,
+    page_number: int,
+    store=None,
+) -> Image.Image:
     """
     Convenience wrapper used by `save_hits` in retrieve_cpic.py.
-    Returns a Pillow image of the page.
+    Returns a Pillow image of the page (from the page asset store if enabled).
     """
+    store = _store(store)
+    if store is not None:
+        return store.get_image(pdf_path, page_number, "full")
     doc = fitz.open(str(pdf_path))
     if page_number < 0 or page_number >= doc.page_count:
         raise IndexError(f"{pdf_path} has no page {page_number}")
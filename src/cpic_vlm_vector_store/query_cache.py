@@ -0,0 +1,138 @@
+# query_cache.py
+# ---------------------------------------------------------------------
+# LRU cache for ColQwen query embeddings
+#
+# Key   : sha256(model name, processor config, query text)
+# Value : (tokens, 128) float32 CPU tensor
+#
+# Bounded in-memory LRU, optionally backed by an on-disk .npy store so
+# one-shot CLI processes share embeddings too.  The process default is
+# configured with $CPIC_QUERY_CACHE_SIZE and $CPIC_QUERY_CACHE_DIR.
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import torch
+
+
+def model_fingerprint(model, proc) -> str:
+    """Stable identity of (model weights name, processor config)."""
+    name = (
+        getattr(model, "name_or_path", None)
+        or getattr(getattr(model, "config", None), "_name_or_path", "")
+    )
+    try:
+        proc_cfg = proc.to_json_string()
+    except Exception:                      # older / custom processors
+        proc_cfg = repr(sorted(getattr(proc, "__dict__", {}).keys()))
+    return hashlib.sha256(f"{name}\0{proc_cfg}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe bounded LRU of query embeddings with optional disk tier."""
+
+    def __init__(self, maxsize: int = 1024, disk_dir: str | os.PathLike | None = None) -> None:
+        self.maxsize = maxsize
+        self.disk_dir = Path(disk_dir).expanduser() if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._mem: OrderedDict[str, torch.Tensor] = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[int, str] = {}
+        self.hits = self.disk_hits = self.misses = 0
+
+    # -------------------------------------------------------------- #
+    def key(self, model, proc, text: str) -> str:
+        ident = (id(model), id(proc))
+        fp = self._fingerprints.get(ident)
+        if fp is None:
+            fp = self._fingerprints[ident] = model_fingerprint(model, proc)
+        return hashlib.sha256(f"{fp}\0{text}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.npy"
+
+    def get(self, key: str) -> torch.Tensor | None:
+        with self._lock:
+            emb = self._mem.get(key)
+            if emb is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return emb
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            if path.exists():
+                emb = torch.from_numpy(np.load(path))
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, emb)
+                return emb
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, emb: torch.Tensor) -> None:
+        emb = emb.detach().to(torch.float32).cpu()
+        self._remember(key, emb)
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.",
+                                       suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fp:
+                    np.save(fp, emb.numpy())
+                os.replace(tmp, path)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+
+    def _remember(self, key: str, emb: torch.Tensor) -> None:
+        with self._lock:
+            self._mem[key] = emb
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.maxsize:
+                self._mem.popitem(last=False)
+
+    # -------------------------------------------------------------- #
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "size": len(self._mem),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+
+_DEFAULT: QueryEmbeddingCache | None = None
+
+
+def default_query_cache() -> QueryEmbeddingCache:
+    """Process-wide cache configured from the environment."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = QueryEmbeddingCache(
+            maxsize=int(os.getenv("CPIC_QUERY_CACHE_SIZE", "1024")),
+            disk_dir=os.getenv("CPIC_QUERY_CACHE_DIR") or None,
+        )
+    return _DEFAULT
@@ -3,6 +3,9 @@
 """
 Retrieve CPIC guideline pages from Vespa (tutorial‑style API).
 
+Pass ``--local-index`` instead of an endpoint to search offline with the
+in-process ``LocalMaxSimEngine`` (same query body, same hits format).
+
 The script follows the query pattern shown in pyvespa’s
 `docs/sphinx/source/query.ipynb`:
 
@@ -11,6 +14,15 @@ The script follows the query pattern shown in pyvespa’s
 3.  POST it via `app.query(body=query_body)`.
 4.  Save the returned page images.
 
+``--guideline`` (the rewrite's "CPIC Guideline Name") restricts the search
+to that PDF's pages with a ``name contains`` filter, falling back to the
+unfiltered search when the filter matches nothing.
+
+Searches select only ids, names, paths and page numbers; page images are
+materialised afterwards for the hits actually used (``fetch_page_image``):
+from the local page asset store when the PDF is on disk, otherwise from
+Vespa's document API, cached locally.
+
 Example
 -------
 ```bash
@@ -18,6 +30,8 @@ python retrieve_cpic.py \
   --query "dose adjustment for CYP2C19 poor metabolizer" \
   --endpoint-file vespa_endpoint.txt \
   --top-k 3
+
+python retrieve_cpic.py --query "..." --local-index local_index/
 ```
 """
 from __future__ import annotations
@@ -28,47 +42,133 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 import argparse
+import asyncio
+import base64
+import io
 import json
+import time
 import os
 from pathlib import Path
 import ast
-from typing import List
+from typing import Dict, List, Tuple
 
+import numpy as np
 import torch
 from tqdm import tqdm
 from vespa.application import Vespa
 from vespa.io import VespaQueryResponse
+from PIL import Image
 
 from colpali_engine.models import ColQwen2_5, ColQwen2_5_Processor
-from cpic_vlm_vector_store.vespa_setup_pipeline import load_model_and_processor  # same dir import
+from cpic_vlm_vector_store.vespa_setup_pipeline import (  # same dir import
+    MAX_NN_TOKENS,
+    load_model_and_processor,
+)
 import cpic_vlm_vector_store.pdf_helper as pdf_helper
+from cpic_vlm_vector_store.local_engine import LocalMaxSimEngine
+from cpic_vlm_vector_store.query_cache import (
+    QueryEmbeddingCache,
+    default_query_cache,
+)
+from cpic_vlm_vector_store.page_store import STANDARD_SIZES, STORE_HELP, default_store
+
+HITS_FILE = "hits.json"        # written by save_hits next to the PNGs
 
 # ---------------------------------------------------------------------------
 # Core helpers
 # ---------------------------------------------------------------------------
 
 
-def build_query_tensor(query: str, model: ColQwen2_5, proc: ColQwen2_5_Processor) -> dict:
-    """Return {patch_idx: 128‑d vector} as ordinary Python lists (JSON‑safe)."""
+def encode_queries(
+    queries: List[str],
+    model: ColQwen2_5,
+    proc: ColQwen2_5_Processor,
+    batch_size: int = 16,
+    cache: QueryEmbeddingCache | None | bool = None,
+) -> List[torch.Tensor]:
+    """
+    Embed queries in padded batches of at most ``batch_size`` (one forward
+    pass each, which bounds activation memory for long query lists);
+    returns one (tokens, 128) float32 CPU tensor per query with padding
+    rows removed.
+
+    Embeddings are looked up in ``cache`` (default: the process-wide
+    ``default_query_cache()``; ``False`` disables caching) and only the
+    misses go through the model.
+    """
+    if cache is None:
+        cache = default_query_cache()
+    out: List[torch.Tensor | None] = [None] * len(queries)
+    keys: List[str | None] = [None] * len(queries)
+    if cache:
+        for i, q in enumerate(queries):
+            keys[i] = cache.key(model, proc, q)
+            out[i] = cache.get(keys[i])
+    todo = [i for i, emb in enumerate(out) if emb is None]
+
     device = next(model.parameters()).device
-    batch = proc.process_queries([query])
-    batch = {k: v.to(device) for k, v in batch.items()}
-    with torch.no_grad():
-        emb = model(**batch)[0].cpu()           # (patch, 128)
-    return {i: v.tolist() for i, v in enumerate(emb)}
+    for s in range(0, len(todo), batch_size):
+        idxs = todo[s:s + batch_size]
+        batch = proc.process_queries([queries[i] for i in idxs])
+        mask = batch["attention_mask"].bool()
+        batch = {k: v.to(device) for k, v in batch.items()}
+        with torch.no_grad():
+            emb = model(**batch).float().cpu()   # (batch, tokens, 128)
+        for i, e, m in zip(idxs, emb, mask):
+            out[i] = e[m]
+            if cache:
+                cache.put(keys[i], out[i])
+    return out
+
+
+def tensor_to_body(emb: torch.Tensor) -> dict:
+    """(tokens, 128) tensor → {"token_idx": list} for ``input.query(qt)``."""
+    return {str(i): v.tolist() for i, v in enumerate(emb)}
+
+
+def build_query_tensor(
+    query: str,
+    model: ColQwen2_5,
+    proc: ColQwen2_5_Processor,
+    cache: QueryEmbeddingCache | None | bool = None,
+) -> dict:
+    """Return {patch_idx: 128‑d vector} as ordinary Python lists (JSON‑safe)."""
+    return tensor_to_body(encode_queries([query], model, proc, cache=cache)[0])
 
 
-def query_vespa(
-    app: Vespa,
+def guideline_filter(guideline: str | None) -> str:
+    """
+    YQL clause restricting hits to one guideline PDF (or "" for none).
+
+    ``name`` is a tokenized text field, so the quoted name matches as a
+    phrase and punctuation differences (":" vs "-", ".pdf") do not matter.
+    """
+    if not guideline:
+        return ""
+    name = guideline.strip()
+    if name.lower().endswith(".pdf"):
+        name = name[:-4].strip()
+    return f" and name contains {json.dumps(name, ensure_ascii=False)}"
+
+
+def build_query_body(
     user_query: str,
     tensor: dict,
     k: int,
-) -> VespaQueryResponse:
-    """Run a single query using the notebook‑style JSON body."""
+    with_image: bool = False,
+    guideline: str | None = None,
+) -> dict:
+    """
+    Notebook‑style JSON body for one query.  The base64 ``image`` field is
+    left out unless ``with_image``; see ``fetch_page_image``.  ``guideline``
+    scopes the search to one PDF.
+    """
+    image = "image, " if with_image else ""
     body = {
         "yql": (
-            "select name, path, image, page_number "
+            f"select id, name, path, {image}page_number "
             "from pdf_page where userInput(@userQuery)"
+            + guideline_filter(guideline)
         ),
         "hits": k,
         "ranking": "default",
@@ -76,29 +176,232 @@ def query_vespa(
         "userQuery": user_query,
         "input.query(qt)": tensor,
     }
-    return app.query(body=body)
+    if guideline:
+        body["guideline"] = guideline          # read by LocalMaxSimEngine
+    return body
+
+
+def build_nn_query_body(
+    user_query: str,
+    tensor: dict,
+    k: int,
+    target_hits: int = 20,
+    with_text: bool = True,
+    max_nn_tokens: int = MAX_NN_TOKENS,
+    rerank_count: int | None = None,
+    guideline: str | None = None,
+) -> dict:
+    """
+    Body that generates candidates from the HNSW index on ``embedding``.
+
+    Each of the first ``max_nn_tokens`` query tokens is binarized into
+    ``input.query(rq{i})`` and gets its own
+    ``({targetHits:N}nearestNeighbor(embedding, rq{i}))`` clause; the clauses
+    are OR'ed together, and with ``userInput(@userQuery)`` if ``with_text``.
+    Ranked by the ``retrieval-and-rerank`` profile; ``guideline`` scopes
+    the search to one PDF.
+    """
+    emb = np.asarray([tensor[i] for i in sorted(tensor, key=int)], dtype=np.float32)
+    binary = np.packbits(emb > 0, axis=1).astype(np.int8).tolist()
+    n_nn = min(len(binary), max_nn_tokens)
+
+    clauses = [
+        f"({{targetHits:{target_hits}}}nearestNeighbor(embedding,rq{i}))"
+        for i in range(n_nn)
+    ]
+    if with_text:
+        clauses.append("userInput(@userQuery)")
+    body = {
+        "yql": (
+            "select id, name, path, page_number from pdf_page where "
+            + (f"({' OR '.join(clauses)})" if guideline else " OR ".join(clauses))
+            + guideline_filter(guideline)
+        ),
+        "hits": k,
+        "ranking": "retrieval-and-rerank",
+        "timeout": 120,
+        "userQuery": user_query,
+        "input.query(qt)": tensor,
+        "input.query(qtb)": {i: v for i, v in enumerate(binary)},
+        **{f"input.query(rq{i})": binary[i] for i in range(n_nn)},
+    }
+    if rerank_count is not None:
+        body["ranking.rerankCount"] = rerank_count
+    if guideline:
+        body["guideline"] = guideline
+    return body
+
+
+def query_vespa(
+    app: Vespa | LocalMaxSimEngine,
+    user_query: str,
+    tensor: dict,
+    k: int,
+    ann_target_hits: int = 0,
+    ann_with_text: bool = True,
+    guideline: str | None = None,
+) -> VespaQueryResponse:
+    """
+    Run a single query using the notebook‑style JSON body; with
+    ``ann_target_hits > 0`` candidates come from nearestNeighbor clauses.
+
+    With ``guideline`` only that PDF's pages are searched; if that yields
+    no hits the unfiltered query is run instead.
+    """
+    def run(scope: str | None) -> VespaQueryResponse:
+        if ann_target_hits > 0 and not isinstance(app, LocalMaxSimEngine):
+            body = build_nn_query_body(
+                user_query, tensor, k, ann_target_hits, ann_with_text,
+                guideline=scope)
+        else:
+            body = build_query_body(user_query, tensor, k, guideline=scope)
+        return app.query(body=body)
+
+    resp = run(guideline)
+    if guideline and resp.is_successful() and not resp.hits:
+        print(f"[i] no hits inside {guideline!r}; searching all guidelines",
+              file=sys.stderr)          # stdout may carry JSON (vespa_query)
+        resp = run(None)
+    return resp
+
+
+async def query_vespa_many(
+    app: Vespa | LocalMaxSimEngine,
+    user_queries: List[str],
+    tensors: List[dict],
+    k: int,
+    connections: int = 8,
+    guidelines: List[str | None] | None = None,
+    session_kwargs: Dict | None = None,
+) -> List[Tuple[VespaQueryResponse, float]]:
+    """
+    Send all queries concurrently over one pooled ``app.asyncio`` session.
+
+    Returns (response, latency_s) per query, in request order.  A local
+    engine scores the whole batch in one pass instead.  ``guidelines``
+    optionally scopes each query (with unfiltered fall-back).
+    ``session_kwargs`` go to ``app.asyncio`` (e.g. ``{"http2_only": False}``
+    for an HTTP/1.1 endpoint such as ``VespaStandIn``).
+    """
+    guidelines = guidelines or [None] * len(user_queries)
+    bodies = [build_query_body(q, t, k, guideline=g)
+              for q, t, g in zip(user_queries, tensors, guidelines)]
+    if isinstance(app, LocalMaxSimEngine):
+        out = [(r, r.elapsed) for r in app.query_many(bodies)]
+        for i, (r, _) in enumerate(out):
+            if guidelines[i] and r.is_successful() and not r.hits:
+                r = app.query(body=build_query_body(user_queries[i], tensors[i], k))
+                out[i] = (r, out[i][1] + r.elapsed)
+        return out
+
+    async with app.asyncio(connections=connections, timeout=120,
+                           **(session_kwargs or {})) as session:
+        async def one(body: dict) -> Tuple[VespaQueryResponse, float]:
+            t0 = time.perf_counter()
+            resp = await session.query(body=body)
+            if body.get("guideline") and resp.is_successful() and not resp.hits:
+                fallback = {k: v for k, v in body.items() if k != "guideline"}
+                fallback["yql"] = body["yql"].replace(
+                    guideline_filter(body["guideline"]), "")
+                resp = await session.query(body=fallback)
+            return resp, time.perf_counter() - t0
+
+        return list(await asyncio.gather(*(one(b) for b in bodies)))
+
+
+def search_many(
+    app: Vespa | LocalMaxSimEngine,
+    queries: List[str],
+    model: ColQwen2_5,
+    proc: ColQwen2_5_Processor,
+    k: int,
+    connections: int = 8,
+) -> List[Tuple[VespaQueryResponse, float]]:
+    """Batch-encode ``queries`` (see ``encode_queries``), then search concurrently."""
+    tensors = [tensor_to_body(e) for e in encode_queries(queries, model, proc)]
+    return asyncio.run(query_vespa_many(app, queries, tensors, k, connections))
+
+
+def fetch_page_png(hit: dict, app=None, schema: str = "pdf_page") -> bytes:
+    """
+    PNG bytes of a hit's page, fetched only when asked for.
+
+    Order: local PDF via the page asset store → image already in the hit
+    → cached Vespa blob → Vespa document API (then cached).  Only the local
+    PDF gives a full-size render; the other sources hold the fed ``image``
+    field, which is at most 640 px high (``h640``).
+    """
+    fields = hit["fields"]
+    pdf_path, page = fields.get("path"), fields["page_number"]
+    store = default_store()
+    if pdf_path and Path(pdf_path).is_file():
+        if store is not None:
+            return store.get_png(pdf_path, page, "full")
+        buf = io.BytesIO()
+        pdf_helper.open_pdf_page(pdf_path, page).save(buf, format="PNG")
+        return buf.getvalue()
+
+    if fields.get("image"):
+        return base64.b64decode(fields["image"])
+
+    page_id = fields.get("id") or hit["id"].rsplit("::", 1)[-1]
+    if store is not None:
+        cached = store.read_asset(page_id, "vespa.png")
+        if cached is not None:
+            return cached
+    if not hasattr(app, "get_data"):                 # None or local engine
+        raise FileNotFoundError(
+            f"{pdf_path} not found locally and no Vespa app to fetch from")
+    resp = app.get_data(schema=schema, data_id=page_id)
+    if not resp.is_successful():
+        raise RuntimeError(f"cannot fetch {page_id}: {resp.json}")
+    png = base64.b64decode(resp.json["fields"]["image"])
+    if store is not None:
+        store.write_asset(page_id, "vespa.png", png)
+    return png
+
+
+def fetch_page_image(hit: dict, app=None, resize: int | None = None) -> Image.Image:
+    """Pillow image of a hit's page (see ``fetch_page_png``)."""
+    img = Image.open(io.BytesIO(fetch_page_png(hit, app))).convert("RGB")
+    return pdf_helper.resize_image(img, resize) if resize else img
 
 
 def save_hits(
     hits: list,
     out_dir: Path,
     resize: int | None,
+    app=None,
 ) -> List[str]:
-    """Save each hit’s page image as PNG and return file paths."""
+    """
+    Save each hit’s page image as PNG and return file paths.
+
+    ``hits.json`` next to the PNGs records each file's source PDF path and
+    0-based page, so extraction can address the page itself (and hit the
+    extraction cache) instead of the PNG.
+    """
     out_dir.mkdir(parents=True, exist_ok=True)
     saved: List[str] = []
+    records: List[dict] = []
+    store = default_store()
+    size = f"h{resize}" if resize else "full"
     for rank, hit in enumerate(hits):
         pdf_path = hit["fields"]["path"]
         page = hit["fields"]["page_number"]
         title = Path(pdf_path).stem
-
-        img = pdf_helper.open_pdf_page(pdf_path, page)
-        if resize:
-            img = pdf_helper.resize_image(img, resize)
-
         fname = f"{rank:02d}_{title}_p{page+1}.png"
-        img.save(out_dir / fname)
+
+        if store is not None and size in STANDARD_SIZES and Path(pdf_path).is_file():
+            # stored PNG is already at the requested size – copy bytes
+            (out_dir / fname).write_bytes(store.get_png(pdf_path, page, size))
+        else:
+            fetch_page_image(hit, app, resize).save(out_dir / fname)
         saved.append(str(out_dir / fname))
+        records.append({"rank": rank, "file": fname, "path": pdf_path,
+                        "page_number": page,
+                        "relevance": hit.get("relevance")})
+    (out_dir / HITS_FILE).write_text(
+        json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
     return saved
 
 # ---------------------------------------------------------------------------
@@ -107,12 +410,15 @@ def save_hits(
 
 
 def parser() -> argparse.ArgumentParser:
-    p = argparse.ArgumentParser("Retrieve CPIC pages via Vespa")
+    p = argparse.ArgumentParser("Retrieve CPIC pages via Vespa or locally",
+                                epilog=STORE_HELP)
     p.add_argument("--query", required=True)
 
     grp = p.add_mutually_exclusive_group(required=True)
     grp.add_argument("--endpoint", help="Full Vespa URL")
     grp.add_argument("--endpoint-file", help="File containing the URL")
+    grp.add_argument("--local-index",
+                     help="Local MaxSim index dir (or JSONL feed) – no Vespa")
 
     p.add_argument("--model-name", default="vidore/colqwen2.5-v0.2")
     p.add_argument("--cache-dir", default="/tmp/colqwen_cache")
@@ -120,31 +426,58 @@ def parser() -> argparse.ArgumentParser:
     p.add_argument("--top-k", type=int, default=3)
     p.add_argument("--save-dir", default="retrieved_pages")
     p.add_argument("--resize", type=int, default=640)
+    p.add_argument("--ann-target-hits", type=int, default=0,
+                   help="nearestNeighbor targetHits per query token (0 = BM25 only)")
+    p.add_argument("--guideline", default=None,
+                   help='Restrict to one PDF (rewrite "CPIC Guideline Name")')
+    p.add_argument("--ann-only", action="store_true",
+                   help="with --ann-target-hits, drop the text-match clause")
+    p.add_argument("--query-cache-dir", default=os.getenv("CPIC_QUERY_CACHE_DIR"),
+                   help="On-disk query-embedding cache shared across runs")
     return p
 
 
+def resolve_endpoint(
+    endpoint: str | None,
+    endpoint_file: str | None,
+) -> Tuple[str, tuple | None]:
+    """Return (url, cert_paths) from a direct URL or the pipeline's file."""
+    if endpoint:
+        return endpoint, None  # 若用户直接提供 URL，则不使用证书，或由 Vespa 客户端自行处理
+
+    endpoint_data = Path(endpoint_file).read_text()
+    endpoint_dict = ast.literal_eval(endpoint_data)
+
+    # 兼容大小写或不同键名
+    url = (
+        endpoint_dict.get("Endpoint")
+        or endpoint_dict.get("URL")
+        or endpoint_dict.get("url")
+    )
+    cert_paths = (
+        endpoint_dict.get("Cert"),
+        endpoint_dict.get("Key"),
+    )
+    return url, cert_paths
+
+
+def open_backend(
+    endpoint: str | None = None,
+    endpoint_file: str | None = None,
+    local_index: str | None = None,
+) -> Vespa | LocalMaxSimEngine:
+    """Vespa client for an endpoint, or the local engine for an index."""
+    if local_index:
+        return LocalMaxSimEngine.open(local_index)
+    url, cert_paths = resolve_endpoint(endpoint, endpoint_file)
+    return Vespa(url=url, cert=cert_paths)
+
+
 def main() -> None:
     args = parser().parse_args()
 
-    # Resolve endpoint ------------------------------------------
-    if args.endpoint:
-        endpoint = args.endpoint
-        cert_paths = None  # 若用户直接提供 URL，则不使用证书，或由 Vespa 客户端自行处理
-    else:
-        endpoint_data = Path(args.endpoint_file).read_text()
-        endpoint_dict = ast.literal_eval(endpoint_data)
-
-        # 兼容大小写或不同键名
-        endpoint = (
-            endpoint_dict.get("Endpoint")
-            or endpoint_dict.get("URL")
-            or endpoint_dict.get("url")
-        )
-
-        cert_paths = (
-            endpoint_dict.get("Cert"),
-            endpoint_dict.get("Key"),
-        )
+    # Resolve backend -------------------------------------------
+    app = open_backend(args.endpoint, args.endpoint_file, args.local_index)
 
     # Load model -------------------------------------------------
     device = args.device if torch.cuda.is_available() else "cpu"
@@ -152,17 +485,21 @@ def main() -> None:
         args.model_name, args.cache_dir, device)
 
     # Build tensor & query --------------------------------------
-    tensor = build_query_tensor(args.query, model, proc)
-    app = Vespa(url=endpoint, cert=cert_paths)
+    cache = default_query_cache()
+    if args.query_cache_dir:
+        cache = QueryEmbeddingCache(cache.maxsize, args.query_cache_dir)
+    tensor = build_query_tensor(args.query, model, proc, cache)
 
-    resp = query_vespa(app, args.query, tensor, args.top_k)
+    resp = query_vespa(app, args.query, tensor, args.top_k,
+                       args.ann_target_hits, not args.ann_only, args.guideline)
     if not resp.is_successful():
         raise RuntimeError(resp.get_error_message())
 
-    paths = save_hits(resp.hits, Path(args.save_dir), args.resize)
+    paths = save_hits(resp.hits, Path(args.save_dir), args.resize, app)
     print("Saved files:")
     for p in paths:
         print(" -", p)
+    print(f"[i] query cache: {cache.stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+# rewrite_labels.py
+# ---------------------------------------------------------------------
+# Helpers for the query-rewrite output format
+#
+#   [{"Drug Name": ..., "Gene Name": ..., "CPIC Guideline Name": "<pdf>",
+#     "Content to Search": ...}, ...]   or   "No CPIC guideline information..."
+#
+# plus (question → expected guideline) labels derived from
+# dataset/dataset.json and the SFT splits, used by the evaluation scripts.
+# ---------------------------------------------------------------------
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_DATASET = REPO_ROOT / "dataset" / "dataset.json"
+DEFAULT_SPLITS = tuple(
+    REPO_ROOT / "dataset_split_without_sysprompt" / f"{s}.jsonl"
+    for s in ("training", "validation", "test")
+)
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_guideline(name: str) -> str:
+    """
+    Canonical guideline key: case-folded, whitespace collapsed, no ".pdf".
+    Bridges the rewrite output and on-disk names such as "... (April 2019) .pdf"
+    (file names also spell ":" as "-").
+    """
+    name = _WS_RE.sub(" ", name.replace(":", "-")).strip()
+    if name.lower().endswith(".pdf"):
+        name = name[:-4]
+    return name.strip().casefold()
+
+
+def parse_rewrite(value) -> List[dict]:
+    """
+    Parse a rewrite answer (JSON string, dict or list) into a list of
+    entity dicts; the "No CPIC guideline information" answer gives [].
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.startswith(("[", "{")):
+            return []
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return []
+    if isinstance(value, dict):
+        value = [value]
+    return [v for v in value if isinstance(v, dict) and v.get("CPIC Guideline Name")]
+
+
+@dataclass(frozen=True)
+class LabelledQuery:
+    question: str            # original user question
+    search_text: str         # rewrite's "Content to Search"
+    guideline: str           # expected "CPIC Guideline Name"
+    split: str               # training | validation | test | dataset
+
+
+def load_labelled_queries(
+    dataset_json: str | Path = DEFAULT_DATASET,
+    splits: Iterable[str | Path] = DEFAULT_SPLITS,
+    only_splits: Iterable[str] | None = None,
+) -> List[LabelledQuery]:
+    """
+    Collect labelled queries; SFT split membership wins over dataset.json,
+    duplicates of (question, guideline) are dropped.
+    """
+    seen, out = set(), []
+
+    def add(question: str, answer, split: str) -> None:
+        for ent in parse_rewrite(answer):
+            key = (question, normalize_guideline(ent["CPIC Guideline Name"]))
+            if key in seen:
+                continue
+            seen.add(key)
+            out.append(LabelledQuery(
+                question=question,
+                search_text=ent.get("Content to Search") or question,
+                guideline=ent["CPIC Guideline Name"],
+                split=split,
+            ))
+
+    for path in splits:
+        path = Path(path)
+        if not path.exists():
+            continue
+        with open(path, encoding="utf-8") as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+                conv = json.loads(line)["conversations"]
+                user = next(t["value"] for t in conv if t["from"] == "User")
+                asst = next(t["value"] for t in conv if t["from"] == "Assistant")
+                add(user, asst, path.stem)
+
+    if dataset_json and Path(dataset_json).exists():
+        for row in json.loads(Path(dataset_json).read_text(encoding="utf-8")):
+            add(row["question"], row["answer"], "dataset")
+
+    if only_splits is not None:
+        keep = set(only_splits)
+        out = [q for q in out if q.split in keep]
+    return out
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Concurrent Vespa feeder with retries, backpressure and throughput stats.
+
+A producer pulls documents from any iterable (typically ``iter_feed``) into
+a bounded queue; ``concurrency`` workers drain it over one pooled
+``vespa_app.asyncio`` session.  429/503 answers and transport errors are
+retried with full-jitter exponential backoff.
+
+Example
+-------
+python vespa_feeder.py --feed vespa_feed.jsonl.zst \
+    --endpoint http://127.0.0.1:8080 --concurrency 16
+"""
+from __future__ import annotations
+
+import sys, pathlib
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]   # …/src/
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from tqdm import tqdm
+from vespa.application import Vespa
+
+try:                           # pyvespa ≥ 1.0 retries document/v1 calls itself
+    from vespa.retries import NO_RETRY
+except ImportError:
+    NO_RETRY = None
+
+from cpic_vlm_vector_store.feed_io import iter_feed
+
+RETRYABLE_STATUS = frozenset({429, 503})
+
+
+@dataclass
+class FeedReport:
+    """Outcome of one feeding run."""
+    docs_ok: int = 0
+    bytes_sent: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    failures: List[Tuple[str, int, str]] = field(default_factory=list)
+
+    @property
+    def docs_failed(self) -> int:
+        return len(self.failures)
+
+    @property
+    def docs_per_s(self) -> float:
+        return self.docs_ok / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.bytes_sent / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"fed {self.docs_ok} docs in {self.elapsed:.1f}s "
+            f"({self.docs_per_s:.1f} docs/s, "
+            f"{self.bytes_per_s / 1e6:.2f} MB/s), "
+            f"{self.retries} retries, {self.docs_failed} failures"
+        )
+
+
+def _backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def feed_concurrently(
+    vespa_app: Vespa,
+    docs: Iterable[Dict],
+    schema: str = "pdf_page",
+    *,
+    concurrency: int = 8,
+    queue_size: int | None = None,
+    max_retries: int = 5,
+    backoff_base: float = 0.5,
+    backoff_max: float = 30.0,
+    timeout: float = 180,
+    progress: bool = True,
+    session_kwargs: Dict | None = None,
+) -> FeedReport:
+    """
+    Feed ``docs`` with ``concurrency`` in-flight requests and return a report.
+
+    The queue holds at most ``queue_size`` documents (default
+    ``2 * concurrency``), so a slow cluster throttles the producer instead
+    of letting the whole feed pile up in memory.  pyvespa's own
+    document/v1 retries are switched off where supported, so retries happen
+    (and are counted) here only.  ``session_kwargs`` go to
+    ``vespa_app.asyncio`` (e.g. ``{"http2_only": False}`` for an HTTP/1.1
+    endpoint such as ``VespaStandIn``).
+    """
+    report = FeedReport()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or 2 * concurrency)
+    bar = tqdm(desc="Feeding pages", unit="doc", disable=not progress)
+
+    async def producer() -> None:
+        for doc in docs:
+            await queue.put(doc)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker(session) -> None:
+        while True:
+            doc = await queue.get()
+            if doc is None:
+                return
+            size = len(json.dumps(doc, ensure_ascii=False,
+                                  separators=(",", ":")).encode("utf-8"))
+            status, error = 0, ""
+            for attempt in range(max_retries + 1):
+                try:
+                    response = await session.feed_data_point(
+                        data_id=doc["id"], fields=doc, schema=schema)
+                    status = response.status_code
+                    if response.is_successful():
+                        error = ""
+                        break
+                    error = json.dumps(response.json)
+                    if status not in RETRYABLE_STATUS:
+                        break
+                except Exception as exc:            # transport-level error
+                    status, error = -1, repr(exc)
+                if attempt < max_retries:
+                    report.retries += 1
+                    await asyncio.sleep(
+                        _backoff(attempt, backoff_base, backoff_max))
+            if error:
+                report.failures.append((doc["id"], status, error))
+            else:
+                report.docs_ok += 1
+                report.bytes_sent += size
+            bar.update(1)
+
+    t0 = time.perf_counter()
+    session_kwargs = dict(session_kwargs or {})
+    if NO_RETRY is not None:
+        session_kwargs.setdefault("docv1_retry_policy", NO_RETRY)
+    async with vespa_app.asyncio(connections=concurrency, timeout=timeout,
+                                 **session_kwargs) as session:
+        tasks = [asyncio.ensure_future(producer())]
+        tasks += [asyncio.ensure_future(worker(session))
+                  for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # a failing task must not leave the producer blocked on a full
+            # queue (or workers waiting for documents that never come)
+            for task in tasks:
+                task.cancel()
+            bar.close()
+    report.elapsed = time.perf_counter() - t0
+    return report
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Feed a JSONL feed file into Vespa")
+    p.add_argument("--feed", required=True, help="vespa_feed.jsonl[.zst]")
+    p.add_argument("--endpoint", required=True, help="Vespa URL")
+    p.add_argument("--schema", default="pdf_page")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--max-retries", type=int, default=5)
+    args = p.parse_args()
+
+    app = Vespa(url=args.endpoint)
+    report = asyncio.run(feed_concurrently(
+        app, iter_feed(args.feed), args.schema,
+        concurrency=args.concurrency, max_retries=args.max_retries,
+    ))
+    print(f"[i] {report.summary()}")
+    for doc_id, status, error in report.failures[:20]:
+        print(f"    ✗ {doc_id} [{status}] {error[:200]}")
+    if report.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
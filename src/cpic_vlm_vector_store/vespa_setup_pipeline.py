@@ -6,8 +6,9 @@ CPIC guideline end-to-end pipeline
 Steps
 -----
 1. Read CPIC PDFs → extract images and texts.
-2. Generate patch-level embeddings with ColQwen2-5.
-3. Build a Vespa-compatible feed (JSON).
+2. Generate patch-level embeddings with ColQwen2-5
+   (optionally pool similar patches to shrink the index).
+3. Stream a Vespa-compatible feed (JSONL, optionally .zst).
 4. Optionally deploy schema + application to Vespa Cloud.
 5. Feed pages into Vespa document store.
 
@@ -29,16 +30,15 @@ import base64
 import hashlib
 import json
 import os
-from typing import Dict, List
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
 
 import numpy as np
 import torch
-from torch.utils.data import DataLoader
 from tqdm import tqdm
 from transformers.utils.import_utils import is_flash_attn_2_available
 from vespa.application import Vespa
 from vespa.deployment import VespaCloud
-from vespa.io import VespaResponse
 from vespa.package import (
     ApplicationPackage,
     Document,
@@ -54,6 +54,17 @@ from vespa.package import (
 
 from colpali_engine.models import ColQwen2_5, ColQwen2_5_Processor
 import cpic_vlm_vector_store.pdf_helper as pdf_helper
+from cpic_vlm_vector_store.bm25_index import BM25Index
+from cpic_vlm_vector_store.embed_scheduler import EmbedStats, embed_pages
+from cpic_vlm_vector_store.feed_io import FeedWriter, iter_feed
+from cpic_vlm_vector_store.local_engine import (
+    BM25_DIR,
+    LocalMaxSimEngine,
+    write_float_embeddings,
+)
+from cpic_vlm_vector_store.page_store import STORE_HELP, default_store
+from cpic_vlm_vector_store.patch_pooling import pool_cpic_embeddings
+from cpic_vlm_vector_store.vespa_feeder import feed_concurrently
 # import pdf_helper  # helper module
 
 # Disable duplicate tokenizer workers warning
@@ -93,61 +104,83 @@ def embed_cpic_pdfs(
     processor: ColQwen2_5_Processor,
     batch_size: int,
     device: str,
-) -> None:
+    num_workers: int = 2,
+) -> EmbedStats:
     """
     In-place embedding generation for each PDF.
     Adds a new key "embeddings" to every item in cpic_pdfs.
+
+    Batches span PDF boundaries and group pages of similar size; see
+    ``embed_scheduler.embed_pages``.
     """
-    for pdf in cpic_pdfs:
-        page_embeddings = []
-        dataloader = DataLoader(
-            pdf["images"],
-            batch_size=batch_size,
-            shuffle=False,
-            collate_fn=processor.process_images,
-        )
-        for batch in tqdm(dataloader, desc=f"Embedding {pdf['name']}"):
-            with torch.no_grad():
-                batch = {k: v.to(device) for k, v in batch.items()}
-                emb = model(**batch)
-                page_embeddings.extend(torch.unbind(emb.cpu()))
-        pdf["embeddings"] = page_embeddings
+    stats = embed_pages(
+        cpic_pdfs, model, processor, batch_size, device, num_workers
+    )
+    print(f"[i] {stats.summary()}")
+    return stats
 
 
 # ----------------------------------------------------------------------------- #
 #                           Vespa-related utilities                             #
 # ----------------------------------------------------------------------------- #
 
-def build_vespa_feed(cpic_pdfs: List[Dict]) -> List[Dict]:
+def binarize_page_embeddings(emb: torch.Tensor | np.ndarray) -> Dict[int, str]:
     """
-    Convert PDFs to Vespa feed format (list of dicts).
+    Binarize one page's (patches, 128) embedding matrix into Vespa's
+    ``tensor<int8>(patch{}, v[16])`` short form: {patch_idx: 32-char hex}.
+
+    The sign test, ``packbits`` and hex encoding run once over the whole
+    matrix; only the final split into per-patch strings is a Python loop.
+    """
+    if isinstance(emb, torch.Tensor):
+        bits = (emb > 0).cpu().numpy()
+    else:
+        bits = np.asarray(emb) > 0
+    packed = np.packbits(bits, axis=-1)              # (patches, 16) uint8
+    hex_all = packed.tobytes().hex()                 # one bulk encode
+    width = 2 * packed.shape[-1]
+    return {
+        idx: hex_all[idx * width:(idx + 1) * width]
+        for idx in range(packed.shape[0])
+    }
+
+
+def iter_vespa_feed(cpic_pdfs: List[Dict]) -> Iterator[Dict]:
+    """
+    Yield Vespa feed documents one page at a time.
+
+    The 640 px page image comes from the page asset store when enabled,
+    reusing the PNG rendered at ingestion instead of encoding it again.
     """
-    feed: List[Dict] = []
+    store = default_store()
     for pdf in cpic_pdfs:
         for page_num, (txt, emb, img) in enumerate(
             zip(pdf["texts"], pdf["embeddings"], pdf["images"])
         ):
-            emb_dict = {
-                idx: (
-                    np.packbits((patch > 0).cpu().numpy().astype(np.uint8))
-                    .astype(np.int8)
-                    .tobytes()
-                    .hex()
-                )
-                for idx, patch in enumerate(emb)
+            yield {
+                "id": pdf_helper.sha_id(pdf["name"], page_num),
+                "name": pdf["name"],
+                "path": pdf["path"],
+                "page_number": page_num,
+                "image": (
+                    store.get_base64(pdf["path"], page_num, "h640")
+                    if store is not None
+                    else pdf_helper.image_to_base64(img)
+                ),
+                "text": txt,
+                "embedding": binarize_page_embeddings(emb),
             }
-            feed.append(
-                {
-                    "id": pdf_helper.sha_id(pdf["name"], page_num),
-                    "name": pdf["name"],
-                    "path": pdf["path"],
-                    "page_number": page_num,
-                    "image": pdf_helper.image_to_base64(img),
-                    "text": txt,
-                    "embedding": emb_dict,
-                }
-            )
-    return feed
+
+
+def build_vespa_feed(cpic_pdfs: List[Dict]) -> List[Dict]:
+    """
+    Convert PDFs to Vespa feed format (list of dicts).
+    """
+    return list(iter_vespa_feed(cpic_pdfs))
+
+
+# query(rq0..rqN-1) inputs declared for nearestNeighbor candidate generation
+MAX_NN_TOKENS = 32
 
 
 def create_schema(schema_name: str = "pdf_page") -> Schema:
@@ -209,6 +242,46 @@ def create_schema(schema_name: str = "pdf_page") -> Schema:
         second_phase=SecondPhaseRanking("max_sim", rerank_count=100),
     )
     schema.add_rank_profile(profile)
+    # text-only baseline for evaluating what the max_sim rerank buys
+    schema.add_rank_profile(
+        RankProfile(
+            name="bm25",
+            functions=[Function("bm25_score", "bm25(name) + bm25(text)")],
+            first_phase=FirstPhaseRanking("bm25_score"),
+        )
+    )
+    # ANN candidates (per-query-token nearestNeighbor on the HNSW index),
+    # hamming MaxSim first phase, float max_sim rerank
+    schema.add_rank_profile(
+        RankProfile(
+            name="retrieval-and-rerank",
+            inputs=[
+                (f"query(rq{i})", "tensor<int8>(v[16])")
+                for i in range(MAX_NN_TOKENS)
+            ] + [
+                ("query(qtb)", "tensor<int8>(querytoken{}, v[16])"),
+                ("query(qt)", "tensor(querytoken{}, v[128])"),
+            ],
+            functions=[
+                Function(
+                    "max_sim",
+                    (
+                        "sum(reduce(sum(query(qt) * unpack_bits(attribute(embedding)), v), "
+                        "max, patch), querytoken)"
+                    ),
+                ),
+                Function(
+                    "max_sim_binary",
+                    (
+                        "sum(reduce(1 / (1 + sum(hamming(query(qtb), "
+                        "attribute(embedding)), v)), max, patch), querytoken)"
+                    ),
+                ),
+            ],
+            first_phase=FirstPhaseRanking("max_sim_binary"),
+            second_phase=SecondPhaseRanking("max_sim", rerank_count=100),
+        )
+    )
     return schema
 
 
@@ -243,7 +316,8 @@ def parse_args() -> argparse.Namespace:
     Command-line interface for the pipeline.
     """
     parser = argparse.ArgumentParser(
-        description="CPIC → Embeddings → Vespa pipeline"
+        description="CPIC → Embeddings → Vespa pipeline",
+        epilog=STORE_HELP,
     )
     parser.add_argument("--model-name", default="vidore/colqwen2.5-v0.2")
     parser.add_argument("--cache-dir", default="/tmp/colqwen_cache")
@@ -251,11 +325,24 @@ def parse_args() -> argparse.Namespace:
         "--device", default="cuda:0", help="cuda:0 | mps | cpu"
     )
     parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument(
+        "--num-workers", type=int, default=2,
+        help="Processes running processor.process_images",
+    )
+    parser.add_argument(
+        "--pool-factor", type=int, default=1,
+        help="Pool patches per page by this factor (1 = off)",
+    )
     parser.add_argument(
         "--cpic-dir", required=True, help="Directory with CPIC PDFs"
     )
     parser.add_argument(
-        "--feed-output", default="vespa_feed.json"
+        "--feed-output", default="vespa_feed.jsonl",
+        help="JSONL feed path; a .zst suffix enables zstd compression",
+    )
+    parser.add_argument(
+        "--local-index-output", default=None,
+        help="Also build a local MaxSim + BM25 index in this directory",
     )
     parser.add_argument(
         "--deploy-vespa",
@@ -271,26 +358,29 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--vespa-key", default=None, help="Private key text"
     )
+    parser.add_argument(
+        "--feed-concurrency", type=int, default=8,
+        help="In-flight feed requests",
+    )
     return parser.parse_args()
 
 
 async def feed_pages_to_vespa(
     vespa_app: Vespa,
-    feed: List[Dict],
-    schema: str = "pdf_page"
+    feed: Iterable[Dict],
+    schema: str = "pdf_page",
+    concurrency: int = 8,
 ) -> None:
     """
     Asynchronously feed each document in 'feed' to Vespa under 'schema'.
+    'feed' may be any iterable, e.g. ``iter_feed(path)``.
     """
-    async with vespa_app.asyncio(connections=1, timeout=180) as session:
-        for page in tqdm(feed, desc="Feeding pages"):
-            response: VespaResponse = await session.feed_data_point(
-                data_id=page["id"],
-                fields=page,
-                schema=schema,
-            )
-            if not response.is_successful():
-                print(f"Failed to feed {page['id']}: {response.json}")
+    report = await feed_concurrently(
+        vespa_app, feed, schema, concurrency=concurrency
+    )
+    print(f"[i] {report.summary()}")
+    for doc_id, status, error in report.failures:
+        print(f"Failed to feed {doc_id} [{status}]: {error}")
 
 
 def run(args: argparse.Namespace) -> None:
@@ -306,12 +396,28 @@ def run(args: argparse.Namespace) -> None:
     )
     # Step 3: Embed pages
     embed_cpic_pdfs(
-        cpic_pdfs, model, processor, args.batch_size, device
+        cpic_pdfs, model, processor, args.batch_size, device,
+        args.num_workers,
     )
-    # Step 4: Build JSON feed
-    feed = build_vespa_feed(cpic_pdfs)
-    with open(args.feed_output, "w", encoding="utf-8") as fp:
-        json.dump(feed, fp, ensure_ascii=False, indent=2)
+    # Step 3b: Optional patch pooling
+    pool_cpic_embeddings(cpic_pdfs, args.pool_factor)
+    # Step 4: Stream JSONL feed (one document per page, written as built)
+    with FeedWriter(args.feed_output) as writer:
+        writer.write_all(
+            tqdm(iter_vespa_feed(cpic_pdfs), desc="Writing feed")
+        )
+    print(f"[i] Wrote {writer.count} docs to {args.feed_output}")
+    if args.local_index_output:
+        LocalMaxSimEngine.from_feed(args.feed_output).save(
+            args.local_index_output)
+        BM25Index.from_feed(args.feed_output).save(
+            Path(args.local_index_output) / BM25_DIR)
+        write_float_embeddings(args.local_index_output, [
+            (pdf_helper.sha_id(pdf["name"], i), emb)
+            for pdf in cpic_pdfs
+            for i, emb in enumerate(pdf["embeddings"])
+        ])
+        print(f"[i] Local MaxSim index saved to {args.local_index_output}")
     # Step 5: Optionally deploy & feed
     if args.deploy_vespa:
         schema = create_schema()
@@ -332,9 +438,12 @@ def run(args: argparse.Namespace) -> None:
             fh.write(f"\t'URL':'{app.url}',\n")
             fh.write("\n}")
 
-        asyncio.run(feed_pages_to_vespa(app, feed))
+        asyncio.run(feed_pages_to_vespa(
+            app, iter_feed(args.feed_output),
+            concurrency=args.feed_concurrency,
+        ))
     else:
-        print("[i] Skipped Vespa deployment; feed JSON saved.")
+        print("[i] Skipped Vespa deployment; feed JSONL saved.")
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ CACHE_DIR="/home/jovyan/datasets/cc-20250630151645/"
 DEVICE="cuda:0"
 BATCH=4
 CPIC_DIR="/home/jovyan/datasets/cc-20250630151645/src/Guidelines"
-FEED_JSON="vespa_feed.json"
+FEED_JSON="vespa_feed.jsonl"     # use .jsonl.zst for a compressed feed
 
 # --- Vespa ---
 DEPLOY=true           # set to false if you only want the feed JSON
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local HTTP stand-in for the parts of the Vespa API this repo talks to.
+
+Endpoints
+---------
+POST/PUT /document/v1/<ns>/<schema>/docid/<id>   store a document
+GET      /document/v1/<ns>/<schema>/docid/<id>   fetch a stored document
+POST     /search/                               return canned hits
+GET      /ApplicationStatus                     health check
+
+Faults can be injected to exercise client retry logic: a fraction of
+document writes answer 429/503, and every response can be delayed.
+
+Example
+-------
+python vespa_standin.py --port 8080 --error-rate 0.2
+python vespa_feeder.py --feed vespa_feed.jsonl --endpoint http://127.0.0.1:8080
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+_DOC_RE = re.compile(r"^/document/v1/([^/]+)/([^/]+)/docid/([^/?]+)")
+
+
+class VespaStandIn:
+    """
+    Threaded in-process Vespa stand-in.
+
+    Parameters
+    ----------
+    error_rate : probability that a document write answers with one of
+                 ``error_codes`` instead of 200.
+    latency    : seconds to sleep before every response.
+    hits_fn    : callable(body: dict) -> list of hit dicts for /search/.
+                 Defaults to returning the first ``hits`` stored documents.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        error_rate: float = 0.0,
+        error_codes: tuple = (429, 503),
+        latency: float = 0.0,
+        hits_fn: Optional[Callable[[Dict], List[Dict]]] = None,
+        seed: int = 0,
+    ) -> None:
+        self.docs: Dict[str, Dict] = {}
+        self.requests: List[Dict] = []           # (method, path) log
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.latency = latency
+        self.hits_fn = hits_fn or self._default_hits
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------------------------------------------- #
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "VespaStandIn":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "VespaStandIn":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # -------------------------------------------------------------- #
+    def _default_hits(self, body: Dict) -> List[Dict]:
+        k = int(body.get("hits", 10))
+        hits = []
+        for rank, (doc_id, fields) in enumerate(list(self.docs.items())[:k]):
+            hits.append({
+                "id": f"id:pdf_page:pdf_page::{doc_id}",
+                "relevance": float(k - rank),
+                "fields": dict(fields),
+            })
+        return hits
+
+    def _inject_error(self) -> Optional[int]:
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return self._rng.choice(self.error_codes)
+        return None
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"           # keep-alive
+
+            def log_message(self, *args):           # silence stderr
+                pass
+
+            def _body(self) -> Dict:
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n) if n else b""
+                if self.headers.get("Content-Encoding") == "gzip":
+                    raw = gzip.decompress(raw)     # pyvespa compresses large bodies
+                return json.loads(raw) if raw else {}
+
+            def _send(self, status: int, payload: Dict) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _common(self, method: str) -> None:
+                with standin._lock:
+                    standin.requests.append(
+                        {"method": method, "path": self.path})
+                if standin.latency:
+                    time.sleep(standin.latency)
+
+            def do_GET(self):
+                self._common("GET")
+                if self.path.startswith("/ApplicationStatus"):
+                    return self._send(200, {})
+                m = _DOC_RE.match(self.path)
+                if m:
+                    ns, schema, doc_id = m.groups()
+                    fields = standin.docs.get(doc_id)
+                    if fields is None:
+                        return self._send(404, {"id": f"id:{ns}:{schema}::{doc_id}"})
+                    return self._send(200, {
+                        "pathId": self.path,
+                        "id": f"id:{ns}:{schema}::{doc_id}",
+                        "fields": fields,
+                    })
+                if self.path.startswith("/search/"):
+                    return self._search({})
+                self._send(404, {"message": "not found"})
+
+            def do_POST(self):
+                self._common("POST")
+                body = self._body()
+                m = _DOC_RE.match(self.path)
+                if m:
+                    return self._put(m, body)
+                if self.path.startswith("/search/"):
+                    return self._search(body)
+                self._send(404, {"message": "not found"})
+
+            do_PUT = do_POST
+
+            def _put(self, m, body: Dict) -> None:
+                ns, schema, doc_id = m.groups()
+                code = standin._inject_error()
+                if code is not None:
+                    return self._send(code, {"message": "injected overload"})
+                with standin._lock:
+                    standin.docs[doc_id] = body.get("fields", {})
+                self._send(200, {
+                    "pathId": self.path,
+                    "id": f"id:{ns}:{schema}::{doc_id}",
+                })
+
+            def _search(self, body: Dict) -> None:
+                hits = standin.hits_fn(body)
+                self._send(200, {
+                    "root": {
+                        "id": "toplevel",
+                        "relevance": 1.0,
+                        "fields": {"totalCount": len(hits)},
+                        "coverage": {"coverage": 100, "full": True},
+                        "children": hits,
+                    }
+                })
+
+        return Handler
+
+
+def main() -> None:
+    p = argparse.ArgumentParser("Run a local Vespa API stand-in")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--latency", type=float, default=0.0)
+    args = p.parse_args()
+
+    srv = VespaStandIn(args.host, args.port,
+                       error_rate=args.error_rate, latency=args.latency)
+    print(f"[i] Vespa stand-in listening on {srv.url}")
+    try:
+        srv._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
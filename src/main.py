@@ -2,6 +2,8 @@ import json, subprocess, sys, pathlib
 import os
 import re
 
+from cpic_vlm_vector_store.rewrite_labels import parse_rewrite
+
 QUESTION = "dose adjustment for CYP2C19 poor metabolizer"
 BASE = pathlib.Path(__file__).parent / "run_script"
 
@@ -33,35 +35,54 @@ print("Rewritten: ", rewritten_query)
 # (B) 在 conda 環境 `vespa_env` 內跑 vespa_query.py
 #     → 使用 conda run -n <env> python ...
 # ------------------------------------------------------------
-subprocess.check_output(
+# 每個 rewrite 實體：以 "Content to Search" 查詢，並限定在
+# "CPIC Guideline Name" 指定的指引內（無結果時自動退回全域搜尋）
+# 所有實體在同一個程序內查詢：ColQwen 只載入一次，查詢向量一次批次計算
+entities = parse_rewrite(rewritten_query or "") or [
+    {"Content to Search": rewritten_query or QUESTION}
+]
+for ent in entities:
+    ent["Content to Search"] = ent.get("Content to Search") or QUESTION
+out = subprocess.check_output(
     [
         "conda", "run", "-n", "vespa_env", "python",
-        BASE / "retrieve_cpic.py",
-        "--query", rewritten_query,
+        BASE / "vespa_query.py",
+        "--entities", json.dumps(entities, ensure_ascii=False),
         "--endpoint-file", "vespa_endpoint.txt",
-        "--top-k", "3",
+        "--topk", "3",
     ],
     text=True,
 )
+saved = json.loads(out.strip().splitlines()[-1])      # [[png, ...], ...]
 
 
 # ------------------------------------------------------------
 # (C) extract_page.py 同樣在 vespa_env 執行
+#     依 hits.json 取得每個命中頁的原始 PDF 與頁碼（0-based），
+#     以 --pdf <guideline.pdf> --page-idx <page> 呼叫，
+#     才能命中 bulk_extract 預先抽取的快取，而不是對 PNG 重新呼叫 VLM
 # ------------------------------------------------------------
 
-RETRIEVED_DIR = pathlib.Path("./retrieved_pages")
-PROMPT_TXT    = "Extract table from this page (markdown)."
+PROMPT_TXT = "Extract table from this page (markdown)."
+
+pages_by_pdf: dict = {}
+for hits_file in sorted({pathlib.Path(f).parent / "hits.json"
+                         for files in saved for f in files}):
+    for hit in json.loads(hits_file.read_text(encoding="utf-8")):
+        pages = pages_by_pdf.setdefault(hit["path"], [])
+        if hit["page_number"] not in pages:
+            pages.append(hit["page_number"])
 
-for cpic_single_page_png_path in RETRIEVED_DIR.glob("*.png"):
-    print(f"→ processing: {cpic_single_page_png_path.name}")
+for pdf_path, pages in pages_by_pdf.items():
+    print(f"→ processing: {pathlib.Path(pdf_path).name} pages {pages}")
 
     subprocess.run(
         [
             "conda", "run", "-n", "vespa_env", "python",
             BASE / "vlm_extract.py",
-            "--pdf", str(cpic_single_page_png_path),
-            "--page-idx", "0",              # 一律第 1 頁；可自行帶參數
+            "--pdf", pdf_path,
+            "--page-idx", *map(str, pages),
             "--prompt", PROMPT_TXT,
         ],
         check=True,
-    )
\ No newline at end of file
+    )
@@ -11,6 +11,13 @@ Typical call from main pipeline (inside *vespa_env*):
         --topk 5 \
         --save-dir retrieved_pages \
         --resize 640
+
+All entities of a query rewrite in one process (one ColQwen load, one
+batched embedding pass, concurrent searches):
+
+    conda run -n vespa_env python vespa_query.py \
+        --entities '[{"Content to Search": "...", "CPIC Guideline Name": "..."}]' \
+        --endpoint-file vespa_endpoint.txt
 """
 from __future__ import annotations
 
@@ -23,19 +30,26 @@ import argparse
 import json
 from pathlib import Path
 
-from cpic_vlm_vector_store.cpic_pagewise_query import cpic_query
+from cpic_vlm_vector_store.cpic_pagewise_query import cpic_query, cpic_query_many
 
 # ----------------------------------------------------------------------
 # CLI
 # ----------------------------------------------------------------------
 parser = argparse.ArgumentParser("Run CPIC Vespa retrieval and save images")
-parser.add_argument("--query", required=True, help="Natural-language query")
+qgrp = parser.add_mutually_exclusive_group(required=True)
+qgrp.add_argument("--query", help="Natural-language query")
+qgrp.add_argument("--entities",
+                  help='JSON list of rewrite entities ("Content to Search", '
+                       'optional "CPIC Guideline Name")')
 
 grp = parser.add_mutually_exclusive_group(required=True)
 grp.add_argument("--endpoint-file", help="Text file created by pipeline")
 grp.add_argument("--endpoint",       help="Direct Vespa URL (skip file)")
+grp.add_argument("--local-index",    help="Local MaxSim index (no Vespa)")
 
 parser.add_argument("--topk", type=int, default=3, help="hits to return")
+parser.add_argument("--guideline", default=None,
+                    help='restrict to one PDF (rewrite "CPIC Guideline Name")')
 parser.add_argument("--save-dir", default="retrieved_pages",
                     help="where PNG pages are stored")
 parser.add_argument("--resize", type=int, default=640,
@@ -46,13 +60,29 @@ args = parser.parse_args()
 # ----------------------------------------------------------------------
 # Call library helper
 # ----------------------------------------------------------------------
-files = cpic_query(
-    query=args.query,
-    endpoint_file=args.endpoint_file,
-    endpoint=args.endpoint,
-    top_k=args.topk,
-    save_dir=Path(args.save_dir),
-    resize=args.resize,
-)
+if args.entities:
+    entities = json.loads(args.entities)
+    files = cpic_query_many(
+        queries=[e["Content to Search"] for e in entities],
+        guidelines=[e.get("CPIC Guideline Name") or args.guideline
+                    for e in entities],
+        endpoint_file=args.endpoint_file,
+        endpoint=args.endpoint,
+        top_k=args.topk,
+        save_dir=Path(args.save_dir),
+        resize=args.resize,
+        local_index=args.local_index,
+    )
+else:
+    files = cpic_query(
+        query=args.query,
+        endpoint_file=args.endpoint_file,
+        endpoint=args.endpoint,
+        top_k=args.topk,
+        save_dir=Path(args.save_dir),
+        resize=args.resize,
+        local_index=args.local_index,
+        guideline=args.guideline,
+    )
 
 print(json.dumps(files, ensure_ascii=False))
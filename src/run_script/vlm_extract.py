@@ -26,15 +26,17 @@ from pathlib import Path
 
 # send_pdf_page is the function we previously wrote in cpic_vlm_parse:
 
-from cpic_vlm_parse.extract_api_call import send_pdf_page
+from cpic_vlm_parse.extract_api_call import send_pdf_page, send_pdf_pages
+from cpic_vlm_parse.image_encoding import NAMED_POLICIES
+from cpic_vlm_parse.request_policy import RequestPolicy, runner_for
 
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser("Send a single PDF page to NVIDIA VLM API")
     p.add_argument("--pdf", required=True, help="Local PDF file path")
-    p.add_argument("--page-idx", type=int, default=0,
-                   help="0-based page index (default: 0)")
+    p.add_argument("--page-idx", type=int, nargs="+", default=[0],
+                   help="0-based page index(es) (default: 0)")
     p.add_argument("--prompt", required=True, help="User prompt / task")
     p.add_argument("--model",
                    default="nvidia/llama-3.1-nemotron-nano-vl-8b-v1",
@@ -45,6 +47,28 @@ def build_arg_parser() -> argparse.ArgumentParser:
     p.add_argument("--temp", type=float, default=0.7)
     p.add_argument("--top-p", type=float, default=0.95)
     p.add_argument("--max-tokens", type=int, default=1024)
+    p.add_argument("--encoding", default=None,
+                   choices=["auto", *NAMED_POLICIES],
+                   help="Image payload preset; 'auto' = model preset "
+                        "(default: lossless PNG)")
+    p.add_argument("--crop-tables", action="store_true",
+                   help="Send only the page's table regions "
+                        "(no request if it has none)")
+    p.add_argument("--pack", type=int, default=1,
+                   help="Max pages per request when several --page-idx "
+                        "are given (default: 1, one request per page)")
+    p.add_argument("--token-budget", type=int, default=8192,
+                   help="Image-token cap for one packed request")
+    p.add_argument("--no-cache", action="store_true",
+                   help="Bypass the extraction cache ($CPIC_EXTRACTION_CACHE)")
+    p.add_argument("--deadline", type=float, default=120.0,
+                   help="Seconds per page request, retries included "
+                        "(0 = no deadline)")
+    p.add_argument("--max-retries", type=int, default=3,
+                   help="Retries for 429/5xx/timeouts, with jittered backoff")
+    p.add_argument("--hedge", action="store_true",
+                   help="Send a duplicate request when one runs past the "
+                        "p95 latency; keep the first answer")
     return p
 
 
@@ -60,18 +84,34 @@ def main() -> None:
     if not api_key:
         sys.exit("❌  Provide --api-key or set NVIDIA_API_TOKEN environment var.")
 
-    # --- Call helper ----------------------------------------------------
-    send_pdf_page(
-        pdf_file=str(pdf_path),
-        page_idx=args.page_idx,
+    common = dict(
         user_prompt=args.prompt,
         model=args.model,
         api_key=api_key,
         temperature=args.temp,
         top_p=args.top_p,
         max_tokens=args.max_tokens,
+        cache=False if args.no_cache else None,
+        encoding=args.encoding,
+        crop_tables=args.crop_tables,
+        policy=RequestPolicy(deadline=args.deadline or None,
+                             max_retries=args.max_retries, hedge=args.hedge),
     )
 
+    # --- Call helper ----------------------------------------------------
+    if args.pack > 1 and len(args.page_idx) > 1:
+        answers = send_pdf_pages(
+            [(str(pdf_path), idx) for idx in args.page_idx],
+            token_budget=args.token_budget, max_pages=args.pack, **common,
+        )
+        for idx, text in zip(args.page_idx, answers):
+            print(f"---- Page {idx} ----")
+            print(text)
+    else:
+        for idx in args.page_idx:
+            send_pdf_page(pdf_file=str(pdf_path), page_idx=idx, **common)
+    print(f"[i] Requests: {runner_for(common['policy']).metrics.summary()}")
+
 
 if __name__ == "__main__":
     main()
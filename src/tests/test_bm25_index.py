@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+import pytest
+
+from cpic_vlm_vector_store.bm25_index import FIELDS, BM25Index, tokenize
+
+DOCS = [
+    ("p0", {"name": "CYP2C19 and Clopidogrel",
+            "text": "Clopidogrel dosing for CYP2C19 poor metabolizers."}),
+    ("p1", {"name": "CYP2C19 and Clopidogrel",
+            "text": "Alternative antiplatelet therapy such as prasugrel."}),
+    ("p2", {"name": "TPMT and Thiopurines",
+            "text": "Reduce thiopurine dose; TPMT poor metabolizers need "
+                    "a lower starting dose of azathioprine."}),
+    ("p3", {"name": "SLCO1B1 and Statins", "text": ""}),
+    ("p4", {"name": "SLCO1B1 and Statins",
+            "text": "Simvastatin myopathy risk. Statin dose, dose, dose."}),
+]
+QUERIES = ["CYP2C19 clopidogrel", "poor metabolizers dose dose",
+           "statin myopathy", "unknown words only", "TPMT thiopurines azathioprine"]
+
+
+def naive_bm25(query, docs, k1=1.2, b=0.75):
+    """Textbook BM25 summed over fields, one page and query term at a time."""
+    scores = np.zeros(len(docs))
+    for f in FIELDS:
+        toks = [tokenize(values.get(f) or "") for _, values in docs]
+        n = len(toks)
+        avgdl = sum(map(len, toks)) / n or 1.0
+        for i, doc in enumerate(toks):
+            for term in tokenize(query):
+                tf = doc.count(term)
+                if not tf:
+                    continue
+                df = sum(term in d for d in toks)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                scores[i] += idf * tf * (k1 + 1) / (
+                    tf + k1 * (1 - b + b * len(doc) / avgdl))
+    return scores
+
+
+def test_batch_scores_match_per_query_and_naive_bm25():
+    index = BM25Index.build(DOCS)
+    batch = index.score(QUERIES)
+    assert batch.shape == (len(QUERIES), len(DOCS))
+    for row, q in enumerate(QUERIES):
+        np.testing.assert_allclose(batch[row], index.score([q])[0], rtol=1e-6)
+        np.testing.assert_allclose(batch[row], naive_bm25(q, DOCS), rtol=1e-5)
+    assert not batch[QUERIES.index("unknown words only")].any()
+
+
+def test_search_returns_matching_pages_best_first():
+    hits = BM25Index.build(DOCS).search(QUERIES, k=2)
+    assert [doc_id for doc_id, _ in hits[0]] == ["p0", "p1"]
+    assert hits[2][0][0] == "p4" and len(hits[2]) == 1
+    assert hits[3] == []
+
+
+def mapped(arr):
+    """True if ``arr`` is (a view of) a memory-mapped file."""
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_index_gives_the_same_results(tmp_path, mmap):
+    index = BM25Index.build(DOCS, k1=0.9, b=0.4)
+    index.save(tmp_path / "bm25")
+    loaded = BM25Index.load(tmp_path / "bm25", mmap=mmap)
+    w = loaded.weights
+    assert [mapped(a) for a in (w.data, w.indices, w.indptr)] == [mmap] * 3
+    assert (loaded.ids, loaded.vocab, loaded.k1, loaded.b) == (
+        index.ids, index.vocab, 0.9, 0.4)
+    np.testing.assert_array_equal(loaded.score(QUERIES), index.score(QUERIES))
+    assert loaded.search(QUERIES, k=3) == index.search(QUERIES, k=3)
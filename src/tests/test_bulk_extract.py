@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import fitz
+import pytest
+
+from cpic_vlm_parse.bulk_extract import bulk_extract, iter_guideline_pages
+from cpic_vlm_parse.extract_api_call import page_key_params
+from cpic_vlm_parse.extraction_cache import ExtractionCache, page_cache_id
+from cpic_vlm_parse.mock_vlm_server import MockVLMServer
+
+PROMPT = "Extract table from this page (markdown)."
+PARAMS = {"temperature": 0.7, "top_p": 0.95, "max_tokens": 1024}
+
+
+@pytest.fixture(autouse=True)
+def no_page_store(monkeypatch):
+    monkeypatch.setenv("CPIC_PAGE_STORE", "off")
+
+
+@pytest.fixture
+def pdf_dir(tmp_path):
+    out = tmp_path / "guidelines"
+    out.mkdir()
+    doc = fitz.open()
+    for p in range(4):
+        page = doc.new_page(width=300, height=200)
+        page.insert_text((20, 40), f"Table {p + 1}. CYP2C19 phenotype {p}")
+    doc.save(out / "guideline.pdf")
+    return out
+
+
+def run(server, pages, cache, **kw):
+    return asyncio.run(bulk_extract(
+        pages, cache, prompt=PROMPT, api_key="mock", base_url=server.url,
+        concurrency=2, max_retries=10, backoff_base=0.001, backoff_max=0.01,
+        progress=False, **kw))
+
+
+def answer(body):
+    return "| page | " + str(len(json.dumps(body["messages"]))) + " |"
+
+
+def test_bulk_extract_retries_and_fills_cache(tmp_path, pdf_dir):
+    pages = list(iter_guideline_pages(pdf_dir))
+    cache = ExtractionCache(tmp_path / "cache.db")
+    with MockVLMServer(error_rate=0.4, seed=3, answer_fn=answer) as server:
+        report = run(server, pages, cache)
+        sent = len(server.requests)
+
+    assert report.pages_total == 4 and report.extracted == 4
+    assert report.failures == []
+    assert report.retries > 0
+    assert sent == report.extracted + report.retries
+    key_params = page_key_params(PARAMS, None, False)
+    for pdf, page in pages:
+        text = cache.get(page_cache_id(pdf, page), PROMPT,
+                         "nvidia/llama-3.1-nemotron-nano-vl-8b-v1", key_params)
+        assert text and text.startswith("| page | ")
+
+
+def test_resume_from_checkpoint_skips_finished_pages(tmp_path, pdf_dir):
+    pages = list(iter_guideline_pages(pdf_dir))
+    ckpt = tmp_path / "ckpt.jsonl"
+    with MockVLMServer(answer_fn=answer) as server:
+        first = run(server, pages[:2], ExtractionCache(tmp_path / "a.db"),
+                    checkpoint=ckpt)
+        assert first.extracted == 2 and len(server.requests) == 2
+
+        # fresh cache: only the checkpoint knows pages 0 and 1 are done
+        second = run(server, pages, ExtractionCache(tmp_path / "b.db"),
+                     checkpoint=ckpt)
+        assert second.cached == 2 and second.extracted == 2
+        assert len(server.requests) == 4
+
+    records = [json.loads(line) for line in ckpt.read_text().splitlines()]
+    assert sorted(r["page"] for r in records) == [0, 1, 2, 3]
+    assert all(r["status"] == "ok" for r in records)
+
+
+def test_cached_pages_are_not_sent(tmp_path, pdf_dir):
+    pages = list(iter_guideline_pages(pdf_dir))
+    cache = ExtractionCache(tmp_path / "cache.db")
+    with MockVLMServer(answer_fn=answer) as server:
+        run(server, pages, cache)
+        again = run(server, pages, cache)
+        assert len(server.requests) == 4
+    assert again.cached == 4 and again.extracted == 0
+
+
+def test_unretryable_errors_are_reported(tmp_path, pdf_dir):
+    pages = list(iter_guideline_pages(pdf_dir))[:2]
+    cache = ExtractionCache(tmp_path / "cache.db")
+    ckpt = tmp_path / "ckpt.jsonl"
+    with MockVLMServer(error_rate=1.0, error_codes=(400,)) as server:
+        report = run(server, pages, cache, checkpoint=ckpt)
+        assert len(server.requests) == 2
+    assert report.extracted == 0 and report.retries == 0
+    assert sorted(status for _, status, _ in report.failures) == [400, 400]
+    assert all(json.loads(l)["status"] == "failed"
+               for l in ckpt.read_text().splitlines())
@@ -0,0 +1,102 @@
+import fitz
+import openai
+import pytest
+
+from cpic_vlm_parse.extract_api_call import (
+    PAGE_MARKER,
+    pack_pages,
+    split_multi_page_response,
+    stream_pdf_page,
+)
+from cpic_vlm_parse.mock_vlm_server import MockVLMServer
+from cpic_vlm_parse.request_policy import RequestPolicy, runner_for
+
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    monkeypatch.setenv("CPIC_PAGE_STORE", "off")
+    doc = fitz.open()
+    page = doc.new_page(width=300, height=200)
+    page.insert_text((20, 40), "Table 1. CYP2C19 phenotype")
+    doc.save(tmp_path / "guideline.pdf")
+    return tmp_path / "guideline.pdf"
+
+
+def test_split_on_requested_markers():
+    text = "\n\n".join(f"{PAGE_MARKER.format(k=k)}\n| a |\n| {k} |" for k in (1, 2, 3))
+    assert split_multi_page_response(text, 3) == ["| a |\n| 1 |", "| a |\n| 2 |",
+                                                  "| a |\n| 3 |"]
+
+
+def test_bold_marker_ends_the_previous_page():
+    text = "### PAGE 2\n\n**PAGE 3**\nfoo\n## Page 3"
+    assert split_multi_page_response(text, 3) == [None, "", "foo"]
+
+
+def test_bold_and_bare_marker_variants():
+    text = ("Sure, here are the tables.\n"
+            "PAGE 1:\na\n"
+            "**Page 2 (guideline.pdf, page 5)**\nb\n"
+            "__PAGE 3__\nc\n"
+            "  page 4  \nd")
+    assert split_multi_page_response(text, 4) == ["a", "b", "c", "d"]
+
+
+def test_prose_mentioning_a_page_is_not_a_marker():
+    text = "### PAGE 1\nPage 2 lists the alleles.\n**Page 2** shows it.\n### PAGE 2\nx"
+    assert split_multi_page_response(text, 2) == [
+        "Page 2 lists the alleles.\n**Page 2** shows it.", "x"]
+
+
+def test_missing_out_of_range_and_repeated_pages():
+    text = "### PAGE 3\nthird\n### PAGE 7\nnope\n### PAGE 3\nagain"
+    assert split_multi_page_response(text, 3) == [None, None, "third"]
+    assert split_multi_page_response("no markers at all", 2) == [None, None]
+
+
+def test_pack_pages_respects_budget_and_page_cap():
+    assert pack_pages([300, 300, 300, 300, 300], token_budget=1000, max_pages=2) == [
+        [0, 1], [2, 3], [4]]
+    assert pack_pages([300, 300, 300, 300], token_budget=1000, max_pages=4) == [
+        [0, 1, 2], [3]]
+
+
+def test_pack_pages_keeps_order_and_isolates_oversized_pages():
+    assert pack_pages([200, 5000, 200, 200], token_budget=1000, max_pages=4) == [
+        [0], [1], [2, 3]]
+    assert pack_pages([], token_budget=1000, max_pages=4) == []
+
+
+def test_stream_pdf_page_honors_request_and_encoding_policies(pdf):
+    mimes = []
+
+    def answer(body):
+        url = body["messages"][0]["content"][1]["image_url"]["url"]
+        mimes.append(url[5:url.index(";")])
+        return "| a |"
+
+    policy = RequestPolicy(deadline=10.0, max_retries=10, backoff_base=0.001,
+                           backoff_max=0.01)
+    with MockVLMServer(error_rate=0.4, seed=3, answer_fn=answer) as server:
+        stream = stream_pdf_page(pdf, 0, "Extract tables.", api_key="mock",
+                                 base_url=server.url, cache=False,
+                                 encoding="webp", policy=policy)
+        assert "".join(stream) == "| a |"
+        sent = len(server.requests)
+
+    metrics = runner_for(policy).metrics
+    assert metrics.calls == 1 and metrics.successes == 1
+    assert sent == 1 + metrics.retries
+    assert mimes == ["image/webp"]
+
+
+def test_stream_pdf_page_retry_budget_comes_from_the_policy(pdf):
+    policy = RequestPolicy(deadline=10.0, max_retries=2, backoff_base=0.001,
+                           backoff_max=0.01)
+    with MockVLMServer(error_rate=1.0, error_codes=(503,)) as server:
+        with pytest.raises(openai.APIStatusError):
+            stream_pdf_page(pdf, 0, "Extract tables.", api_key="mock",
+                            base_url=server.url, cache=False,
+                            encoding="jpeg", policy=policy)
+        sent = len(server.requests)
+    assert sent == 3
@@ -0,0 +1,40 @@
+import os
+
+from cpic_vlm_parse.extraction_cache import ExtractionCache, page_cache_id
+
+PARAMS = {"temperature": 0.0, "max_tokens": 64}
+
+
+def test_put_get_and_counters(tmp_path):
+    cache = ExtractionCache(tmp_path / "c.db")
+    assert cache.get("p1", "prompt", "m", PARAMS) is None
+    cache.put("p1", "prompt", "m", PARAMS, "| a | b |")
+    assert cache.contains("p1", "prompt", "m", PARAMS)
+    assert cache.get("p1", "prompt", "m", PARAMS) == "| a | b |"
+    assert cache.get("p1", "other prompt", "m", PARAMS) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_revised_pdf_with_same_name_misses(tmp_path):
+    pdf = tmp_path / "guideline.pdf"
+    pdf.write_bytes(b"%PDF-1.7 first edition")
+    cache = ExtractionCache(tmp_path / "c.db")
+    old_id = page_cache_id(pdf, 3)
+    cache.put(old_id, "prompt", "m", PARAMS, "old table")
+    assert cache.get(page_cache_id(pdf, 3), "prompt", "m", PARAMS) == "old table"
+    assert page_cache_id(pdf, 4) != old_id
+
+    pdf.write_bytes(b"%PDF-1.7 revised edition, same file name")
+    os.utime(pdf, ns=(1, 1))                 # mtime alone must not matter
+    new_id = page_cache_id(pdf, 3)
+    assert new_id != old_id
+    assert new_id.split("-")[0] == old_id.split("-")[0]   # same sha_id part
+    assert cache.get(new_id, "prompt", "m", PARAMS) is None
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    cache = ExtractionCache(tmp_path / "c.db", max_bytes=250)
+    for i in range(5):
+        cache.put(f"p{i}", "prompt", "m", PARAMS, "x" * 100)
+    kept = [i for i in range(5) if cache.contains(f"p{i}", "prompt", "m", PARAMS)]
+    assert kept == [3, 4]
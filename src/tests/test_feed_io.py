@@ -0,0 +1,12 @@
+from cpic_vlm_vector_store.feed_io import FeedWriter, iter_feed
+
+
+def test_bytes_written_counts_utf8_bytes(tmp_path):
+    path = tmp_path / "feed.jsonl"
+    docs = [{"put": "id:cpic:pdf_page::1", "fields": {"text": "CYP2C19 – µg/kg ≥ 2"}},
+            {"put": "id:cpic:pdf_page::2", "fields": {"text": "plain"}}]
+    with FeedWriter(path) as w:
+        w.write_all(docs)
+    assert w.count == 2
+    assert w.bytes_written == path.stat().st_size
+    assert list(iter_feed(path)) == docs
@@ -0,0 +1,70 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from cpic_vlm_parse.image_encoding import (
+    LOSSLESS,
+    NAMED_POLICIES,
+    EncodingPolicy,
+    crop_whitespace,
+    encode_image,
+    fit_pixels,
+    policy_for,
+)
+
+
+def page(width=800, height=1000, box=(200, 300, 500, 600)):
+    img = Image.new("RGB", (width, height), "white")
+    if box:
+        ImageDraw.Draw(img).rectangle(box, fill="black")
+    return img
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_fit_pixels_respects_the_budget_and_never_upscales():
+    img = page()
+    small = fit_pixels(img, 200_000)
+    assert small.width * small.height <= 200_000
+    assert abs(small.width / small.height - 0.8) < 0.01
+    assert fit_pixels(img, 10_000_000) is img
+    assert fit_pixels(img, None) is img
+
+
+def test_crop_whitespace_trims_margins_to_the_padding():
+    cropped = crop_whitespace(page(), pad=16)
+    assert cropped.size == (301 + 32, 301 + 32)
+
+
+def test_crop_keeps_padding_inside_the_page():
+    cropped = crop_whitespace(page(box=(0, 0, 99, 49)), pad=16)
+    assert cropped.size == (100 + 16, 50 + 16)
+
+
+def test_blank_page_passes_through_unchanged():
+    blank = page(box=None)
+    assert crop_whitespace(blank) is blank
+    out = decode(encode_image(blank, EncodingPolicy("png", crop_margins=True)))
+    assert out.size == blank.size
+
+
+def test_encode_image_applies_crop_then_budget():
+    policy = EncodingPolicy("jpeg", quality=80, max_pixels=50_000, crop_margins=True)
+    out = decode(encode_image(page(), policy))
+    assert out.format == "JPEG"
+    assert out.width * out.height <= 50_000
+    assert abs(out.width - out.height) <= 1          # square content box
+    assert decode(encode_image(page(), NAMED_POLICIES["webp"])).format == "WEBP"
+    assert decode(encode_image(page(), LOSSLESS)).size == (800, 1000)
+
+
+def test_tags_are_stable_and_distinguish_policies():
+    assert LOSSLESS.tag() == "png"
+    assert EncodingPolicy("png", quality=10).tag() == "png"
+    assert NAMED_POLICIES["jpeg"].tag() == "jpeg-q90-crop16"
+    assert policy_for("nvidia/llama-3.1-nemotron-nano-vl-8b-v1").tag() == (
+        "jpeg-q90-3145728px-crop16")
+    tags = [p.tag() for p in NAMED_POLICIES.values()]
+    assert len(set(tags)) == len(tags)
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from cpic_vlm_vector_store.local_engine import DIM, LocalMaxSimEngine
+
+GUIDELINES = ["CPIC Guideline for CYP2C19 and Clopidogrel.pdf",
+              "CPIC Guideline for TPMT and Thiopurines.pdf",
+              "CPIC Guideline for SLCO1B1 and Statins.pdf"]
+
+
+def make_engine(n_pages=24, seed=0, block_patches=64):
+    rng = np.random.default_rng(seed)
+    pages = [rng.standard_normal((rng.integers(5, 30), DIM)).astype(np.float16)
+             for _ in range(n_pages)]
+    emb = np.concatenate(pages)
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in pages])])
+    meta = [{"id": f"p{i}", "name": GUIDELINES[i % len(GUIDELINES)],
+             "path": f"/pdfs/{i}.pdf", "page_number": i} for i in range(n_pages)]
+    engine = LocalMaxSimEngine(np.packbits(emb > 0, axis=1), offsets, meta,
+                               block_patches=block_patches, float_emb=emb)
+    return engine, pages
+
+
+def brute_force(query, pages, ranking):
+    q = np.asarray(query, np.float64)
+    scores = []
+    for page in pages:
+        emb = page.astype(np.float64)
+        if ranking == "default":
+            scores.append((q @ (emb > 0).T).max(axis=1).sum())
+        elif ranking == "float":
+            scores.append((q @ emb.T).max(axis=1).sum())
+        else:                                        # binary
+            ham = ((q > 0)[:, None, :] != (emb > 0)[None, :, :]).sum(axis=2)
+            scores.append((1.0 / (1.0 + ham.min(axis=1))).sum())
+    return np.array(scores)
+
+
+def queries(n=4, seed=1):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal((rng.integers(3, 12), DIM)).astype(np.float32)
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize("ranking", ["default", "float", "binary"])
+@pytest.mark.parametrize("block_patches", [16, 64, 100_000])
+def test_score_matches_brute_force(ranking, block_patches):
+    engine, pages = make_engine(block_patches=block_patches)
+    qs = queries()
+    scores = engine.score(qs, ranking)
+    for row, q in enumerate(qs):
+        np.testing.assert_allclose(scores[row], brute_force(q, pages, ranking),
+                                   rtol=1e-4, atol=1e-3)
+
+
+@pytest.mark.parametrize("ranking", ["default", "float", "binary"])
+def test_guideline_restricted_query_scores_only_its_pages(ranking):
+    engine, pages = make_engine()
+    q = queries(1)[0]
+    body = {"ranking": ranking, "hits": 100, "guideline": GUIDELINES[1],
+            "input.query(qt)": {str(t): v.tolist() for t, v in enumerate(q)}}
+    resp = engine.query(body=body)
+    expected = brute_force(q, pages, ranking)
+    own = [i for i in range(len(pages)) if i % len(GUIDELINES) == 1]
+
+    assert resp.is_successful()
+    assert resp.number_documents_retrieved == len(own)
+    hits = {h["fields"]["page_number"]: h["relevance"] for h in resp.hits}
+    assert sorted(hits) == own
+    for i, rel in hits.items():
+        assert rel == pytest.approx(expected[i], rel=1e-4, abs=1e-3)
+    relevances = [h["relevance"] for h in resp.hits]
+    assert relevances == sorted(relevances, reverse=True)
+
+
+def test_two_stage_reranks_the_binary_top_n_with_float():
+    engine, pages = make_engine()
+    n = 6
+    qs = queries()
+    scores = engine.score_two_stage(qs, rerank_count=n)
+    for row, q in enumerate(qs):
+        binary = brute_force(q, pages, "binary")
+        order = np.argsort(-binary, kind="stable")
+        assert binary[order[n - 1]] > binary[order[n]]  # no tie at the cut
+        cand = np.sort(order[:n])
+        assert np.array_equal(np.flatnonzero(np.isfinite(scores[row])), cand)
+        np.testing.assert_allclose(scores[row, cand],
+                                   brute_force(q, pages, "float")[cand],
+                                   rtol=1e-4, atol=1e-3)
+
+
+def test_two_stage_top_k_equals_exact_float_top_k():
+    # 8 topics of 10 pages; a page's patches are noisy copies of its
+    # topic's prototype patches, and a query samples one topic's prototypes
+    rng = np.random.default_rng(2)
+    protos = rng.standard_normal((8, 20, DIM)).astype(np.float32)
+    pages = [(protos[p // 10][rng.integers(0, 20, rng.integers(10, 30))]
+              + rng.standard_normal((1, DIM)) * 0.1).astype(np.float16)
+             for p in range(80)]
+    pages = [(p + rng.standard_normal(p.shape) * 0.6).astype(np.float16)
+             for p in pages]
+    emb = np.concatenate(pages)
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in pages])])
+    meta = [{"id": f"p{i}", "name": GUIDELINES[0], "path": "", "page_number": i}
+            for i in range(80)]
+    engine = LocalMaxSimEngine(np.packbits(emb > 0, axis=1), offsets, meta,
+                               block_patches=256, float_emb=emb)
+    k, n = 5, 10
+    for topic in range(8):
+        q = protos[topic][rng.choice(20, size=6, replace=False)]
+        q = q + rng.standard_normal(q.shape).astype(np.float32) * 0.6
+        body = {"hits": k,
+                "input.query(qt)": {str(t): v.tolist() for t, v in enumerate(q)}}
+        exact = engine.query(body={**body, "ranking": "float"})
+        two_stage = engine.query(body={**body, "ranking": "rerank_float",
+                                       "ranking.rerankCount": n})
+        assert [h["id"] for h in two_stage.hits] == [h["id"] for h in exact.hits]
+        assert [h["relevance"] for h in two_stage.hits] == pytest.approx(
+            [h["relevance"] for h in exact.hits], rel=1e-5)
+        assert all(h["fields"]["page_number"] // 10 == topic for h in exact.hits)
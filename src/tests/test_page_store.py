@@ -0,0 +1,108 @@
+import io
+import threading
+
+import fitz
+import pytest
+from PIL import Image
+
+from cpic_vlm_parse.extract_api_call import pdf_page_to_base64
+from cpic_vlm_parse.image_encoding import render_page
+from cpic_vlm_vector_store import page_store, pdf_helper
+from cpic_vlm_vector_store.page_store import PageAssetStore, default_store
+from cpic_vlm_vector_store.retrieve_cpic import fetch_page_png
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    doc = fitz.open()
+    for p in range(3):
+        page = doc.new_page(width=200, height=100)
+        page.insert_text((20, 40), f"Table {p + 1}. TPMT phenotype")
+    doc.save(tmp_path / "guideline.pdf")
+    return tmp_path / "guideline.pdf"
+
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    """Store under tmp_path; returns the list of (name, page) rendered."""
+    monkeypatch.setenv("CPIC_PAGE_STORE", str(tmp_path / "store"))
+    calls = []
+    write_page = PageAssetStore._write_page
+
+    def counting(self, page_id, page, name, page_no, digest):
+        calls.append((name, page_no))
+        write_page(self, page_id, page, name, page_no, digest)
+
+    monkeypatch.setattr(PageAssetStore, "_write_page", counting)
+    return calls
+
+
+def test_page_rendered_once_across_call_sites(pdf, renders):
+    hit = {"fields": {"path": str(pdf), "page_number": 1}}
+    ingested, texts = pdf_helper.get_pdf_images(pdf)           # ingestion
+    retrieved = fetch_page_png(hit)                             # retrieval
+    extracted = render_page(pdf, 1)                             # extraction
+    b64 = pdf_page_to_base64(pdf, 1)
+
+    assert sorted(renders) == [("guideline.pdf", p) for p in range(3)]
+    assert "Table 2." in texts[1]
+    assert Image.open(io.BytesIO(retrieved)).size == ingested[1].size
+    assert extracted.tobytes() == ingested[1].tobytes()
+    assert b64 == default_store().get_base64(pdf, 1)
+
+
+def test_second_call_is_served_from_the_store(pdf, renders, tmp_path):
+    store = default_store()
+    first = store.get_png(pdf, 2, "h640")
+    again = store.get_png(pdf, 2, "h640")
+    # a fresh store object (e.g. another process) reuses the files too
+    other = PageAssetStore(tmp_path / "store").get_png(pdf, 2, "h640")
+    assert renders == [("guideline.pdf", 2)]
+    assert first == again == other
+
+
+def test_changed_pdf_is_rendered_again(pdf, renders):
+    store = default_store()
+    store.get_text(pdf, 0)
+    with fitz.open(pdf) as doc:
+        doc.load_page(0).insert_text((20, 80), "Revised")
+        doc.saveIncr()
+    assert "Revised" in store.get_text(pdf, 0)
+    assert renders == [("guideline.pdf", 0)] * 2
+
+
+@pytest.mark.parametrize("page", [3, 10, -1])
+def test_invalid_page_index_raises_index_error(pdf, renders, page):
+    store = default_store()
+    with pytest.raises(IndexError):
+        store.get_png(pdf, page)
+    with pytest.raises(IndexError):
+        store.ensure_pdf(pdf, [0, page])
+    with pytest.raises(ValueError):                # extraction call site
+        render_page(pdf, page)
+
+
+def test_concurrent_writes_of_one_page_do_not_collide(tmp_path):
+    path = tmp_path / "full.png"
+    errors = []
+
+    def write(i):
+        try:
+            for _ in range(50):
+                page_store._atomic_write(path, bytes([i]) * 4096)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    data = path.read_bytes()
+    assert errors == [] and len(set(data)) == 1 and len(data) == 4096
+    assert [p.name for p in tmp_path.iterdir()] == ["full.png"]
+
+
+def test_store_can_be_switched_off(monkeypatch):
+    monkeypatch.setenv("CPIC_PAGE_STORE", "off")
+    assert default_store() is None
@@ -0,0 +1,106 @@
+import json
+import threading
+
+import torch
+
+from cpic_vlm_vector_store.query_cache import QueryEmbeddingCache
+from cpic_vlm_vector_store.retrieve_cpic import encode_queries
+
+
+class FakeProcessor:
+    def __init__(self, image_mean=(0.5, 0.5, 0.5)):
+        self.image_mean = list(image_mean)
+        self.seen = []
+
+    def to_json_string(self):
+        return json.dumps({"do_normalize": True, "image_mean": self.image_mean})
+
+    def process_queries(self, texts):
+        self.seen.append(list(texts))
+        width = max(len(t) for t in texts)
+        ids = torch.zeros(len(texts), width, dtype=torch.long)
+        mask = torch.zeros(len(texts), width, dtype=torch.long)
+        for i, t in enumerate(texts):                # left padding
+            ids[i, width - len(t):] = torch.tensor([ord(c) for c in t])
+            mask[i, width - len(t):] = 1
+        return {"input_ids": ids, "attention_mask": mask}
+
+
+class FakeModel(torch.nn.Module):
+    def __init__(self, name="vidore/colqwen2.5-v0.2"):
+        super().__init__()
+        self.name_or_path = name
+        self.scale = torch.nn.Parameter(torch.ones(()))
+        self.calls = 0
+
+    def forward(self, input_ids, attention_mask):
+        self.calls += 1
+        return input_ids[..., None].float() * self.scale * torch.ones(128)
+
+
+def test_hit_skips_the_encoder():
+    cache = QueryEmbeddingCache(maxsize=8)
+    model, proc = FakeModel(), FakeProcessor()
+    first = encode_queries(["warfarin", "tpmt"], model, proc, cache=cache)
+    assert model.calls == 1 and cache.misses == 2
+
+    again = encode_queries(["tpmt", "warfarin"], model, proc, cache=cache)
+    assert model.calls == 1 and cache.hits == 2
+    assert torch.equal(again[0], first[1]) and torch.equal(again[1], first[0])
+    assert again[0].shape == (4, 128)                # padding rows removed
+
+    encode_queries(["tpmt", "cyp2c19"], model, proc, cache=cache)
+    assert model.calls == 2 and proc.seen[-1] == ["cyp2c19"]
+    assert cache.stats()["hit_rate"] == round(3 / 6, 4)
+
+
+def test_eviction_at_capacity_drops_least_recently_used():
+    cache = QueryEmbeddingCache(maxsize=2)
+    for key in ("a", "b"):
+        cache.put(key, torch.zeros(1, 128))
+    assert cache.get("a") is not None                # "a" is now most recent
+    cache.put("c", torch.zeros(1, 128))
+    assert cache.stats()["size"] == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    emb = torch.arange(256, dtype=torch.float32).reshape(2, 128)
+    QueryEmbeddingCache(disk_dir=tmp_path).put("k" * 64, emb)
+    fresh = QueryEmbeddingCache(disk_dir=tmp_path)
+    assert torch.equal(fresh.get("k" * 64), emb) and fresh.disk_hits == 1
+
+
+def test_key_depends_on_model_processor_and_text():
+    cache = QueryEmbeddingCache()
+    model, proc = FakeModel(), FakeProcessor()
+    key = cache.key(model, proc, "warfarin")
+    assert cache.key(model, proc, "warfarin") == key
+    assert QueryEmbeddingCache().key(FakeModel(), FakeProcessor(), "warfarin") == key
+    assert cache.key(model, proc, "warfarin ") != key
+    assert cache.key(FakeModel("vidore/colqwen2-v1.0"), proc, "warfarin") != key
+    assert cache.key(model, FakeProcessor(image_mean=(0.48, 0.46, 0.41)),
+                     "warfarin") != key
+
+
+def test_concurrent_disk_writes_of_one_key(tmp_path):
+    emb = torch.ones(3, 128)
+    cache = QueryEmbeddingCache(disk_dir=tmp_path)
+    errors = []
+
+    def put():
+        try:
+            for _ in range(30):
+                cache.put("k" * 64, emb)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert [p.name for p in (tmp_path / "kk").iterdir()] == ["k" * 64 + ".npy"]
+    assert torch.equal(QueryEmbeddingCache(disk_dir=tmp_path).get("k" * 64), emb)
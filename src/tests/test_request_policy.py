@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cpic_vlm_parse.mock_vlm_server import MockVLMServer
+from cpic_vlm_parse.request_policy import DeadlineExceeded, RequestPolicy, RequestRunner
+from cpic_vlm_parse.vlm_client import AsyncVLMClient
+
+MESSAGES = [{"role": "user", "content": "page"}]
+
+
+def run_calls(server, policy, n, concurrency):
+    async def go():
+        async with AsyncVLMClient(server.url, "mock", concurrency=concurrency,
+                                  cache=False, policy=policy) as vlm:
+            texts = await asyncio.gather(
+                *(vlm.complete(MESSAGES, max_tokens=8) for _ in range(n)))
+            return texts, vlm.metrics
+    return asyncio.run(go())
+
+
+def test_queueing_for_a_slot_does_not_trigger_hedges():
+    # 24 calls through 2 slots queue for ~0.6 s, four times the hedge delay
+    policy = RequestPolicy(deadline=10.0, hedge=True, hedge_default_delay=0.15,
+                           min_samples=1000, attempt_timeout=0.5, max_retries=0)
+    with MockVLMServer(latency=0.05) as server:
+        texts, metrics = run_calls(server, policy, n=24, concurrency=2)
+        sent = len(server.requests)
+    assert len(texts) == 24 and sent == 24
+    assert metrics.hedges == 0 and metrics.retries == 0
+    assert metrics.quantile(0.95) < 0.15
+
+
+def test_slow_attempt_is_hedged_and_the_hedge_wins():
+    policy = RequestPolicy(deadline=10.0, hedge=True, hedge_default_delay=0.2,
+                           min_samples=1000)
+    # seed 1: the first request is a slow outlier, the second is not
+    with MockVLMServer(latency=0.02, slow_rate=0.5, slow_latency=2.0,
+                       seed=1) as server:
+        t0 = time.monotonic()
+        _, metrics = run_calls(server, policy, n=1, concurrency=4)
+        elapsed = time.monotonic() - t0
+    assert metrics.hedges == 1 and metrics.hedge_wins == 1
+    assert elapsed < 1.5
+    assert metrics.quantile(0.5) < 0.2
+
+
+def test_retries_are_counted_per_extra_request():
+    policy = RequestPolicy(deadline=10.0, max_retries=10, backoff_base=0.001,
+                           backoff_max=0.01)
+    with MockVLMServer(error_rate=0.4, seed=3) as server:
+        texts, metrics = run_calls(server, policy, n=8, concurrency=3)
+        sent = len(server.requests)
+    assert len(texts) == 8 and metrics.successes == 8
+    assert metrics.retries > 0 and sent == 8 + metrics.retries
+
+
+def test_sync_callers_beyond_eight_do_not_queue():
+    runner = RequestRunner(RequestPolicy(deadline=0.5, max_retries=0))
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(runner.run_sync(lambda timeout: time.sleep(0.2) or "ok"))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and results == ["ok"] * 20
+
+
+def test_sync_deadline_holds_when_fn_overruns():
+    runner = RequestRunner(RequestPolicy(deadline=0.2, max_retries=5,
+                                         backoff_base=0.01))
+    t0 = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        runner.run_sync(lambda timeout: time.sleep(1.0))
+    assert time.monotonic() - t0 < 0.5
+    assert runner.metrics.deadline_exceeded == 1
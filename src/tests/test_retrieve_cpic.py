@@ -0,0 +1,150 @@
+import asyncio
+import re
+import threading
+import time
+
+import numpy as np
+import torch
+from vespa.application import Vespa
+
+from cpic_vlm_vector_store.retrieve_cpic import (
+    build_nn_query_body,
+    guideline_filter,
+    query_vespa_many,
+    tensor_to_body,
+)
+from cpic_vlm_vector_store.vespa_standin import VespaStandIn
+
+NN_RE = re.compile(r"\(\{targetHits:(\d+)\}nearestNeighbor\(embedding,rq(\d+)\)\)")
+
+
+def make_tensor(n_tokens, seed=0):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((n_tokens, 128)).astype(np.float32)
+    return {i: v.tolist() for i, v in enumerate(emb)}, emb
+
+
+def test_one_nearest_neighbor_clause_per_token_or_text():
+    tensor, _ = make_tensor(5)
+    body = build_nn_query_body("warfarin dose", tensor, k=3, target_hits=50)
+    yql = body["yql"]
+    clauses = NN_RE.findall(yql)
+    assert [int(i) for _, i in clauses] == [0, 1, 2, 3, 4]
+    assert {int(t) for t, _ in clauses} == {50}
+    assert yql.endswith(" OR userInput(@userQuery)")
+    assert yql.count(" OR ") == 5
+    assert body["hits"] == 3
+    assert body["ranking"] == "retrieval-and-rerank"
+    assert body["userQuery"] == "warfarin dose"
+    assert body["input.query(qt)"] is tensor
+
+
+def test_without_text_has_no_user_input():
+    tensor, _ = make_tensor(3)
+    yql = build_nn_query_body("q", tensor, k=1, with_text=False)["yql"]
+    assert "userInput" not in yql
+    assert len(NN_RE.findall(yql)) == 3
+
+
+def test_clauses_capped_at_max_nn_tokens():
+    tensor, _ = make_tensor(40)
+    body = build_nn_query_body("q", tensor, k=1, max_nn_tokens=32)
+    assert len(NN_RE.findall(body["yql"])) == 32
+    assert "input.query(rq31)" in body and "input.query(rq32)" not in body
+    assert len(body["input.query(qtb)"]) == 40
+
+
+def test_rq_inputs_are_binarized_query_tokens():
+    tensor, emb = make_tensor(4, seed=3)
+    # keys may arrive as strings (e.g. after a JSON round trip)
+    body = build_nn_query_body("q", {str(k): v for k, v in tensor.items()}, k=1)
+    expected = np.packbits(emb > 0, axis=1).astype(np.int8)
+    for i in range(4):
+        rq = body[f"input.query(rq{i})"]
+        assert len(rq) == 16
+        assert rq == expected[i].tolist()
+        assert body["input.query(qtb)"][i] == rq
+    assert all(-128 <= x <= 127 for x in body["input.query(rq0)"])
+
+
+def test_guideline_wraps_or_before_name_filter():
+    tensor, _ = make_tensor(2)
+    name = "CPIC Guideline for CYP2C19 and Clopidogrel.pdf"
+    body = build_nn_query_body("q", tensor, k=1, guideline=name)
+    yql = body["yql"]
+    where = yql.split(" where ", 1)[1]
+    assert where.startswith("(")
+    assert where.endswith(") and name contains "
+                          '"CPIC Guideline for CYP2C19 and Clopidogrel"')
+    inner = where[1:where.index(") and name contains")]
+    assert inner.count(" OR ") == 2 and inner.endswith("userInput(@userQuery)")
+    assert body["guideline"] == name
+
+
+def test_guideline_filter_strips_pdf_and_quotes():
+    assert guideline_filter(None) == ""
+    assert guideline_filter("") == ""
+    assert guideline_filter(' Say "hi".PDF ') == ' and name contains "Say \\"hi\\""'
+
+
+def test_rerank_count_only_when_given():
+    tensor, _ = make_tensor(2)
+    assert "ranking.rerankCount" not in build_nn_query_body("q", tensor, k=1)
+    body = build_nn_query_body("q", tensor, k=1, rerank_count=100)
+    assert body["ranking.rerankCount"] == 100
+
+
+def test_save_hits_records_source_pdf_and_page(tmp_path, monkeypatch):
+    import json
+
+    import fitz
+
+    from cpic_vlm_vector_store.retrieve_cpic import HITS_FILE, save_hits
+
+    monkeypatch.setenv("CPIC_PAGE_STORE", "off")
+    pdf = tmp_path / "guideline.pdf"
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page(width=200, height=100)
+    doc.save(pdf)
+    hits = [{"relevance": 9.5, "fields": {"path": str(pdf), "page_number": 2}},
+            {"relevance": 7.0, "fields": {"path": str(pdf), "page_number": 0}}]
+
+    files = save_hits(hits, tmp_path / "out", resize=None)
+    assert [p.rsplit("/", 1)[-1] for p in files] == ["00_guideline_p3.png",
+                                                     "01_guideline_p1.png"]
+    records = json.loads((tmp_path / "out" / HITS_FILE).read_text())
+    assert [(r["file"], r["path"], r["page_number"]) for r in records] == [
+        ("00_guideline_p3.png", str(pdf), 2), ("01_guideline_p1.png", str(pdf), 0)]
+
+
+def test_query_vespa_many_keeps_request_order_and_runs_concurrently():
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def hits(body):
+        n = int(body["userQuery"][1:])
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05 * (8 - n))                # early queries finish last
+        with lock:
+            in_flight[0] -= 1
+        return [{"id": f"id:pdf_page:pdf_page::{n}", "relevance": 1.0,
+                 "fields": {"query": body["userQuery"]}}]
+
+    queries = [f"q{n}" for n in range(8)]
+    tensors = [tensor_to_body(torch.ones(3, 128)) for _ in queries]
+    with VespaStandIn(hits_fn=hits) as standin:
+        t0 = time.perf_counter()
+        out = asyncio.run(query_vespa_many(
+            Vespa(url=standin.url), queries, tensors, k=1, connections=8,
+            session_kwargs={"http2_only": False}))
+        elapsed = time.perf_counter() - t0
+
+    assert [r.hits[0]["fields"]["query"] for r, _ in out] == queries
+    latencies = [lat for _, lat in out]
+    assert all(lat >= 0.05 for lat in latencies)
+    assert latencies[0] > latencies[-1]
+    assert peak[0] > 1
+    assert elapsed < 0.05 * sum(range(1, 9))        # < sequential total
@@ -0,0 +1,49 @@
+import pathlib
+
+import fitz
+import pytest
+
+from cpic_vlm_parse.table_regions import find_table_regions
+
+GUIDELINES = pathlib.Path(__file__).resolve().parents[1] / "Guidelines"
+
+
+def regions(name, page):
+    pdfs = [p for p in GUIDELINES.glob("*.pdf") if name in p.name]
+    assert len(pdfs) == 1, name
+    with fitz.open(pdfs[0]) as doc:
+        return find_table_regions(doc.load_page(page))
+
+
+def assert_bounds(rect, expected, tol=3.0):
+    assert all(abs(a - b) <= tol for a, b in zip(rect, expected)), (rect, expected)
+
+
+@pytest.mark.parametrize("name, page, expected", [
+    # booktabs rules drawn one segment per column (Wiley layout)
+    ("CYP2B6 and Efavirenz", 1, [(36.0, 58.2, 558.0, 262.4)]),
+    # filled-band rules below the running-head rule (Nature layout)
+    ("CYP2C19 and Voriconazole", 1, [(45.0, 69.1, 567.0, 224.4)]),
+    # landscape table printed sideways: vertical rules, caption on the left
+    ("Serotonin Reuptake", 5, [(54.8, 60.4, 526.0, 739.7)]),
+    # one tall cell leaves 0.6 page heights between header and last rule
+    ("RYR1 or CACNA1S", 3, [(36.0, 58.2, 558.0, 611.5)]),
+    # two tables with prose between them stay separate
+    ("select opioid therapy", 5, [(36.0, 58.2, 558.0, 319.4),
+                                  (36.0, 451.5, 558.0, 722.3)]),
+])
+def test_table_pages(name, page, expected):
+    found = regions(name, page)
+    assert len(found) == len(expected)
+    for rect, exp in zip(found, expected):
+        assert_bounds(rect, exp)
+
+
+@pytest.mark.parametrize("name, page", [
+    ("CYP2B6 and Efavirenz", 0),          # title page
+    ("CYP2C19 and Voriconazole", 5),      # prose between running head and © rule
+    ("RYR1 or CACNA1S", 5),               # same, two-rule frame
+    ("Atomoxetine", 3),                   # pathway figure
+])
+def test_pages_without_tables(name, page):
+    assert regions(name, page) == []
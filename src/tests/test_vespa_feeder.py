@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from vespa.application import Vespa
+
+from cpic_vlm_vector_store.vespa_feeder import feed_concurrently
+from cpic_vlm_vector_store.vespa_standin import VespaStandIn
+
+
+def make_docs(n):
+    return [{"id": f"doc{i}", "name": "guideline.pdf", "page_number": i}
+            for i in range(n)]
+
+
+def feed(standin, docs, **kw):
+    kw.setdefault("backoff_base", 0.001)
+    kw.setdefault("backoff_max", 0.01)
+    return asyncio.run(feed_concurrently(
+        Vespa(url=standin.url), docs, progress=False,
+        session_kwargs={"http2_only": False}, **kw))
+
+
+def test_feed_stores_every_document():
+    docs = make_docs(40)
+    with VespaStandIn() as standin:
+        report = feed(standin, docs, concurrency=8)
+    assert report.docs_ok == 40 and report.docs_failed == 0
+    assert report.retries == 0
+    assert set(standin.docs) == {d["id"] for d in docs}
+    assert standin.docs["doc7"]["page_number"] == 7
+
+
+def test_feed_retries_injected_overload_in_order():
+    docs = make_docs(30)
+    with VespaStandIn(error_rate=0.3, seed=1) as standin:
+        report = feed(standin, docs, concurrency=1, max_retries=10)
+    writes = [r["path"].rsplit("/", 1)[-1] for r in standin.requests
+              if r["method"] == "POST"]
+    assert report.docs_ok == 30 and report.docs_failed == 0
+    assert report.retries == len(writes) - 30 > 0
+    # one worker: documents go out in input order, retries back to back
+    deduped = [w for i, w in enumerate(writes) if i == 0 or writes[i - 1] != w]
+    assert deduped == [d["id"] for d in docs]
+    assert len(standin.docs) == 30
+
+
+def test_feed_gives_up_after_max_retries():
+    with VespaStandIn(error_rate=1.0) as standin:
+        report = feed(standin, make_docs(3), concurrency=2, max_retries=2)
+    assert report.docs_ok == 0
+    assert [status for _, status, _ in report.failures] != []
+    assert all(status in (429, 503) for _, status, _ in report.failures)
+    assert report.retries == 3 * 2
+
+
+def test_failing_worker_does_not_block_producer():
+    docs = make_docs(3) + [{"name": "no id"}] + make_docs(20)
+    with VespaStandIn() as standin:
+        with pytest.raises(KeyError):
+            asyncio.run(asyncio.wait_for(feed_concurrently(
+                Vespa(url=standin.url), iter(docs), concurrency=1,
+                queue_size=1, progress=False,
+                session_kwargs={"http2_only": False}), timeout=30))
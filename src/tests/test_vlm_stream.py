@@ -0,0 +1,139 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from cpic_vlm_parse.vlm_stream import AsyncVLMStream, VLMStream
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))],
+                           usage=None)
+
+
+def usage_chunk(tokens):
+    return SimpleNamespace(choices=[],
+                           usage=SimpleNamespace(completion_tokens=tokens))
+
+
+class FakeStream:
+    """Chunk list with the ``close()`` of an OpenAI ``Stream``."""
+
+    def __init__(self, chunks, delay=0.0, fail_at=None):
+        self.chunks, self.delay, self.fail_at = chunks, delay, fail_at
+        self.closed = False
+
+    def __iter__(self):
+        for i, c in enumerate(self.chunks):
+            if i == self.fail_at:
+                raise ConnectionError("dropped")
+            time.sleep(self.delay)
+            yield c
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    """Async twin with the awaitable ``close()`` of an OpenAI ``AsyncStream``."""
+
+    async def __aiter__(self):
+        for c in FakeStream.__iter__(self):
+            yield c
+
+    async def close(self):
+        self.closed = True
+
+
+CHUNKS = [chunk("| a "), chunk(None), chunk("| b |"), chunk("\n")]
+
+
+def test_text_timing_and_chunk_count():
+    done = []
+    fake = FakeStream(CHUNKS, delay=0.01)
+    stream = VLMStream(fake, on_done=done.append)
+    assert list(stream) == ["| a ", "| b |", "\n"]
+    assert stream.text == "| a | b |\n" and stream.done
+    assert 0 < stream.ttft <= stream.total
+    assert stream.tokens == 3
+    assert done == [stream] and fake.closed
+
+
+def test_server_usage_overrides_chunk_count():
+    stream = VLMStream(FakeStream(CHUNKS + [usage_chunk(17)]))
+    assert stream.read() == "| a | b |\n"
+    assert stream.tokens == 17
+    assert stream.tokens_per_s > 0
+
+
+def test_on_done_skipped_for_partial_streams():
+    done, released = [], []
+    fake = FakeStream(CHUNKS)
+    stream = VLMStream(fake, on_done=done.append,
+                       on_close=lambda: released.append(1))
+    for _ in stream:
+        break
+    assert not stream.done and done == []
+    assert fake.closed and released == [1]
+
+    fake = FakeStream(CHUNKS, fail_at=2)
+    stream = VLMStream(fake, on_done=done.append)
+    with pytest.raises(ConnectionError):
+        stream.read()
+    assert stream.text == "| a " and done == [] and fake.closed
+
+
+def test_close_reaches_the_underlying_stream_once():
+    released = []
+    fake = FakeStream(CHUNKS)
+    stream = VLMStream(fake, on_close=lambda: released.append(1))
+    stream.close()
+    stream.close()
+    assert fake.closed and released == [1]
+
+
+def test_from_text_is_cached_and_complete():
+    stream = VLMStream.from_text("| x |")
+    assert stream.read() == "| x |"
+    assert stream.cached and stream.tokens_per_s == 0.0
+
+
+def test_async_stream_matches_sync():
+    done = []
+    fake = FakeAsyncStream(CHUNKS + [usage_chunk(9)], delay=0.01)
+
+    async def go():
+        stream = AsyncVLMStream(fake, on_done=done.append)
+        return stream, [p async for p in stream]
+
+    stream, pieces = asyncio.run(go())
+    assert pieces == ["| a ", "| b |", "\n"]
+    assert stream.text == "| a | b |\n"
+    assert 0 < stream.ttft <= stream.total
+    assert stream.tokens == 9
+    assert done == [stream] and fake.closed
+
+
+def test_async_partial_stream_and_aclose():
+    done, released = [], []
+    fake = FakeAsyncStream(CHUNKS)
+
+    async def partial():
+        stream = AsyncVLMStream(fake, on_done=done.append,
+                                on_close=lambda: released.append(1))
+        async for _ in stream:
+            break
+        await stream.aclose()
+        return stream
+
+    stream = asyncio.run(partial())
+    assert not stream.done and done == []
+    assert fake.closed and released == [1]
+
+    async def gen():
+        yield chunk("x")
+
+    chunks = gen()
+    asyncio.run(AsyncVLMStream(chunks).aclose())
+    assert chunks.ag_running is False and chunks.ag_frame is None